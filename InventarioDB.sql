@@ -305,3 +305,6 @@ GRANT INSERT, SELECT ON Historial_Mantenimiento TO rol_tecnico;
 GRANT INSERT, SELECT ON Historial_Traslados TO rol_tecnico;
 
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO rol_admin;
+
+-- Los cambios de esquema posteriores a este script van numerados en
+-- migraciones/ y se aplican con: python migrar.py
@@ -0,0 +1,301 @@
+"""
+Archivo de los meses viejos del historial particionado.
+
+Historial_Estado, Historial_Mantenimiento e Historial_Traslados están
+particionadas por mes (migraciones/0003_historial_particionado.sql). Este
+comando:
+
+- Crea las particiones del mes actual y de los siguientes (también lo hace
+  cada worker de la API al iniciar).
+- Archiva las particiones con más de HISTORIAL_MESES_ACTIVOS meses: copia
+  las filas a un .csv.gz, separa la partición (DETACH), la registra en
+  Historial_Archivado y la borra. La API las sigue leyendo con ?archivo=1
+  y una ventana de fechas (fecha_inicio, hasta HISTORIAL_ARCHIVO_MAX_MESES).
+- Restaura un mes archivado como partición normal.
+
+El archivo se escribe y se verifica (cantidad de filas) antes de tocar la
+tabla; si algo falla la partición queda donde estaba.
+
+Uso:
+    python archivar_historial.py                     archivar lo que pasó del límite
+    python archivar_historial.py --simular           solo listar qué se archivaría
+    python archivar_historial.py particiones         crear las futuras y listar todas
+    python archivar_historial.py restaurar historial_estado 2023-04
+
+Variables: HISTORIAL_MESES_ACTIVOS (por defecto 24), HISTORIAL_ARCHIVO_DIR
+(por defecto archivo_historial/ junto a este archivo; la API debe ver la
+misma carpeta) y las DB_* de servidor_api.py.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+from psycopg2 import sql
+
+from migrar import RAIZ, conectar
+
+TABLAS_HISTORIAL = ('historial_estado', 'historial_mantenimiento', 'historial_traslados')
+PATRON_PARTICION = re.compile(r'^(\w+)_p(\d{4})_(\d{2})$')
+
+MESES_ACTIVOS = int(os.getenv('HISTORIAL_MESES_ACTIVOS', 24))
+CARPETA_ARCHIVO = os.getenv('HISTORIAL_ARCHIVO_DIR', os.path.join(RAIZ, 'archivo_historial'))
+
+QUERY_PARTICIONES = """
+    SELECT madre.relname AS tabla, hija.relname AS particion,
+           pg_get_expr(hija.relpartbound, hija.oid) AS limites,
+           pg_total_relation_size(hija.oid) AS bytes
+    FROM pg_inherits h
+    JOIN pg_class madre ON madre.oid = h.inhparent
+    JOIN pg_class hija ON hija.oid = h.inhrelid
+    WHERE madre.relname = ANY(%s) AND pg_table_is_visible(madre.oid)
+    ORDER BY madre.relname, hija.relname
+"""
+QUERY_COLUMNAS = """
+    SELECT a.attname AS nombre, format_type(a.atttypid, a.atttypmod) AS tipo
+    FROM pg_attribute a
+    WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY a.attnum
+"""
+QUERY_COLUMNA_PARTICION = """
+    SELECT a.attname
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = %s::regclass
+"""
+QUERY_REGISTRAR = """
+    INSERT INTO Historial_Archivado (Tabla, Desde, Hasta, Archivo, Filas, Bytes, Suma_Verificacion, Columnas)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+# Los ETag de los listados dependen de la versión de la tabla. DETACH y
+# ATTACH no disparan el trigger de versión, pero cambian lo que devuelven
+# las respuestas sin ?archivo=1: se registra el cambio a mano (migraciones/0012)
+QUERY_SUBIR_VERSION = "INSERT INTO Cambios_Tabla (Tabla) VALUES (%s)"
+
+
+class Particion:
+    def __init__(self, tabla, nombre, bytes_):
+        self.tabla = tabla
+        self.nombre = nombre
+        self.bytes = bytes_
+        coincidencia = PATRON_PARTICION.match(nombre)
+        # La partición por defecto (_pdefecto) no es un mes: nunca se archiva
+        self.desde = date(int(coincidencia.group(2)), int(coincidencia.group(3)), 1) if coincidencia else None
+
+    @property
+    def hasta(self):
+        return sumar_meses(self.desde, 1)
+
+    @property
+    def archivo(self):
+        """Ruta relativa a CARPETA_ARCHIVO, que es lo que se guarda en el catálogo"""
+        return os.path.join(self.tabla, f"{self.nombre.replace('_p', '_', 1)}.csv.gz")
+
+    def __repr__(self):
+        return self.nombre
+
+
+def sumar_meses(fecha, meses):
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def listar_particiones(conn):
+    with conn.cursor() as cur:
+        cur.execute(QUERY_PARTICIONES, (list(TABLAS_HISTORIAL),))
+        filas = cur.fetchall()
+    conn.commit()
+    return [Particion(tabla, nombre, bytes_) for tabla, nombre, _limites, bytes_ in filas]
+
+
+def asegurar_particiones(conn, meses_adelante=3):
+    with conn.cursor() as cur:
+        cur.execute("SELECT fn_asegurar_particiones_historial(%s)", (meses_adelante,))
+        creadas = cur.fetchone()[0]
+    conn.commit()
+    return creadas
+
+
+def columnas_tabla(cur, tabla):
+    cur.execute(QUERY_COLUMNAS, (tabla,))
+    return [{"nombre": nombre, "tipo": tipo} for nombre, tipo in cur.fetchall()]
+
+
+# =====================================================
+# ARCHIVAR
+# =====================================================
+def escribir_archivo(conn, particion, ruta):
+    """
+    Copiar la partición a un .csv.gz (primero a un temporal, luego se
+    renombra). Retorna (filas, bytes, sha256).
+    """
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + '.tmp'
+    conn.set_session(isolation_level='REPEATABLE READ')
+    try:
+        with conn.cursor() as cur:
+            cur.execute(QUERY_COLUMNA_PARTICION, (particion.tabla,))
+            columna = cur.fetchone()[0]
+            cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(particion.nombre)))
+            filas = cur.fetchone()[0]
+            copia = sql.SQL(
+                "COPY (SELECT * FROM {} ORDER BY {}) TO STDOUT WITH (FORMAT csv, HEADER, NULL '\\N')"
+            ).format(sql.Identifier(particion.nombre), sql.Identifier(columna))
+            with gzip.open(temporal, 'wb') as salida:
+                cur.copy_expert(copia.as_string(conn), salida)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    finally:
+        conn.set_session(isolation_level='READ COMMITTED')
+
+    suma = hashlib.sha256()
+    with open(temporal, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            suma.update(bloque)
+    os.replace(temporal, ruta)
+    return filas, os.path.getsize(ruta), suma.hexdigest()
+
+
+def archivar_particion(conn, particion):
+    """
+    Archivar un mes: archivo, DETACH, catálogo y DROP en una transacción.
+    Si entre la copia y el DETACH entró o salió alguna fila, se aborta.
+    """
+    ruta = os.path.join(CARPETA_ARCHIVO, particion.archivo)
+    filas, bytes_, suma = escribir_archivo(conn, particion, ruta)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(particion.tabla), sql.Identifier(particion.nombre)
+            ))
+            cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(particion.nombre)))
+            actuales = cur.fetchone()[0]
+            if actuales != filas:
+                raise RuntimeError(
+                    f"{particion}: {actuales} filas al separar y {filas} en el archivo; se reintenta en la próxima corrida"
+                )
+            columnas = columnas_tabla(cur, particion.nombre)
+            cur.execute(QUERY_REGISTRAR, (
+                particion.tabla, particion.desde, particion.hasta, particion.archivo,
+                filas, bytes_, suma, json.dumps(columnas)
+            ))
+            cur.execute(QUERY_SUBIR_VERSION, (particion.tabla,))
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(particion.nombre)))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        os.remove(ruta)
+        raise
+    return filas, bytes_
+
+
+def archivar(conn, meses_activos=MESES_ACTIVOS, simular=False):
+    """Archivar las particiones anteriores al límite. Retorna las archivadas."""
+    limite = sumar_meses(date.today().replace(day=1), -meses_activos)
+    viejas = [p for p in listar_particiones(conn) if p.desde is not None and p.desde < limite]
+
+    archivadas = []
+    for particion in viejas:
+        if simular:
+            print(f"  archivaría  {particion}  ({particion.bytes / 1024:.0f} kB)")
+            continue
+        filas, bytes_ = archivar_particion(conn, particion)
+        print(f"  archivada   {particion}  {filas} filas -> {particion.archivo} ({bytes_ / 1024:.0f} kB)")
+        archivadas.append(particion)
+    return archivadas
+
+
+# =====================================================
+# RESTAURAR
+# =====================================================
+def restaurar(conn, tabla, mes):
+    """
+    Volver a cargar un mes archivado como partición y quitarlo del catálogo.
+    Las filas se copian a una tabla suelta que luego se adjunta: son filas
+    históricas, no deben pasar por los triggers de validación.
+    """
+    desde = date.fromisoformat(f"{mes}-01")
+    particion = Particion(tabla, f"{tabla}_p{desde:%Y_%m}", 0)
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT Archivo, Filas, Columnas FROM Historial_Archivado WHERE Tabla = %s AND Desde = %s",
+            (tabla, desde)
+        )
+        registro = cur.fetchone()
+        if registro is None:
+            raise RuntimeError(f"{tabla} {mes} no está archivado")
+        archivo, filas, columnas = registro
+
+        cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(particion.nombre), sql.Identifier(tabla)
+        ))
+        nombres = sql.SQL(', ').join(sql.Identifier(c['nombre']) for c in columnas)
+        copia = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, HEADER, NULL '\\N')").format(
+            sql.Identifier(particion.nombre), nombres
+        )
+        with gzip.open(os.path.join(CARPETA_ARCHIVO, archivo), 'rb') as entrada:
+            cur.copy_expert(copia.as_string(conn), entrada)
+        if cur.rowcount != filas:
+            conn.rollback()
+            raise RuntimeError(f"{archivo}: se leyeron {cur.rowcount} filas y el catálogo dice {filas}")
+
+        cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(tabla), sql.Identifier(particion.nombre)
+        ), (particion.desde, particion.hasta))
+        cur.execute("DELETE FROM Historial_Archivado WHERE Tabla = %s AND Desde = %s", (tabla, desde))
+        cur.execute(QUERY_SUBIR_VERSION, (tabla,))
+    conn.commit()
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('comando', nargs='?', default='archivar', choices=['archivar', 'particiones', 'restaurar'])
+    parser.add_argument('tabla', nargs='?', choices=TABLAS_HISTORIAL, help='en restaurar, tabla del mes')
+    parser.add_argument('mes', nargs='?', help='en restaurar, mes archivado (AAAA-MM)')
+    parser.add_argument('--base', help='base de datos (por defecto DB_NAME)')
+    parser.add_argument('--meses', type=int, default=MESES_ACTIVOS,
+                        help='meses que se quedan en la base (por defecto HISTORIAL_MESES_ACTIVOS)')
+    parser.add_argument('--adelante', type=int, default=3, help='meses futuros con partición creada')
+    parser.add_argument('--simular', action='store_true', help='solo listar lo que se archivaría')
+    args = parser.parse_args(argv)
+
+    conn = conectar(args.base)
+    try:
+        if args.comando == 'restaurar':
+            if not args.tabla or not args.mes:
+                parser.error('restaurar necesita la tabla y el mes (AAAA-MM)')
+            filas = restaurar(conn, args.tabla, args.mes)
+            print(f"{args.tabla} {args.mes}: {filas} filas restauradas")
+            return 0
+
+        creadas = asegurar_particiones(conn, args.adelante)
+        print(f"{creadas} particiones nuevas")
+        if args.comando == 'particiones':
+            for particion in listar_particiones(conn):
+                print(f"  {particion.tabla:<25} {particion.nombre:<35} {particion.bytes / 1024:>10.0f} kB")
+            return 0
+
+        archivadas = archivar(conn, args.meses, args.simular)
+        if not args.simular:
+            print(f"{len(archivadas)} particiones archivadas" if archivadas else "Nada que archivar")
+    except (psycopg2.Error, RuntimeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
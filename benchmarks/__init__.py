@@ -0,0 +1,14 @@
+"""
+Benchmarks de la API de inventario.
+
+    datos_sinteticos  crea una base con InventarioDB.sql y una flota sintética
+    carga             levanta el servidor contra esa base y mide los endpoints
+                      de lectura (throughput, latencias, pico de RSS)
+    comparar          compara dos resultados de carga (p. ej. entre commits)
+    serializacion     micro-benchmark de JSON y compresión
+
+Uso típico:
+    python -m benchmarks.datos_sinteticos --equipos 100000 --recrear
+    python -m benchmarks.carga --concurrencia 1,8,32
+    python -m benchmarks.comparar benchmarks/resultados/a.json benchmarks/resultados/b.json
+"""
@@ -0,0 +1,421 @@
+"""
+Prueba de carga de los endpoints de lectura de la API.
+
+Levanta el servidor (prefork o async) contra la base de
+benchmarks/datos_sinteticos.py, inicia sesión y, para cada escenario y
+cada nivel de concurrencia, lanza N clientes keep-alive durante --duracion
+segundos. Cada escenario rota entre varios valores de filtro (todas las
+unidades, los tres estados, ...) para no medir siempre la misma página de
+caché de PostgreSQL.
+
+El resultado (throughput, percentiles de latencia, bytes por respuesta y
+pico de RSS del servidor con todos sus workers) se guarda en JSON junto
+con el commit, el tamaño de la base y los parámetros, para compararlo con
+benchmarks/comparar.py.
+
+Uso:
+    python -m benchmarks.carga --concurrencia 1,8,32 --duracion 15
+    python -m benchmarks.carga --modo async --escenarios equipos,estadisticas
+    python -m benchmarks.carga --url http://127.0.0.1:5000 --pid 12345
+"""
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from benchmarks.datos_sinteticos import (
+    BASE_DEFECTO, ESTADOS, RAIZ, USUARIO_BENCHMARK, conectar, contar_filas, leer_unidades_agente
+)
+
+PUERTO_DEFECTO = 5099
+CARPETA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+
+# =====================================================
+# ESCENARIOS
+# =====================================================
+def escenarios(unidades):
+    """nombre -> (ruta, variantes de query string que se rotan)"""
+    return {
+        'equipos': ('/api/equipos', [{}]),
+        'equipos_unidad': ('/api/equipos', [{'unidad': u} for u in unidades]),
+        'equipos_estado': ('/api/equipos', [{'estado': e} for e in ESTADOS]),
+        'equipos_tipo': ('/api/equipos', [{'tipo': 'Escritorio'}, {'tipo': 'Portátil'}]),
+        'equipos_area': ('/api/equipos', [{'area': 'Asistencial'}, {'area': 'Administrativo'}]),
+        'equipos_busqueda': ('/api/equipos', [{'busqueda': b} for b in ('PC-0012', '10.3.', 'OptiPlex', 'PT1004')]),
+        'equipos_paginado': ('/api/equipos', [{'limit': 100, 'orden': o} for o in ('nombre', 'unidad', 'fecha')]),
+        'equipos_summary': ('/api/equipos', [{'fields': 'summary'}]),
+        'estadisticas': ('/api/estadisticas', [{}]),
+        'reporte_historial_estados': ('/api/reportes/historial-estados', [{}]),
+        'reporte_equipos_por_tecnico': ('/api/reportes/equipos-por-tecnico', [{}]),
+        'reporte_mantenimientos_periodo': ('/api/reportes/mantenimientos-periodo', [
+            {'fecha_inicio': '2025-10-01', 'fecha_fin': '2025-12-31'},
+            {'fecha_inicio': '2025-07-01', 'fecha_fin': '2025-09-30', 'tipo': 'HARDWARE'},
+            {'fecha_inicio': '2025-04-01', 'fecha_fin': '2025-06-30', 'tipo': 'SOFTWARE'}
+        ]),
+        'exportar_excel': ('/api/exportar/excel', [{'unidad': u} for u in unidades[:5]])
+    }
+
+
+# =====================================================
+# SERVIDOR
+# =====================================================
+class ServidorBenchmark:
+    """Servidor de la API en un subproceso, con la base de benchmark"""
+
+    def __init__(self, modo, puerto, base, workers):
+        self.modo = modo
+        self.puerto = puerto
+        self.log = tempfile.NamedTemporaryFile(prefix='benchmark-servidor-', suffix='.log', delete=False)
+        entorno = dict(os.environ, API_MODO=modo, API_HOST='127.0.0.1', API_PORT=str(puerto),
+                       DB_NAME=base, API_MAX_SOLICITUDES='0', PYTHONUNBUFFERED='1')
+        if workers:
+            entorno['API_WORKERS'] = str(workers)
+        self.proceso = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, 'servidor_api.py')],
+            cwd=RAIZ, env=entorno, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        self.pid = self.proceso.pid
+
+    def esperar(self, limite=60):
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            if self.proceso.poll() is not None:
+                break
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=2)
+                conn.request('GET', '/api/health')
+                if conn.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.3)
+        self.detener()
+        with open(self.log.name, encoding='utf-8', errors='replace') as archivo:
+            print(archivo.read()[-3000:], file=sys.stderr)
+        raise SystemExit("El servidor no respondió /api/health")
+
+    def detener(self):
+        if self.proceso.poll() is None:
+            self.proceso.terminate()
+            try:
+                self.proceso.wait(30)
+            except subprocess.TimeoutExpired:
+                self.proceso.kill()
+                self.proceso.wait()
+        os.unlink(self.log.name)
+
+
+def rss_arbol(pid):
+    """RSS total en bytes del proceso y todos sus descendientes"""
+    if psutil:
+        try:
+            raiz = psutil.Process(pid)
+            procesos = [raiz] + raiz.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return 0
+        total = 0
+        for proceso in procesos:
+            try:
+                total += proceso.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    # Sin psutil: /proc (Linux)
+    hijos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as archivo:
+                ppid = int(archivo.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        hijos.setdefault(ppid, []).append(int(entrada))
+    total, pendientes = 0, [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pendientes.extend(hijos.get(actual, []))
+        try:
+            with open(f'/proc/{actual}/status') as archivo:
+                for linea in archivo:
+                    if linea.startswith('VmRSS:'):
+                        total += int(linea.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+class MuestreoRSS:
+    """Pico de RSS del servidor, muestreado cada `intervalo` segundos"""
+
+    def __init__(self, pid, intervalo=0.1):
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = 0
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def __enter__(self):
+        if self.pid:
+            self.pico = rss_arbol(self.pid)
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+        return self
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_arbol(self.pid))
+
+    def __exit__(self, *_):
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join()
+
+
+# =====================================================
+# CLIENTES
+# =====================================================
+class Cliente:
+    """Conexión keep-alive; se reabre si el servidor la cierra"""
+
+    def __init__(self, url, token, timeout):
+        partes = urlsplit(url)
+        self.host, self.puerto = partes.hostname, partes.port or 80
+        self.timeout = timeout
+        self.cabeceras = {'Accept-Encoding': 'gzip'}
+        if token:
+            self.cabeceras['Authorization'] = f'Bearer {token}'
+        self.conn = None
+
+    def get(self, ruta):
+        """Retorna (estado, bytes recibidos en la red)"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+        try:
+            self.conn.request('GET', ruta, headers=self.cabeceras)
+            respuesta = self.conn.getresponse()
+            cuerpo = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        if respuesta.will_close:
+            self.conn.close()
+            self.conn = None
+        return respuesta.status, len(cuerpo)
+
+
+def iniciar_sesion(url):
+    partes = urlsplit(url)
+    conn = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+    cuerpo = json.dumps({'cedula': USUARIO_BENCHMARK['cedula'], 'password': USUARIO_BENCHMARK['password']})
+    conn.request('POST', '/api/login', body=cuerpo, headers={'Content-Type': 'application/json'})
+    respuesta = conn.getresponse()
+    datos = respuesta.read()
+    if respuesta.status != 200:
+        raise SystemExit(f"Login falló ({respuesta.status}): {datos[:200]!r}")
+    return json.loads(datos)['token']
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano (igual que /api/admin/slow-queries)"""
+    if not ordenados:
+        return None
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def ejecutar_carga(url, token, rutas, concurrencia, duracion, timeout):
+    """
+    `concurrencia` hilos piden las rutas en rotación hasta `duracion`
+    segundos. Retorna latencias (s), bytes, errores y el tiempo real.
+    """
+    siguiente = itertools.count()
+    lock = threading.Lock()
+    latencias, tamanos = [], []
+    errores = {}
+    fin = time.perf_counter() + duracion
+
+    def trabajador():
+        cliente = Cliente(url, token, timeout)
+        propias, bytes_propios, errores_propios = [], [], {}
+        while time.perf_counter() < fin:
+            with lock:
+                ruta = rutas[next(siguiente) % len(rutas)]
+            inicio = time.perf_counter()
+            try:
+                estado, tamano = cliente.get(ruta)
+            except (OSError, http.client.HTTPException) as e:
+                clave = type(e).__name__
+                errores_propios[clave] = errores_propios.get(clave, 0) + 1
+                continue
+            if estado >= 400:
+                errores_propios[str(estado)] = errores_propios.get(str(estado), 0) + 1
+                continue
+            propias.append(time.perf_counter() - inicio)
+            bytes_propios.append(tamano)
+        with lock:
+            latencias.extend(propias)
+            tamanos.extend(bytes_propios)
+            for clave, cantidad in errores_propios.items():
+                errores[clave] = errores.get(clave, 0) + cantidad
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return latencias, tamanos, errores, time.perf_counter() - inicio
+
+
+def resumir(latencias, tamanos, errores, transcurrido, pico_rss):
+    ordenadas = sorted(latencias)
+    ms = lambda valor: None if valor is None else round(valor * 1000, 2)
+    return {
+        'solicitudes': len(latencias),
+        'errores': errores,
+        'segundos': round(transcurrido, 2),
+        'rps': round(len(latencias) / transcurrido, 2) if transcurrido else 0,
+        'latencia_ms': {
+            'p50': ms(percentil(ordenadas, 50)),
+            'p90': ms(percentil(ordenadas, 90)),
+            'p95': ms(percentil(ordenadas, 95)),
+            'p99': ms(percentil(ordenadas, 99)),
+            'max': ms(ordenadas[-1] if ordenadas else None),
+            'media': ms(sum(ordenadas) / len(ordenadas) if ordenadas else None)
+        },
+        'bytes_promedio': round(sum(tamanos) / len(tamanos)) if tamanos else 0,
+        'pico_rss_mb': round(pico_rss / 2 ** 20, 1) if pico_rss else None
+    }
+
+
+# =====================================================
+# METADATOS Y SALIDA
+# =====================================================
+def info_commit():
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'asunto': git('log', '-1', '--format=%s'),
+        'modificado': bool(git('status', '--porcelain', '--untracked-files=no'))
+    }
+
+
+def info_entorno():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count()
+    return {
+        'python': platform.python_version(),
+        'sistema': platform.platform(),
+        'cpus': cpus,
+        'psutil': psutil is not None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base', default=BASE_DEFECTO)
+    parser.add_argument('--modo', choices=['prefork', 'async'], default='prefork')
+    parser.add_argument('--workers', type=int, default=0, help='workers del modo prefork (0 = uno por CPU)')
+    parser.add_argument('--puerto', type=int, default=PUERTO_DEFECTO)
+    parser.add_argument('--url', help='usar un servidor ya iniciado en vez de levantar uno')
+    parser.add_argument('--pid', type=int, help='PID del servidor de --url, para medir su RSS')
+    parser.add_argument('--concurrencia', default='1,8,32', help='niveles separados por coma')
+    parser.add_argument('--duracion', type=float, default=10, help='segundos por escenario y nivel')
+    parser.add_argument('--calentamiento', type=float, default=2, help='segundos sin medir antes de cada escenario')
+    parser.add_argument('--timeout', type=float, default=120, help='timeout por solicitud')
+    parser.add_argument('--escenarios', help='solo estos escenarios (separados por coma)')
+    parser.add_argument('--salida', help='archivo JSON (por defecto benchmarks/resultados/<fecha>_<commit>.json)')
+    args = parser.parse_args(argv)
+
+    niveles = [int(n) for n in args.concurrencia.split(',') if n.strip()]
+    catalogo = escenarios(leer_unidades_agente())
+    if args.escenarios:
+        nombres = [n.strip() for n in args.escenarios.split(',') if n.strip()]
+        desconocidos = [n for n in nombres if n not in catalogo]
+        if desconocidos:
+            parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(catalogo)}")
+        catalogo = {n: catalogo[n] for n in nombres}
+
+    conn = conectar(args.base)
+    try:
+        filas = contar_filas(conn)
+    finally:
+        conn.close()
+
+    servidor = None
+    url, pid = args.url, args.pid
+    if not url:
+        servidor = ServidorBenchmark(args.modo, args.puerto, args.base, args.workers)
+        servidor.esperar()
+        url, pid = f'http://127.0.0.1:{args.puerto}', servidor.pid
+
+    commit = info_commit()
+    resultado = {
+        'version': 1,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        **commit,
+        'entorno': info_entorno(),
+        'servidor': {'modo': args.modo if servidor else 'externo', 'workers': args.workers or None, 'url': url},
+        'base': {'nombre': args.base, 'filas': filas},
+        'parametros': {'concurrencia': niveles, 'duracion': args.duracion, 'calentamiento': args.calentamiento},
+        'escenarios': {}
+    }
+
+    try:
+        token = iniciar_sesion(url)
+        for nombre, (ruta, variantes) in catalogo.items():
+            rutas = [ruta + ('?' + urlencode(v) if v else '') for v in variantes]
+            resultado['escenarios'][nombre] = {'ruta': ruta, 'variantes': len(rutas), 'niveles': {}}
+            for nivel in niveles:
+                if args.calentamiento:
+                    ejecutar_carga(url, token, rutas, nivel, args.calentamiento, args.timeout)
+                with MuestreoRSS(pid) as muestreo:
+                    medicion = ejecutar_carga(url, token, rutas, nivel, args.duracion, args.timeout)
+                resumen = resumir(*medicion, muestreo.pico)
+                resultado['escenarios'][nombre]['niveles'][str(nivel)] = resumen
+                print(f"{nombre:32} c={nivel:<3} {resumen['rps']:>9.1f} req/s  "
+                      f"p50 {resumen['latencia_ms']['p50'] or 0:>8.1f} ms  "
+                      f"p99 {resumen['latencia_ms']['p99'] or 0:>8.1f} ms  "
+                      f"RSS {resumen['pico_rss_mb'] or 0:>7.1f} MB"
+                      + (f"  errores {resumen['errores']}" if resumen['errores'] else ''), flush=True)
+    finally:
+        if servidor:
+            servidor.detener()
+
+    salida = args.salida
+    if not salida:
+        os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+        corto = (commit['commit'] or 'sin-git')[:10] + ('-modificado' if commit['modificado'] else '')
+        salida = os.path.join(CARPETA_RESULTADOS, f"{datetime.now():%Y%m%d-%H%M%S}_{corto}.json")
+    with open(salida, 'w', encoding='utf-8') as archivo:
+        json.dump(resultado, archivo, ensure_ascii=False, indent=2)
+    print(f"Resultados en {salida}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Comparar dos resultados de benchmarks/carga.py (p. ej. antes y después de
+un commit).
+
+Muestra por escenario y concurrencia el cambio de req/s, p95, p99 y pico de
+RSS. Con --umbral el código de salida es 1 si algún escenario empeora más
+de ese porcentaje en req/s o p99 (útil en CI).
+
+Uso:
+    python -m benchmarks.comparar antes.json despues.json
+    python -m benchmarks.comparar antes.json despues.json --umbral 10
+"""
+import argparse
+import json
+import sys
+
+
+def cargar(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def variacion(antes, despues):
+    """Cambio porcentual, o None si no se puede calcular"""
+    if not antes or despues is None:
+        return None
+    return (despues - antes) / antes * 100
+
+
+def formato(valor, cambio):
+    if valor is None:
+        return '-'.rjust(18)
+    texto = f"{valor:,.1f}"
+    if cambio is not None:
+        texto += f" ({cambio:+.0f}%)"
+    return texto.rjust(18)
+
+
+def comparar(antes, despues, umbral=None):
+    """Filas de la comparación y lista de regresiones sobre `umbral`"""
+    filas, regresiones = [], []
+    for nombre, escenario in despues['escenarios'].items():
+        previo = antes['escenarios'].get(nombre)
+        if not previo:
+            continue
+        for nivel, medida in escenario['niveles'].items():
+            base = previo['niveles'].get(nivel)
+            if not base:
+                continue
+            cambios = {
+                'rps': variacion(base['rps'], medida['rps']),
+                'p95': variacion(base['latencia_ms']['p95'], medida['latencia_ms']['p95']),
+                'p99': variacion(base['latencia_ms']['p99'], medida['latencia_ms']['p99']),
+                'rss': variacion(base['pico_rss_mb'], medida['pico_rss_mb'])
+            }
+            filas.append((nombre, nivel, medida, cambios))
+            if umbral is not None:
+                if cambios['rps'] is not None and cambios['rps'] < -umbral:
+                    regresiones.append(f"{nombre} c={nivel}: req/s {cambios['rps']:+.1f}%")
+                if cambios['p99'] is not None and cambios['p99'] > umbral:
+                    regresiones.append(f"{nombre} c={nivel}: p99 {cambios['p99']:+.1f}%")
+    return filas, regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('antes')
+    parser.add_argument('despues')
+    parser.add_argument('--umbral', type=float, help='porcentaje de empeoramiento tolerado')
+    args = parser.parse_args(argv)
+
+    antes, despues = cargar(args.antes), cargar(args.despues)
+    for etiqueta, datos in (('Antes', antes), ('Después', despues)):
+        print(f"{etiqueta:8} {(datos.get('commit') or '?')[:10]}"
+              f"{' (modificado)' if datos.get('modificado') else ''}  {datos.get('asunto') or ''}")
+    if antes['base']['filas'] != despues['base']['filas']:
+        print("Aviso: las bases tienen distinta cantidad de filas; la comparación no es directa")
+    if antes['parametros'] != despues['parametros']:
+        print("Aviso: los parámetros de carga no coinciden")
+    print()
+
+    filas, regresiones = comparar(antes, despues, args.umbral)
+    print(f"{'escenario':32} {'c':>4} {'req/s':>18} {'p95 ms':>18} {'p99 ms':>18} {'RSS MB':>18}")
+    for nombre, nivel, medida, cambios in filas:
+        print(f"{nombre:32} {nivel:>4}"
+              f" {formato(medida['rps'], cambios['rps'])}"
+              f" {formato(medida['latencia_ms']['p95'], cambios['p95'])}"
+              f" {formato(medida['latencia_ms']['p99'], cambios['p99'])}"
+              f" {formato(medida['pico_rss_mb'], cambios['rss'])}")
+
+    if regresiones:
+        print(f"\nRegresiones sobre {args.umbral:g}%:")
+        for regresion in regresiones:
+            print(f"  {regresion}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
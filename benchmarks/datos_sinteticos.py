@@ -0,0 +1,397 @@
+"""
+Base de datos sintética para los benchmarks.
+
+Crea (o recrea con --recrear) una base aparte, le aplica InventarioDB.sql
+sentencia por sentencia y la llena con una flota del tamaño pedido. Las
+filas se generan dentro de PostgreSQL con generate_series, por lotes, así
+que millones de filas de historial toman segundos y no memoria de Python.
+
+- Unidad_Actual sale de la lista de sedes de inventario.ps1, con más
+  equipos en las primeras (las sedes grandes) que en las últimas.
+- Con la misma --semilla y los mismos tamaños los datos son idénticos, y
+  las fechas terminan en FECHA_REFERENCIA (no dependen del día en que se
+  corre): los resultados se pueden comparar entre commits.
+
+Uso:
+    python -m benchmarks.datos_sinteticos --equipos 100000 \\
+        --mantenimientos 2000000 --traslados 1000000 --estados 1000000 --recrear
+
+La conexión usa DB_HOST, DB_PORT, DB_USER y DB_PASSWORD (o el .env) como
+servidor_api.py; la base es --base (por defecto inventario_bench).
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import psycopg2
+from psycopg2 import sql
+from dotenv import load_dotenv
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from migrar import aplicar_migraciones, sentencias_sql
+
+BASE_DEFECTO = 'inventario_bench'
+FECHA_REFERENCIA = '2025-12-31 18:00:00'
+LOTE = 200000
+
+# Usuario con el que se autentica benchmarks/carga.py
+USUARIO_BENCHMARK = {'cedula': 900000001, 'password': 'benchmark', 'nombre': 'Benchmark', 'rol': 'SUPERUSUARIO'}
+CEDULA_PRIMER_TECNICO = 910000001
+
+MARCAS = ['Dell Inc.', 'HP', 'Lenovo', 'ASUS', 'Acer']
+MODELOS = ['OptiPlex 7080', 'OptiPlex 3090', 'ProDesk 400 G7', 'EliteDesk 800 G6',
+           'ThinkCentre M70q', 'ThinkPad E14', 'Vostro 3510', 'VivoBook 15', 'Aspire 5']
+PROCESADORES = ['Intel(R) Core(TM) i5-10500 CPU @ 3.10GHz', 'Intel(R) Core(TM) i3-10100 CPU @ 3.60GHz',
+                'Intel(R) Core(TM) i7-10700 CPU @ 2.90GHz', 'AMD Ryzen 5 5600G with Radeon Graphics',
+                'Intel(R) Core(TM) i5-1135G7 @ 2.40GHz']
+DISCOS = ['KINGSTON SA400S37480G - 447 GB - SSD', 'ST1000DM010-2EP102 - 931 GB - HDD',
+          'WDC WDS240G2G0A - 223 GB - SSD', 'SAMSUNG MZVLB256HBHQ - 238 GB - SSD']
+SISTEMAS = ['Microsoft Windows 10 Pro', 'Microsoft Windows 11 Pro', 'Microsoft Windows 10 Enterprise']
+OFFICES = ['Microsoft Office Profesional Plus 2019', 'Microsoft Office Standard 2016',
+           'Microsoft 365 Apps for enterprise', 'No instalado']
+ANTIVIRUS = ['Windows Defender', 'ESET Endpoint Security', 'Kaspersky Endpoint Security']
+DESCRIPCIONES = {
+    'HARDWARE': ['Limpieza interna y cambio de pasta térmica', 'Cambio de disco duro por SSD',
+                 'Ampliación de memoria RAM', 'Cambio de fuente de poder', 'Revisión de ventiladores'],
+    'SOFTWARE': ['Actualización de Windows y controladores', 'Reinstalación de sistema operativo',
+                 'Eliminación de malware', 'Instalación de Office', 'Configuración de impresora de red']
+}
+ESTADOS = ['Operativo', 'En reparacion', 'Baja']
+
+
+def leer_unidades_agente():
+    """Sedes de $unidadesDisponibles en inventario.ps1 (en el mismo orden)"""
+    with open(os.path.join(RAIZ, 'inventario.ps1'), encoding='utf-8-sig') as archivo:
+        texto = archivo.read()
+    bloque = re.search(r'\$unidadesDisponibles\s*=\s*@\((.*?)\)', texto, re.S)
+    if not bloque:
+        raise RuntimeError("No se encontró $unidadesDisponibles en inventario.ps1")
+    return re.findall(r'"([^"]+)"', bloque.group(1))
+
+
+def pesos_acumulados(cantidad, exponente=0.8):
+    """Límites para width_bucket: la sede i pesa 1/(i+1)^exponente"""
+    pesos = [1 / (i + 1) ** exponente for i in range(cantidad)]
+    total = sum(pesos)
+    limites, acumulado = [], 0.0
+    for peso in pesos:
+        limites.append(acumulado / total)
+        acumulado += peso
+    return limites
+
+
+def conectar(base):
+    load_dotenv(os.path.join(RAIZ, '.env'))
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 5432)),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD'),
+        dbname=base
+    )
+    conn.set_client_encoding('UTF8')
+    return conn
+
+
+def crear_base(base, recrear):
+    conn = conectar('postgres')
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (base,))
+            existe = cur.fetchone() is not None
+            if existe and not recrear:
+                raise SystemExit(f"La base {base} ya existe: use --recrear para borrarla y generarla de nuevo")
+            if existe:
+                cur.execute(sql.SQL("DROP DATABASE {}").format(sql.Identifier(base)))
+            cur.execute(sql.SQL("CREATE DATABASE {} ENCODING 'UTF8' TEMPLATE template0").format(sql.Identifier(base)))
+    finally:
+        conn.close()
+
+
+def aplicar_esquema(conn):
+    """
+    InventarioDB.sql está escrito para psql: algunas sentencias fallan en
+    una base nueva (roles que ya existen en el servidor, la FK a
+    Id_Tecnico_Actual). Se ejecutan una por una y los errores se avisan;
+    después se aplican las migraciones, como en producción.
+    """
+    with open(os.path.join(RAIZ, 'InventarioDB.sql'), encoding='utf-8') as archivo:
+        sentencias = sentencias_sql(archivo.read())
+    conn.autocommit = True
+    avisos = 0
+    with conn.cursor() as cur:
+        for sentencia in sentencias:
+            try:
+                cur.execute(sentencia)
+            except psycopg2.Error as e:
+                avisos += 1
+                primera_linea = sentencia.splitlines()[0][:70]
+                print(f"  aviso: {primera_linea} -> {str(e).splitlines()[0]}")
+    print(f"Esquema aplicado: {len(sentencias)} sentencias, {avisos} avisos")
+    aplicar_migraciones(conn)
+
+
+def por_lotes(conn, etiqueta, total, query, params):
+    """Ejecutar `query` (con %(desde)s y %(hasta)s) en lotes de LOTE filas"""
+    inicio = time.perf_counter()
+    with conn.cursor() as cur:
+        for desde in range(1, total + 1, LOTE):
+            hasta = min(desde + LOTE - 1, total)
+            cur.execute(query, dict(params, desde=desde, hasta=hasta))
+            conn.commit()
+            print(f"\r  {etiqueta}: {hasta:,}/{total:,}", end='', flush=True)
+    print(f"  ({time.perf_counter() - inicio:.1f} s)")
+
+
+# Un equipo al azar entre los generados (las FK apuntan a Nombre_Equipo)
+SQL_EQUIPO_AL_AZAR = "'PC-' || lpad((1 + floor(random() * %(equipos)s))::int::text, 6, '0')"
+SQL_FECHA_AL_AZAR = "%(referencia)s::timestamp - random() * %(dias)s * interval '1 day'"
+SQL_TECNICO_AL_AZAR = "%(primer_tecnico)s + floor(random() * %(tecnicos)s)::int"
+
+QUERY_EQUIPOS = """
+    INSERT INTO Equipos (
+        Nombre_Equipo, Marca_Equipo, Modelo_Equipo, Tipo_Equipo, Tipo_Area, Unidad_Actual,
+        Procesador_Equipo, Ram_Equipo, Tipo_Ram, Disco_Equipo, Sistema_Operativo, Ip_Equipo,
+        Observaciones, Arquitectura_Equipo, Placa_Torre, Placa_Monitor, Office, Version_Office,
+        Mac_Equipo, Licencia_Windows_Equipo, Serial_Equipo, Antivirus_Equipo, Estado_Equipo,
+        Fecha_actualizacion_equipo
+    )
+    SELECT
+        'PC-' || lpad(i::text, 6, '0'),
+        p.marcas[1 + floor(random() * cardinality(p.marcas))::int],
+        p.modelos[1 + floor(random() * cardinality(p.modelos))::int],
+        CASE WHEN random() < 0.8 THEN 'Escritorio' ELSE 'Portátil' END,
+        CASE WHEN random() < 0.65 THEN 'Asistencial' ELSE 'Administrativo' END,
+        p.unidades[width_bucket(random(), p.limites_unidades)],
+        p.procesadores[1 + floor(random() * cardinality(p.procesadores))::int],
+        (ARRAY[4, 8, 8, 16, 16, 32])[1 + floor(random() * 6)::int],
+        CASE WHEN random() < 0.7 THEN 'DDR4' ELSE 'DDR3' END,
+        p.discos[1 + floor(random() * cardinality(p.discos))::int],
+        p.sistemas[1 + floor(random() * cardinality(p.sistemas))::int],
+        format('10.%%s.%%s.%%s', i / 62500 %% 256, i / 250 %% 250, i %% 250 + 1),
+        'Ninguna',
+        '64 bits',
+        CASE WHEN random() < 0.9 THEN 'PT' || (100000 + i) ELSE 'No Aplica' END,
+        CASE WHEN random() < 0.8 THEN 'PM' || (500000 + i) ELSE 'No Aplica' END,
+        p.offices[1 + floor(random() * cardinality(p.offices))::int],
+        '16.0.' || (10000 + floor(random() * 9000)::int),
+        upper(substr(md5(i::text), 1, 12)),
+        CASE WHEN random() < 0.95 THEN 'Licenciado' ELSE 'No licenciado' END,
+        'SN' || upper(substr(md5('s' || i), 1, 10)),
+        p.antivirus[1 + floor(random() * cardinality(p.antivirus))::int],
+        CASE WHEN random() < 0.85 THEN 'Operativo' WHEN random() < 0.66 THEN 'En reparacion' ELSE 'Baja' END,
+        """ + SQL_FECHA_AL_AZAR + """
+    FROM generate_series(%(desde)s, %(hasta)s) AS i
+    CROSS JOIN (SELECT
+        %(marcas)s::text[] AS marcas, %(modelos)s::text[] AS modelos,
+        %(unidades)s::text[] AS unidades, %(limites_unidades)s::float8[] AS limites_unidades,
+        %(procesadores)s::text[] AS procesadores, %(discos)s::text[] AS discos,
+        %(sistemas)s::text[] AS sistemas, %(offices)s::text[] AS offices,
+        %(antivirus)s::text[] AS antivirus
+    ) AS p
+"""
+
+QUERY_MANTENIMIENTOS = """
+    INSERT INTO Historial_Mantenimiento (
+        fk_equipo_id, Tipo_Mantenimiento, Descripcion_Mantenimiento, fk_tecnico_id, Fecha_Mantenimiento
+    )
+    SELECT """ + SQL_EQUIPO_AL_AZAR + """, t.tipo,
+           CASE t.tipo WHEN 'HARDWARE' THEN p.hardware[1 + floor(random() * cardinality(p.hardware))::int]
+                       ELSE p.software[1 + floor(random() * cardinality(p.software))::int] END,
+           """ + SQL_TECNICO_AL_AZAR + """,
+           """ + SQL_FECHA_AL_AZAR + """
+    FROM generate_series(%(desde)s, %(hasta)s) AS i
+    CROSS JOIN LATERAL (SELECT CASE WHEN random() < 0.45 THEN 'HARDWARE' ELSE 'SOFTWARE' END || '' AS tipo, i) AS t
+    CROSS JOIN (SELECT %(hardware)s::text[] AS hardware, %(software)s::text[] AS software) AS p
+"""
+
+QUERY_TRASLADOS = """
+    INSERT INTO Historial_Traslados (fk_equipo_id, Sede_Origen, Sede_Destino, Observacion, fk_tecnico_id, Fecha)
+    SELECT """ + SQL_EQUIPO_AL_AZAR + """,
+           p.unidades[s.origen],
+           p.unidades[1 + (s.origen + s.salto - 1) %% cardinality(p.unidades)],
+           'Traslado por reasignación de área',
+           """ + SQL_TECNICO_AL_AZAR + """,
+           """ + SQL_FECHA_AL_AZAR + """
+    FROM generate_series(%(desde)s, %(hasta)s) AS i
+    CROSS JOIN (SELECT %(unidades)s::text[] AS unidades, %(limites_unidades)s::float8[] AS limites_unidades) AS p
+    CROSS JOIN LATERAL (SELECT width_bucket(random(), p.limites_unidades) AS origen,
+                               1 + floor(random() * (cardinality(p.unidades) - 1))::int AS salto, i) AS s
+"""
+
+QUERY_ESTADOS = """
+    INSERT INTO Historial_Estado (fk_equipo_id, Estado_Anterior, Estado_Nuevo, Fecha_Estado)
+    SELECT """ + SQL_EQUIPO_AL_AZAR + """,
+           p.estados[e.anterior],
+           p.estados[1 + (e.anterior + e.salto - 1) %% 3],
+           """ + SQL_FECHA_AL_AZAR + """
+    FROM generate_series(%(desde)s, %(hasta)s) AS i
+    CROSS JOIN (SELECT %(estados)s::text[] AS estados) AS p
+    CROSS JOIN LATERAL (SELECT 1 + floor(random() * 3)::int AS anterior,
+                               1 + floor(random() * 2)::int AS salto, i) AS e
+"""
+
+# Responsable activo para ~70 % de los equipos y uno anterior (cerrado) para ~50 %
+QUERY_RESPONSABLES = """
+    INSERT INTO Responsables_Equipo (fk_equipo_id, fk_tecnico_id, Fecha_Inicio, Fecha_Fin, Observacion, Activo)
+    SELECT 'PC-' || lpad(r.i::text, 6, '0'), """ + SQL_TECNICO_AL_AZAR + """,
+           r.inicio, r.fin, 'Asignación inicial', r.activo
+    FROM generate_series(%(desde)s, %(hasta)s) AS i
+    CROSS JOIN LATERAL (
+        SELECT %(referencia)s::timestamp - interval '1 day' * (400 + floor(random() * 800)) AS inicio,
+               %(referencia)s::timestamp - interval '1 day' * (1 + floor(random() * 399)) AS fin,
+               FALSE AS activo, i
+        WHERE random() < 0.5
+        UNION ALL
+        SELECT %(referencia)s::timestamp - interval '1 day' * floor(random() * 399), NULL, TRUE, i
+        WHERE random() < 0.7
+    ) AS r
+"""
+
+
+def crear_usuarios(conn, tecnicos):
+    with conn.cursor() as cur:
+        for rol in ('SUPERUSUARIO', 'CONSULTA'):
+            cur.execute("""
+                INSERT INTO Roles (Nombre_Rol, Descripcion_Rol)
+                SELECT %s, 'Creado por benchmarks/datos_sinteticos.py'
+                WHERE NOT EXISTS (SELECT 1 FROM Roles WHERE Nombre_Rol = %s)
+            """, (rol, rol))
+        cur.execute("""
+            INSERT INTO Usuarios (Cedula_Usuario, Nombre_Usuario, Password_Usuario, fk_Id_Rol)
+            SELECT %(cedula)s, %(nombre)s, %(password)s, Id_Rol FROM Roles WHERE Nombre_Rol = %(rol)s
+            ON CONFLICT (Cedula_Usuario) DO NOTHING
+        """, USUARIO_BENCHMARK)
+        cur.execute("""
+            INSERT INTO Usuarios (Cedula_Usuario, Nombre_Usuario, Password_Usuario, fk_Id_Rol)
+            SELECT %s + n, 'Técnico ' || (n + 1), 'tecnico', (SELECT Id_Rol FROM Roles WHERE Nombre_Rol = 'TECNICO')
+            FROM generate_series(0, %s - 1) AS n
+            ON CONFLICT (Cedula_Usuario) DO NOTHING
+        """, (CEDULA_PRIMER_TECNICO, tecnicos))
+    conn.commit()
+
+
+# Triggers que registran eventos (migraciones/0009 y 0010)
+TRIGGERS_EVENTOS = [
+    ('Equipos', 'trg_evento_equipos_alta'),
+    ('Equipos', 'trg_evento_equipos_cambio'),
+    ('Equipos', 'trg_evento_equipos_baja'),
+    ('Historial_Estado', 'trg_evento_historial_estado'),
+    ('Historial_Traslados', 'trg_evento_historial_traslados'),
+    ('Historial_Mantenimiento', 'trg_evento_historial_mantenimiento'),
+    ('Responsables_Equipo', 'trg_evento_responsables_alta'),
+    ('Responsables_Equipo', 'trg_evento_responsables_cierre'),
+]
+
+
+def generar(conn, args):
+    unidades = leer_unidades_agente()
+    params = {
+        'equipos': args.equipos,
+        'tecnicos': args.tecnicos,
+        'primer_tecnico': CEDULA_PRIMER_TECNICO,
+        'referencia': FECHA_REFERENCIA,
+        'dias': args.anios * 365,
+        'unidades': unidades,
+        'limites_unidades': pesos_acumulados(len(unidades)),
+        'marcas': MARCAS, 'modelos': MODELOS, 'procesadores': PROCESADORES, 'discos': DISCOS,
+        'sistemas': SISTEMAS, 'offices': OFFICES, 'antivirus': ANTIVIRUS,
+        'hardware': DESCRIPCIONES['HARDWARE'], 'software': DESCRIPCIONES['SOFTWARE'],
+        'estados': ESTADOS
+    }
+    conn.autocommit = False
+    crear_usuarios(conn, args.tecnicos)
+
+    with conn.cursor() as cur:
+        # setseed fija la secuencia de random() de esta sesión
+        cur.execute("SELECT setseed(%s)", ((args.semilla % 1000) / 1000,))
+        # Las reglas por fila (validar mantenimiento, cerrar responsable) no
+        # aportan nada en datos generados consistentes y multiplican el tiempo
+        cur.execute("ALTER TABLE Historial_Mantenimiento DISABLE TRIGGER trg_validar_mantenimiento")
+        cur.execute("ALTER TABLE Responsables_Equipo DISABLE TRIGGER trg_cerrar_responsable")
+        # Tampoco los eventos de /api/stream: los datos generados no son cambios
+        for tabla, trigger in TRIGGERS_EVENTOS:
+            cur.execute(f"ALTER TABLE {tabla} DISABLE TRIGGER {trigger}")
+        # Particiones mensuales del historial para todo el rango generado: sin
+        # ellas las fechas pasadas caerían en la partición por defecto
+        cur.execute("""
+            SELECT count(*) FILTER (WHERE fn_crear_particion_historial(tabla, mes::date))
+            FROM unnest(ARRAY['historial_estado', 'historial_mantenimiento', 'historial_traslados']) AS tabla,
+                 generate_series(
+                     date_trunc('month', %(referencia)s::timestamp - make_interval(days => %(dias)s)),
+                     %(referencia)s::timestamp, interval '1 month'
+                 ) AS mes
+        """, params)
+    conn.commit()
+
+    try:
+        print(f"Generando datos ({len(unidades)} unidades de inventario.ps1, semilla {args.semilla}):")
+        por_lotes(conn, 'Equipos', args.equipos, QUERY_EQUIPOS, params)
+        por_lotes(conn, 'Historial_Mantenimiento', args.mantenimientos, QUERY_MANTENIMIENTOS, params)
+        por_lotes(conn, 'Historial_Traslados', args.traslados, QUERY_TRASLADOS, params)
+        por_lotes(conn, 'Historial_Estado', args.estados, QUERY_ESTADOS, params)
+        por_lotes(conn, 'Responsables_Equipo (por equipo)', args.equipos, QUERY_RESPONSABLES, params)
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE Historial_Mantenimiento ENABLE TRIGGER trg_validar_mantenimiento")
+            cur.execute("ALTER TABLE Responsables_Equipo ENABLE TRIGGER trg_cerrar_responsable")
+            for tabla, trigger in TRIGGERS_EVENTOS:
+                cur.execute(f"ALTER TABLE {tabla} ENABLE TRIGGER {trigger}")
+        conn.commit()
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        inicio = time.perf_counter()
+        cur.execute("VACUUM ANALYZE")
+        print(f"  VACUUM ANALYZE ({time.perf_counter() - inicio:.1f} s)")
+
+
+def contar_filas(conn):
+    """Filas por tabla (lo guarda carga.py junto a los resultados)"""
+    tablas = ['Equipos', 'Historial_Mantenimiento', 'Historial_Traslados',
+              'Historial_Estado', 'Responsables_Equipo', 'Usuarios']
+    filas = {}
+    with conn.cursor() as cur:
+        for tabla in tablas:
+            cur.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier(tabla.lower())))
+            filas[tabla] = cur.fetchone()[0]
+    return filas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base', default=BASE_DEFECTO, help='nombre de la base a crear')
+    parser.add_argument('--recrear', action='store_true', help='borrar la base si ya existe')
+    parser.add_argument('--equipos', type=int, default=10000)
+    parser.add_argument('--mantenimientos', type=int, default=200000)
+    parser.add_argument('--traslados', type=int, default=100000)
+    parser.add_argument('--estados', type=int, default=100000)
+    parser.add_argument('--tecnicos', type=int, default=40)
+    parser.add_argument('--anios', type=int, default=5, help='años de historial hacia atrás')
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.equipos > 999999:
+        parser.error('--equipos admite hasta 999999 (nombres PC-000001 a PC-999999)')
+
+    inicio = time.perf_counter()
+    crear_base(args.base, args.recrear)
+    conn = conectar(args.base)
+    try:
+        aplicar_esquema(conn)
+        generar(conn, args)
+        for tabla, cantidad in contar_filas(conn).items():
+            print(f"  {tabla}: {cantidad:,}")
+    finally:
+        conn.close()
+    print(f"Base {args.base} lista en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
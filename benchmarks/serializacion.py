@@ -0,0 +1,119 @@
+"""
+Benchmark de serialización y bytes enviados para /api/equipos y
+/api/reportes/historial-estados.
+
+Compara el proveedor JSON por defecto de Flask sin compresión (antes) con
+ProveedorJSONRapido + gzip/brotli (después) sobre filas sintéticas con la
+misma forma que devuelve psycopg2 (RealDictRow con datetime).
+
+Uso:
+    python benchmarks/serializacion.py --equipos 5000 --historial 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+
+import servidor_api
+from servidor_api import ProveedorJSONRapido, app, comprimir
+
+UNIDADES = ["Santa Clara", "San Blas", "Materno Infantil", "Victoria", "Diana Turbay", "Olaya"]
+ESTADOS = ["Operativo", "En reparacion", "Baja"]
+
+
+def filas_equipos(n):
+    base = datetime(2024, 1, 1)
+    filas = []
+    for i in range(n):
+        obs = " ".join(
+            f"Mantenimiento (HARDWARE - {d:02d}/03/2024): limpieza interna y cambio de pasta térmica."
+            for d in range(random.randint(0, 12))
+        )
+        filas.append({
+            "nombre_equipo": f"SUB-{i:06d}", "marca_equipo": "Dell Inc.", "modelo_equipo": "OptiPlex 7080",
+            "tipo_equipo": "Escritorio", "tipo_area": "Asistencial", "unidad_actual": random.choice(UNIDADES),
+            "procesador_equipo": "Intel(R) Core(TM) i5-10500 CPU @ 3.10GHz", "ram_equipo": 16,
+            "tipo_ram": "DDR4", "disco_equipo": "KINGSTON SA400S37480G - 447 GB - SSD",
+            "sistema_operativo": "Microsoft Windows 10 Pro", "ip_equipo": f"10.{i % 250}.{i % 7}.{i % 200}",
+            "observaciones": obs or "Ninguna", "arquitectura_equipo": "64 bits", "placa_torre": f"PT{i}",
+            "placa_monitor": f"PM{i}", "office": "Microsoft Office Profesional Plus 2019",
+            "version_office": "16.0.10827.20181", "mac_equipo": "00-1A-2B-3C-4D-5E",
+            "licencia_windows_equipo": "Licenciado", "serial_equipo": f"SN{i:08d}",
+            "antivirus_equipo": "Windows Defender", "estado_equipo": random.choice(ESTADOS),
+            "fecha_actualizacion_equipo": base + timedelta(minutes=i)
+        })
+    return filas
+
+
+def filas_historial(n):
+    base = datetime(2023, 1, 1)
+    return [{
+        "id_historial": i, "fk_equipo_id": f"SUB-{i % 5000:06d}",
+        "estado_anterior": "Operativo", "estado_nuevo": "En reparacion",
+        "fecha_estado": base + timedelta(minutes=i), "marca_equipo": "Dell Inc.",
+        "modelo_equipo": "OptiPlex 7080", "unidad_actual": random.choice(UNIDADES)
+    } for i in range(n)]
+
+
+def medir(proveedor, obj, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        with app.app_context():
+            datos = proveedor.response(obj).get_data()
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, datos
+
+
+def comparar(nombre, obj, repeticiones):
+    antes = DefaultJSONProvider(app)
+    antes.ensure_ascii = False
+    despues = ProveedorJSONRapido(app)
+    despues.ensure_ascii = False
+
+    t_antes, datos_antes = medir(antes, obj, repeticiones)
+    t_despues, datos_despues = medir(despues, obj, repeticiones)
+    assert json.loads(datos_antes) == json.loads(datos_despues), "El JSON cambió de contenido"
+
+    resultado = {
+        "endpoint": nombre,
+        "serializacion_ms_antes": round(t_antes * 1000, 2),
+        "serializacion_ms_despues": round(t_despues * 1000, 2),
+        "bytes_antes": len(datos_antes),
+        "bytes_gzip": len(comprimir(datos_despues, 'gzip'))
+    }
+    inicio = time.perf_counter()
+    comprimir(datos_despues, 'gzip')
+    resultado["gzip_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    if servidor_api.brotli is not None:
+        inicio = time.perf_counter()
+        resultado["bytes_br"] = len(comprimir(datos_despues, 'br'))
+        resultado["br_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--equipos', type=int, default=5000)
+    parser.add_argument('--historial', type=int, default=50000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(1)
+    resultados = [
+        comparar("/api/equipos", {"success": True, "equipos": filas_equipos(args.equipos)}, args.repeticiones),
+        comparar("/api/reportes/historial-estados", filas_historial(args.historial), args.repeticiones)
+    ]
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
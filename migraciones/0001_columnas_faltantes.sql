@@ -0,0 +1,21 @@
+-- InventarioDB.sql no crea estas columnas aunque se usan:
+--   Usuarios.Token             login y require_auth de servidor_api.py
+--   Equipos.Id_Tecnico_Actual  la FK fk_id_tecnico del script falla sin ella
+ALTER TABLE Usuarios ADD COLUMN IF NOT EXISTS Token varchar(100);
+
+ALTER TABLE Equipos ADD COLUMN IF NOT EXISTS Id_Tecnico_Actual int;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_id_tecnico') THEN
+        ALTER TABLE Equipos
+        ADD CONSTRAINT fk_id_tecnico
+        FOREIGN KEY (Id_Tecnico_Actual)
+        REFERENCES Usuarios(Cedula_Usuario);
+    END IF;
+END;
+$$;
+
+-- require_auth busca el usuario por token cuando no está en la caché
+CREATE INDEX IF NOT EXISTS idx_usuarios_token
+ON Usuarios (Token) WHERE Token IS NOT NULL;
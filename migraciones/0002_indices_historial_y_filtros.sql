@@ -0,0 +1,58 @@
+-- migrar: sin-transaccion
+-- Índices compuestos con la forma WHERE ... ORDER BY de cada endpoint.
+-- CONCURRENTLY no bloquea escrituras mientras se construyen (el agente
+-- sigue reportando), pero no puede ir dentro de una transacción.
+
+-- Historial de un equipo (/api/mantenimientos/<equipo>, dossier):
+-- WHERE fk_equipo_id = %s ORDER BY Fecha DESC, Id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mantenimiento_equipo_fecha
+ON Historial_Mantenimiento (fk_equipo_id, Fecha_Mantenimiento DESC, Id_Mantenimiento DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_traslados_equipo_fecha
+ON Historial_Traslados (fk_equipo_id, Fecha DESC, Id_Traslado DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_estado_equipo_fecha
+ON Historial_Estado (fk_equipo_id, Fecha_Estado DESC, Id_Historial DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_responsables_equipo_fecha
+ON Responsables_Equipo (fk_equipo_id, Fecha_Inicio DESC, Id_Responsabilidad DESC);
+
+-- Los anteriores empiezan por fk_equipo_id: los de una sola columna sobran
+DROP INDEX CONCURRENTLY IF EXISTS idx_mantenimiento_equipo;
+DROP INDEX CONCURRENTLY IF EXISTS idx_traslados_equipo;
+DROP INDEX CONCURRENTLY IF EXISTS idx_responsables_equipo;
+
+-- Listados generales y reportes por período: ORDER BY Fecha DESC y
+-- rangos de fecha (mantenimientos-periodo, historial-estados)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mantenimiento_fecha
+ON Historial_Mantenimiento (Fecha_Mantenimiento DESC, Id_Mantenimiento DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mantenimiento_tipo_fecha
+ON Historial_Mantenimiento (Tipo_Mantenimiento, Fecha_Mantenimiento DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_traslados_fecha
+ON Historial_Traslados (Fecha DESC, Id_Traslado DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_estado_fecha
+ON Historial_Estado (Fecha_Estado DESC, Id_Historial DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_responsables_fecha
+ON Responsables_Equipo (Fecha_Inicio DESC, Id_Responsabilidad DESC);
+
+-- Reporte equipos-por-tecnico: JOIN por técnico solo con el responsable activo
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_responsables_tecnico_activo
+ON Responsables_Equipo (fk_tecnico_id) WHERE Activo = TRUE;
+
+-- Filtros de /api/equipos y /api/exportar/excel (Tipo_Equipo = %s, ...)
+-- con el listado completo ORDER BY Nombre_Equipo. Los índices por
+-- COALESCE(Tipo_Equipo, '') de 0004 sirven al orden por tipo, no al
+-- filtro por igualdad.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_tipo_filtro
+ON Equipos (Tipo_Equipo, Nombre_Equipo);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_area_filtro
+ON Equipos (Tipo_Area, Nombre_Equipo);
+
+-- Combinación más usada en el panel: unidad y estado
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_unidad_estado
+ON Equipos (Unidad_Actual, Estado_Equipo, Nombre_Equipo);
@@ -0,0 +1,190 @@
+-- Historial_Estado, Historial_Mantenimiento e Historial_Traslados pasan a
+-- tablas particionadas por mes según su fecha. Las consultas con rango de
+-- fechas solo leen los meses del rango, y los meses viejos se pueden
+-- archivar (archivar_historial.py) sin DELETE masivos.
+--
+-- La conversión copia cada tabla dentro de esta transacción: bloquea las
+-- escrituras al historial mientras dura (correr en ventana de mantenimiento).
+
+-- Meses archivados: archivo .csv.gz, rango y columnas para leerlo de nuevo
+CREATE TABLE IF NOT EXISTS Historial_Archivado (
+    Id_Archivo SERIAL PRIMARY KEY,
+    Tabla varchar(60) NOT NULL,
+    Desde date NOT NULL,
+    Hasta date NOT NULL,
+    Archivo varchar(300) NOT NULL,
+    Filas bigint NOT NULL,
+    Bytes bigint,
+    Suma_Verificacion char(64),
+    Columnas jsonb NOT NULL,
+    Fecha_Archivado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (Tabla, Desde)
+);
+
+-- regla crea la particion del mes que empieza en `desde` (tabla_pAAAA_MM).
+-- Las filas de ese mes que hayan caido en la particion por defecto se
+-- mueven a la nueva antes de adjuntarla.
+CREATE OR REPLACE FUNCTION fn_crear_particion_historial(tabla text, desde date)
+RETURNS boolean AS $$
+DECLARE
+    columna text;
+    hasta date := (date_trunc('month', desde) + interval '1 month')::date;
+    particion text := format('%s_p%s', tabla, to_char(desde, 'YYYY_MM'));
+    defecto text := tabla || '_pdefecto';
+BEGIN
+    desde := date_trunc('month', desde)::date;
+    IF to_regclass(particion) IS NOT NULL THEN
+        RETURN FALSE;
+    END IF;
+
+    SELECT a.attname INTO columna
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = tabla::regclass;
+
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', particion, tabla);
+    IF to_regclass(defecto) IS NOT NULL THEN
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM movidas',
+            defecto, columna, desde, columna, hasta, particion
+        );
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', tabla, particion, desde, hasta);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla particiones del mes actual y los `meses_adelante` siguientes para
+-- las tres tablas, más las de los meses que hayan caído en la partición por
+-- defecto (cargas con fechas viejas). La llaman archivar_historial.py y cada
+-- worker al iniciar.
+CREATE OR REPLACE FUNCTION fn_asegurar_particiones_historial(meses_adelante int DEFAULT 3)
+RETURNS int AS $$
+DECLARE
+    tabla text;
+    columna text;
+    mes date;
+    creadas int := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('particiones_historial'));
+    FOREACH tabla IN ARRAY ARRAY['historial_estado', 'historial_mantenimiento', 'historial_traslados'] LOOP
+        SELECT a.attname INTO columna
+        FROM pg_partitioned_table p
+        JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+        WHERE p.partrelid = tabla::regclass;
+
+        FOR mes IN EXECUTE format(
+            'SELECT generate_series(date_trunc(''month'', CURRENT_DATE),'
+            '    date_trunc(''month'', CURRENT_DATE) + make_interval(months => %s),'
+            '    interval ''1 month'')::date '
+            'UNION SELECT DISTINCT date_trunc(''month'', %I)::date FROM %I WHERE %I IS NOT NULL',
+            meses_adelante, columna, tabla || '_pdefecto', columna
+        )
+        LOOP
+            IF fn_crear_particion_historial(tabla, mes) THEN
+                creadas := creadas + 1;
+            END IF;
+        END LOOP;
+    END LOOP;
+    RETURN creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Conversión: se renombra la tabla, se crea la particionada con las mismas
+-- columnas y se copian las filas. Índices, llaves foráneas, triggers y
+-- permisos se recrean desde las definiciones de la tabla anterior, así
+-- quedan iguales a los de InventarioDB.sql y las migraciones previas.
+DO $$
+DECLARE
+    t record;
+    previa text;
+    calificada text;
+    secuencia text;
+    definiciones text[];
+    definicion text;
+    fk record;
+    permiso record;
+    mes date;
+BEGIN
+    FOR t IN
+        SELECT * FROM (VALUES
+            ('historial_estado', 'fecha_estado', 'id_historial'),
+            ('historial_mantenimiento', 'fecha_mantenimiento', 'id_mantenimiento'),
+            ('historial_traslados', 'fecha', 'id_traslado')
+        ) AS v(tabla, fecha, id)
+    LOOP
+        IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = t.tabla::regclass) THEN
+            CONTINUE;
+        END IF;
+
+        previa := t.tabla || '_previa';
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', t.tabla, previa);
+        SELECT format('%I.%I', n.nspname, c.relname) INTO calificada
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.oid = previa::regclass;
+
+        -- La fecha puede ser NULL (columna sin NOT NULL): esas filas van a la
+        -- particion por defecto, y la unicidad del id incluye la fecha
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS, UNIQUE (%I, %I)) '
+            'PARTITION BY RANGE (%I)',
+            t.tabla, previa, t.id, t.fecha, t.fecha
+        );
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', t.tabla || '_pdefecto', t.tabla);
+
+        FOR mes IN EXECUTE format(
+            'SELECT generate_series('
+            '    LEAST(date_trunc(''month'', min(%I)), date_trunc(''month'', CURRENT_DATE)),'
+            '    date_trunc(''month'', CURRENT_DATE) + interval ''3 months'','
+            '    interval ''1 month'')::date FROM %I',
+            t.fecha, previa
+        ) LOOP
+            PERFORM fn_crear_particion_historial(t.tabla, mes);
+        END LOOP;
+
+        EXECUTE format('INSERT INTO %I SELECT * FROM %I', t.tabla, previa);
+
+        -- La secuencia del id pertenece a la tabla anterior: se traspasa
+        -- para que no se borre con ella
+        secuencia := pg_get_serial_sequence(previa, t.id);
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.%I', secuencia, t.tabla, t.id);
+
+        FOR fk IN
+            SELECT conname, pg_get_constraintdef(oid) AS definicion
+            FROM pg_constraint WHERE conrelid = previa::regclass AND contype = 'f'
+        LOOP
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', t.tabla, fk.conname, fk.definicion);
+        END LOOP;
+
+        FOR permiso IN
+            SELECT a.privilege_type, r.rolname
+            FROM pg_class c
+            CROSS JOIN LATERAL aclexplode(c.relacl) a
+            JOIN pg_roles r ON r.oid = a.grantee
+            WHERE c.oid = previa::regclass AND a.grantee <> c.relowner
+        LOOP
+            EXECUTE format('GRANT %s ON %I TO %I', permiso.privilege_type, t.tabla, permiso.rolname);
+        END LOOP;
+
+        -- Índices (salvo el de la llave primaria) y triggers: se guardan las
+        -- definiciones, se borra la tabla anterior y se crean sobre la nueva
+        SELECT array_agg(pg_get_indexdef(i.indexrelid)) INTO definiciones
+        FROM pg_index i
+        WHERE i.indrelid = previa::regclass AND NOT i.indisprimary;
+        SELECT definiciones || array_agg(pg_get_triggerdef(tg.oid)) INTO definiciones
+        FROM pg_trigger tg
+        WHERE tg.tgrelid = previa::regclass AND NOT tg.tgisinternal;
+
+        EXECUTE format('DROP TABLE %I', previa);
+
+        FOREACH definicion IN ARRAY coalesce(definiciones, '{}') LOOP
+            definicion := replace(definicion, ' ON ' || calificada || ' ', format(' ON %I ', t.tabla));
+            definicion := replace(definicion, format(' ON %I ', previa), format(' ON %I ', t.tabla));
+            EXECUTE definicion;
+        END LOOP;
+
+        EXECUTE format('ANALYZE %I', t.tabla);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,18 @@
+-- migrar: sin-transaccion
+-- Paginación por keyset de /api/equipos: WHERE (orden, Nombre_Equipo) > cursor
+-- ORDER BY orden, Nombre_Equipo. Las columnas que admiten NULL se indexan
+-- por el mismo COALESCE con que ordena la API.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_unidad_nombre
+ON Equipos (Unidad_Actual, Nombre_Equipo);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_estado_nombre
+ON Equipos (Estado_Equipo, Nombre_Equipo);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_tipo_nombre
+ON Equipos ((COALESCE(Tipo_Equipo, '')), Nombre_Equipo);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_area_nombre
+ON Equipos ((COALESCE(Tipo_Area, '')), Nombre_Equipo);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_equipos_fecha_nombre
+ON Equipos ((COALESCE(Fecha_actualizacion_equipo, 'epoch'::timestamp)), Nombre_Equipo);
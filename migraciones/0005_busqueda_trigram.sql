@@ -0,0 +1,29 @@
+-- Búsqueda por subcadena (LOWER(col) LIKE '%texto%') con índices trigram.
+-- pg_trgm viene en el paquete contrib de PostgreSQL: si el servidor no lo
+-- tiene, la búsqueda funciona igual pero recorre Equipos, y se avisa.
+-- Después de instalarlo, estas sentencias se pueden correr a mano.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        RAISE WARNING 'pg_trgm no está instalado en el servidor: la búsqueda por subcadena no tendrá índices';
+        RETURN;
+    END IF;
+
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+    CREATE INDEX IF NOT EXISTS idx_equipos_nombre_trgm
+    ON Equipos USING gin (LOWER(Nombre_Equipo) gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_equipos_ip_trgm
+    ON Equipos USING gin (LOWER(Ip_Equipo) gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_equipos_placa_torre_trgm
+    ON Equipos USING gin (LOWER(Placa_Torre) gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_equipos_placa_monitor_trgm
+    ON Equipos USING gin (LOWER(Placa_Monitor) gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_equipos_serial_trgm
+    ON Equipos USING gin (LOWER(Serial_Equipo) gin_trgm_ops);
+END;
+$$;
@@ -0,0 +1,51 @@
+-- Huella de contenido del equipo: si el agente reporta exactamente los mismos
+-- datos no se reescribe la fila, solo se marca la fecha del último reporte.
+ALTER TABLE Equipos ADD COLUMN IF NOT EXISTS Huella_Equipo varchar(32);
+ALTER TABLE Equipos ADD COLUMN IF NOT EXISTS Fecha_Ultimo_Reporte TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Espacio libre en cada página para que el toque de Fecha_Ultimo_Reporte
+-- sea una actualización HOT (sin tocar índices). Rige para las páginas
+-- que se escriban de aquí en adelante.
+ALTER TABLE Equipos SET (fillfactor = 90);
+
+CREATE OR REPLACE FUNCTION fn_huella_equipo(VARIADIC valores text[])
+RETURNS varchar AS $$
+    SELECT md5(array_to_json(valores)::text);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- regla la huella se calcula con las columnas que escribe el agente
+CREATE OR REPLACE FUNCTION fn_actualizar_huella_equipo()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.Huella_Equipo := fn_huella_equipo(
+        NEW.Marca_Equipo, NEW.Modelo_Equipo, NEW.Tipo_Equipo, NEW.Tipo_Area,
+        NEW.Unidad_Actual, NEW.Procesador_Equipo, NEW.Ram_Equipo::text, NEW.Tipo_Ram,
+        NEW.Disco_Equipo, NEW.Sistema_Operativo, NEW.Ip_Equipo, NEW.Observaciones,
+        NEW.Arquitectura_Equipo, NEW.Office, NEW.Version_Office, NEW.Mac_Equipo,
+        NEW.Licencia_Windows_Equipo, NEW.Antivirus_Equipo
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- trigger huella (no se dispara cuando solo cambia Fecha_Ultimo_Reporte)
+DROP TRIGGER IF EXISTS trg_huella_equipo ON Equipos;
+CREATE TRIGGER trg_huella_equipo
+BEFORE INSERT OR UPDATE OF
+    Marca_Equipo, Modelo_Equipo, Tipo_Equipo, Tipo_Area, Unidad_Actual,
+    Procesador_Equipo, Ram_Equipo, Tipo_Ram, Disco_Equipo, Sistema_Operativo,
+    Ip_Equipo, Observaciones, Arquitectura_Equipo, Office, Version_Office,
+    Mac_Equipo, Licencia_Windows_Equipo, Antivirus_Equipo
+ON Equipos
+FOR EACH ROW
+EXECUTE FUNCTION fn_actualizar_huella_equipo();
+
+-- Cálculo inicial de la huella para los equipos existentes
+UPDATE Equipos SET Huella_Equipo = fn_huella_equipo(
+    Marca_Equipo, Modelo_Equipo, Tipo_Equipo, Tipo_Area,
+    Unidad_Actual, Procesador_Equipo, Ram_Equipo::text, Tipo_Ram,
+    Disco_Equipo, Sistema_Operativo, Ip_Equipo, Observaciones,
+    Arquitectura_Equipo, Office, Version_Office, Mac_Equipo,
+    Licencia_Windows_Equipo, Antivirus_Equipo
+)
+WHERE Huella_Equipo IS NULL;
@@ -0,0 +1,62 @@
+-- Versión por tabla para los ETag de la API (GET condicional). 0012 cambia
+-- el contador por un registro de cambios sin locks compartidos.
+CREATE TABLE IF NOT EXISTS Versiones_Tabla (
+    Tabla varchar(60) PRIMARY KEY,
+    Version bigint NOT NULL DEFAULT 0,
+    Fecha_Cambio TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- regla cada sentencia que modifica la tabla incrementa su versión
+CREATE OR REPLACE FUNCTION fn_incrementar_version_tabla()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO Versiones_Tabla (Tabla, Version)
+    VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (Tabla) DO UPDATE
+    SET Version = Versiones_Tabla.Version + 1,
+        Fecha_Cambio = CURRENT_TIMESTAMP;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- triggers de versión (por sentencia, no por fila)
+DROP TRIGGER IF EXISTS trg_version_equipos ON Equipos;
+CREATE TRIGGER trg_version_equipos
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Equipos
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+DROP TRIGGER IF EXISTS trg_version_historial_estado ON Historial_Estado;
+CREATE TRIGGER trg_version_historial_estado
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Historial_Estado
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+DROP TRIGGER IF EXISTS trg_version_historial_mantenimiento ON Historial_Mantenimiento;
+CREATE TRIGGER trg_version_historial_mantenimiento
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Historial_Mantenimiento
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+DROP TRIGGER IF EXISTS trg_version_historial_traslados ON Historial_Traslados;
+CREATE TRIGGER trg_version_historial_traslados
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Historial_Traslados
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+DROP TRIGGER IF EXISTS trg_version_responsables_equipo ON Responsables_Equipo;
+CREATE TRIGGER trg_version_responsables_equipo
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Responsables_Equipo
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+-- En Usuarios el login solo cambia el Token: no invalida las respuestas
+DROP TRIGGER IF EXISTS trg_version_usuarios ON Usuarios;
+CREATE TRIGGER trg_version_usuarios
+AFTER INSERT OR DELETE OR TRUNCATE OR UPDATE OF Nombre_Usuario, Estado_Usuario, fk_Id_Rol ON Usuarios
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+GRANT SELECT, INSERT, UPDATE ON Versiones_Tabla TO rol_tecnico;
+GRANT ALL PRIVILEGES ON Versiones_Tabla TO rol_admin;
@@ -0,0 +1,26 @@
+-- Cada cambio de versión de una tabla (triggers de sentencia de 0007 o
+-- subida manual, como la de archivar_historial.py)
+-- se notifica en el canal inventario_cambios con el nombre de la tabla.
+-- Los workers de la API escuchan ese canal para invalidar su caché de
+-- lecturas. NOTIFY se entrega al confirmar la transacción y las
+-- notificaciones repetidas de una misma transacción llegan una sola vez.
+CREATE OR REPLACE FUNCTION fn_notificar_cambio_tabla()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('inventario_cambios', NEW.Tabla);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_cambio_tabla ON Versiones_Tabla;
+CREATE TRIGGER trg_notificar_cambio_tabla
+AFTER INSERT OR UPDATE ON Versiones_Tabla
+FOR EACH ROW
+EXECUTE FUNCTION fn_notificar_cambio_tabla();
+
+-- /api/roles y /api/usuarios leen Roles: también lleva versión
+DROP TRIGGER IF EXISTS trg_version_roles ON Roles;
+CREATE TRIGGER trg_version_roles
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Roles
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
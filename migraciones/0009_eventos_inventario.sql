@@ -0,0 +1,162 @@
+-- Eventos de cambio para /api/stream. Cada cambio de un equipo, de su
+-- estado, un traslado, un mantenimiento o la asignación/liberación de un
+-- responsable deja una fila compacta en Eventos_Inventario y se notifica en
+-- el canal inventario_eventos al confirmar la transacción. El id es el
+-- "id" del evento SSE: un cliente que se reconecta con Last-Event-ID recibe
+-- lo que le falta leyendo desde ahí. La API borra los eventos viejos
+-- (EVENTOS_RETENCION_HORAS).
+CREATE TABLE IF NOT EXISTS Eventos_Inventario (
+    Id_Evento BIGSERIAL PRIMARY KEY,
+    Tipo varchar(30) NOT NULL,
+    Equipo varchar(30),
+    Datos jsonb NOT NULL DEFAULT '{}',
+    Fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_eventos_inventario_fecha
+ON Eventos_Inventario (Fecha);
+
+-- regla guarda el evento y lo notifica. El payload de NOTIFY tiene un
+-- límite de 8000 bytes: si el evento no cabe se notifica solo el id y
+-- los workers lo leen de la tabla.
+CREATE OR REPLACE FUNCTION fn_registrar_evento(tipo text, equipo text, datos jsonb)
+RETURNS void AS $$
+DECLARE
+    id bigint;
+    payload text;
+BEGIN
+    INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+    VALUES (tipo, equipo, coalesce(datos, '{}'))
+    RETURNING Id_Evento INTO id;
+
+    payload := json_build_object('id', id, 'tipo', tipo, 'equipo', equipo, 'datos', coalesce(datos, '{}'))::text;
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('id', id)::text;
+    END IF;
+    PERFORM pg_notify('inventario_eventos', payload);
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla alta, cambio o borrado de un equipo. En un cambio solo viajan las
+-- columnas que cambiaron; el estado tiene su propio evento (Historial_Estado)
+-- y la fecha del último reporte del agente no cuenta como cambio.
+CREATE OR REPLACE FUNCTION fn_evento_equipo()
+RETURNS TRIGGER AS $$
+DECLARE
+    datos jsonb;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM fn_registrar_evento('equipo_eliminado', OLD.Nombre_Equipo, NULL);
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' THEN
+        datos := jsonb_build_object(
+            'alta', true,
+            'marca_equipo', NEW.Marca_Equipo, 'modelo_equipo', NEW.Modelo_Equipo,
+            'tipo_equipo', NEW.Tipo_Equipo, 'tipo_area', NEW.Tipo_Area,
+            'unidad_actual', NEW.Unidad_Actual, 'estado_equipo', NEW.Estado_Equipo,
+            'ip_equipo', NEW.Ip_Equipo
+        );
+    ELSE
+        SELECT jsonb_object_agg(nuevo.key, nuevo.value) INTO datos
+        FROM jsonb_each(to_jsonb(NEW)) AS nuevo
+        WHERE nuevo.key NOT IN ('estado_equipo', 'huella_equipo', 'fecha_ultimo_reporte', 'fecha_actualizacion_equipo')
+          AND nuevo.value IS DISTINCT FROM to_jsonb(OLD) -> nuevo.key;
+        IF datos IS NULL THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    PERFORM fn_registrar_evento('equipo', NEW.Nombre_Equipo, datos);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_evento_estado()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM fn_registrar_evento('estado', NEW.fk_equipo_id, jsonb_build_object(
+        'anterior', NEW.Estado_Anterior, 'nuevo', NEW.Estado_Nuevo
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_evento_traslado()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM fn_registrar_evento('traslado', NEW.fk_equipo_id, jsonb_build_object(
+        'id_traslado', NEW.Id_Traslado, 'sede_origen', NEW.Sede_Origen,
+        'sede_destino', NEW.Sede_Destino, 'fk_tecnico_id', NEW.fk_tecnico_id
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_evento_mantenimiento()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM fn_registrar_evento('mantenimiento', NEW.fk_equipo_id, jsonb_build_object(
+        'id_mantenimiento', NEW.Id_Mantenimiento, 'tipo_mantenimiento', NEW.Tipo_Mantenimiento,
+        'fk_tecnico_id', NEW.fk_tecnico_id
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla asignar un responsable cierra el anterior (trg_cerrar_responsable):
+-- llegan "responsable_liberado" y luego "responsable_asignado"
+CREATE OR REPLACE FUNCTION fn_evento_responsable()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.Activo THEN
+            PERFORM fn_registrar_evento('responsable_asignado', NEW.fk_equipo_id, jsonb_build_object(
+                'id_responsabilidad', NEW.Id_Responsabilidad, 'fk_tecnico_id', NEW.fk_tecnico_id
+            ));
+        END IF;
+    ELSIF OLD.Activo AND NOT coalesce(NEW.Activo, FALSE) THEN
+        PERFORM fn_registrar_evento('responsable_liberado', NEW.fk_equipo_id, jsonb_build_object(
+            'id_responsabilidad', NEW.Id_Responsabilidad, 'fk_tecnico_id', NEW.fk_tecnico_id
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+--triggers de eventos (por fila, después del cambio)
+DROP TRIGGER IF EXISTS trg_evento_equipos ON Equipos;
+CREATE TRIGGER trg_evento_equipos
+AFTER INSERT OR UPDATE OR DELETE ON Equipos
+FOR EACH ROW
+EXECUTE FUNCTION fn_evento_equipo();
+
+DROP TRIGGER IF EXISTS trg_evento_historial_estado ON Historial_Estado;
+CREATE TRIGGER trg_evento_historial_estado
+AFTER INSERT ON Historial_Estado
+FOR EACH ROW
+EXECUTE FUNCTION fn_evento_estado();
+
+DROP TRIGGER IF EXISTS trg_evento_historial_traslados ON Historial_Traslados;
+CREATE TRIGGER trg_evento_historial_traslados
+AFTER INSERT ON Historial_Traslados
+FOR EACH ROW
+EXECUTE FUNCTION fn_evento_traslado();
+
+DROP TRIGGER IF EXISTS trg_evento_historial_mantenimiento ON Historial_Mantenimiento;
+CREATE TRIGGER trg_evento_historial_mantenimiento
+AFTER INSERT ON Historial_Mantenimiento
+FOR EACH ROW
+EXECUTE FUNCTION fn_evento_mantenimiento();
+
+DROP TRIGGER IF EXISTS trg_evento_responsables_equipo ON Responsables_Equipo;
+CREATE TRIGGER trg_evento_responsables_equipo
+AFTER INSERT OR UPDATE OF Activo ON Responsables_Equipo
+FOR EACH ROW
+EXECUTE FUNCTION fn_evento_responsable();
+
+GRANT SELECT, INSERT ON Eventos_Inventario TO rol_tecnico;
+GRANT USAGE ON SEQUENCE eventos_inventario_id_evento_seq TO rol_tecnico;
+GRANT ALL PRIVILEGES ON Eventos_Inventario TO rol_admin;
+GRANT ALL PRIVILEGES ON SEQUENCE eventos_inventario_id_evento_seq TO rol_admin;
@@ -0,0 +1,96 @@
+-- Reasignación de responsables en lote (/api/responsables/masivo): la API
+-- cierra los responsables activos de todos los equipos con un UPDATE y
+-- luego inserta los nuevos con un INSERT ... SELECT. Marca la transacción
+-- con app.responsables_en_lote para que trg_cerrar_responsable no corra
+-- una vez por fila insertada (ya no hay activos que cerrar).
+DROP TRIGGER IF EXISTS trg_cerrar_responsable ON Responsables_Equipo;
+CREATE TRIGGER trg_cerrar_responsable
+BEFORE INSERT
+ON Responsables_Equipo
+FOR EACH ROW
+WHEN (current_setting('app.responsables_en_lote', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION fn_cerrar_responsable_anterior();
+
+-- regla notifica un evento ya guardado (mismo payload que fn_registrar_evento)
+CREATE OR REPLACE FUNCTION fn_notificar_evento(id bigint, tipo text, equipo text, datos jsonb)
+RETURNS void AS $$
+DECLARE
+    payload text := json_build_object('id', id, 'tipo', tipo, 'equipo', equipo, 'datos', datos)::text;
+BEGIN
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('id', id)::text;
+    END IF;
+    PERFORM pg_notify('inventario_eventos', payload);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_registrar_evento(tipo text, equipo text, datos jsonb)
+RETURNS void AS $$
+DECLARE
+    id bigint;
+BEGIN
+    INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+    VALUES (tipo, equipo, coalesce(datos, '{}'))
+    RETURNING Id_Evento INTO id;
+
+    PERFORM fn_notificar_evento(id, tipo, equipo, coalesce(datos, '{}'));
+END;
+$$ LANGUAGE plpgsql;
+
+-- Los eventos de responsables pasan a triggers por sentencia con tablas de
+-- transición: un lote de N equipos es un solo INSERT en Eventos_Inventario
+-- (más un NOTIFY por evento) en lugar de N llamadas al trigger.
+CREATE OR REPLACE FUNCTION fn_eventos_responsables()
+RETURNS TRIGGER AS $$
+DECLARE
+    evento record;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR evento IN
+            INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+            SELECT 'responsable_asignado', n.fk_equipo_id, jsonb_build_object(
+                'id_responsabilidad', n.Id_Responsabilidad, 'fk_tecnico_id', n.fk_tecnico_id
+            )
+            FROM nuevas n
+            WHERE n.Activo
+            ORDER BY n.Id_Responsabilidad
+            RETURNING Id_Evento, Tipo, Equipo, Datos
+        LOOP
+            PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+        END LOOP;
+    ELSE
+        FOR evento IN
+            INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+            SELECT 'responsable_liberado', n.fk_equipo_id, jsonb_build_object(
+                'id_responsabilidad', n.Id_Responsabilidad, 'fk_tecnico_id', n.fk_tecnico_id
+            )
+            FROM viejas v
+            JOIN nuevas n ON n.Id_Responsabilidad = v.Id_Responsabilidad
+            WHERE v.Activo AND NOT coalesce(n.Activo, FALSE)
+            ORDER BY n.Id_Responsabilidad
+            RETURNING Id_Evento, Tipo, Equipo, Datos
+        LOOP
+            PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_evento_responsables_equipo ON Responsables_Equipo;
+DROP FUNCTION IF EXISTS fn_evento_responsable();
+
+--triggers de eventos de responsables (una tabla de transición por evento)
+DROP TRIGGER IF EXISTS trg_evento_responsables_alta ON Responsables_Equipo;
+CREATE TRIGGER trg_evento_responsables_alta
+AFTER INSERT ON Responsables_Equipo
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_responsables();
+
+DROP TRIGGER IF EXISTS trg_evento_responsables_cierre ON Responsables_Equipo;
+CREATE TRIGGER trg_evento_responsables_cierre
+AFTER UPDATE ON Responsables_Equipo
+REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_responsables();
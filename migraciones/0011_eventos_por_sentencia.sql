@@ -0,0 +1,190 @@
+-- Los eventos de equipos e historial (0009) pasan de triggers por fila a
+-- triggers por sentencia con tablas de transición, como los de
+-- responsables (0010). Un traslado en lote o una carga del agente que toca
+-- N equipos guarda sus eventos con un solo INSERT ... SELECT en lugar de N
+-- llamadas a fn_registrar_evento.
+--
+-- Las tablas de transición no admiten triggers con varios eventos ni con
+-- lista de columnas: Equipos lleva uno por INSERT, UPDATE y DELETE.
+
+-- regla eventos de Equipos. En un cambio solo viajan las columnas que
+-- cambiaron (sin el estado, que tiene su propio evento, ni la fecha del
+-- último reporte del agente); las filas sin cambios no generan evento.
+CREATE OR REPLACE FUNCTION fn_eventos_equipos()
+RETURNS TRIGGER AS $$
+DECLARE
+    evento record;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        FOR evento IN
+            INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+            SELECT 'equipo', n.Nombre_Equipo, jsonb_build_object(
+                'alta', true,
+                'marca_equipo', n.Marca_Equipo, 'modelo_equipo', n.Modelo_Equipo,
+                'tipo_equipo', n.Tipo_Equipo, 'tipo_area', n.Tipo_Area,
+                'unidad_actual', n.Unidad_Actual, 'estado_equipo', n.Estado_Equipo,
+                'ip_equipo', n.Ip_Equipo
+            )
+            FROM nuevas n
+            ORDER BY n.Nombre_Equipo
+            RETURNING Id_Evento, Tipo, Equipo, Datos
+        LOOP
+            PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+        END LOOP;
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Se empareja por nombre: un cambio de Nombre_Equipo no genera
+        -- evento. Cada fila se pasa a jsonb una sola vez (MATERIALIZED): si
+        -- el planificador la repite por columna el diff cuesta 20 veces más.
+        FOR evento IN
+            WITH filas AS MATERIALIZED (
+                SELECT n.Nombre_Equipo,
+                       to_jsonb(n) - ARRAY['estado_equipo', 'huella_equipo', 'fecha_ultimo_reporte', 'fecha_actualizacion_equipo'] AS nueva,
+                       to_jsonb(v) - ARRAY['estado_equipo', 'huella_equipo', 'fecha_ultimo_reporte', 'fecha_actualizacion_equipo'] AS vieja
+                FROM nuevas n
+                JOIN viejas v ON v.Nombre_Equipo = n.Nombre_Equipo
+            ), cambio AS (
+                SELECT f.Nombre_Equipo, (
+                    SELECT jsonb_object_agg(c.key, c.value)
+                    FROM jsonb_each(f.nueva) c
+                    WHERE c.value IS DISTINCT FROM f.vieja -> c.key
+                ) AS datos
+                FROM filas f
+                WHERE f.nueva <> f.vieja
+            )
+            INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+            SELECT 'equipo', cambio.Nombre_Equipo, cambio.datos
+            FROM cambio
+            ORDER BY cambio.Nombre_Equipo
+            RETURNING Id_Evento, Tipo, Equipo, Datos
+        LOOP
+            PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+        END LOOP;
+
+    ELSE
+        FOR evento IN
+            INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+            SELECT 'equipo_eliminado', v.Nombre_Equipo, '{}'
+            FROM viejas v
+            ORDER BY v.Nombre_Equipo
+            RETURNING Id_Evento, Tipo, Equipo, Datos
+        LOOP
+            PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+        END LOOP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla eventos de las filas nuevas del historial: cambios de estado,
+-- traslados y mantenimientos
+CREATE OR REPLACE FUNCTION fn_eventos_estado()
+RETURNS TRIGGER AS $$
+DECLARE
+    evento record;
+BEGIN
+    FOR evento IN
+        INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+        SELECT 'estado', n.fk_equipo_id, jsonb_build_object(
+            'anterior', n.Estado_Anterior, 'nuevo', n.Estado_Nuevo
+        )
+        FROM nuevas n
+        ORDER BY n.Id_Historial
+        RETURNING Id_Evento, Tipo, Equipo, Datos
+    LOOP
+        PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_eventos_traslados()
+RETURNS TRIGGER AS $$
+DECLARE
+    evento record;
+BEGIN
+    FOR evento IN
+        INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+        SELECT 'traslado', n.fk_equipo_id, jsonb_build_object(
+            'id_traslado', n.Id_Traslado, 'sede_origen', n.Sede_Origen,
+            'sede_destino', n.Sede_Destino, 'fk_tecnico_id', n.fk_tecnico_id
+        )
+        FROM nuevas n
+        ORDER BY n.Id_Traslado
+        RETURNING Id_Evento, Tipo, Equipo, Datos
+    LOOP
+        PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fn_eventos_mantenimiento()
+RETURNS TRIGGER AS $$
+DECLARE
+    evento record;
+BEGIN
+    FOR evento IN
+        INSERT INTO Eventos_Inventario (Tipo, Equipo, Datos)
+        SELECT 'mantenimiento', n.fk_equipo_id, jsonb_build_object(
+            'id_mantenimiento', n.Id_Mantenimiento, 'tipo_mantenimiento', n.Tipo_Mantenimiento,
+            'fk_tecnico_id', n.fk_tecnico_id
+        )
+        FROM nuevas n
+        ORDER BY n.Id_Mantenimiento
+        RETURNING Id_Evento, Tipo, Equipo, Datos
+    LOOP
+        PERFORM fn_notificar_evento(evento.Id_Evento, evento.Tipo, evento.Equipo, evento.Datos);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_evento_equipos ON Equipos;
+DROP TRIGGER IF EXISTS trg_evento_historial_estado ON Historial_Estado;
+DROP TRIGGER IF EXISTS trg_evento_historial_traslados ON Historial_Traslados;
+DROP TRIGGER IF EXISTS trg_evento_historial_mantenimiento ON Historial_Mantenimiento;
+DROP FUNCTION IF EXISTS fn_evento_equipo();
+DROP FUNCTION IF EXISTS fn_evento_estado();
+DROP FUNCTION IF EXISTS fn_evento_traslado();
+DROP FUNCTION IF EXISTS fn_evento_mantenimiento();
+
+--triggers de eventos (por sentencia, una tabla de transición por evento)
+DROP TRIGGER IF EXISTS trg_evento_equipos_alta ON Equipos;
+CREATE TRIGGER trg_evento_equipos_alta
+AFTER INSERT ON Equipos
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_equipos();
+
+DROP TRIGGER IF EXISTS trg_evento_equipos_cambio ON Equipos;
+CREATE TRIGGER trg_evento_equipos_cambio
+AFTER UPDATE ON Equipos
+REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_equipos();
+
+DROP TRIGGER IF EXISTS trg_evento_equipos_baja ON Equipos;
+CREATE TRIGGER trg_evento_equipos_baja
+AFTER DELETE ON Equipos
+REFERENCING OLD TABLE AS viejas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_equipos();
+
+CREATE TRIGGER trg_evento_historial_estado
+AFTER INSERT ON Historial_Estado
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_estado();
+
+CREATE TRIGGER trg_evento_historial_traslados
+AFTER INSERT ON Historial_Traslados
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_traslados();
+
+CREATE TRIGGER trg_evento_historial_mantenimiento
+AFTER INSERT ON Historial_Mantenimiento
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_eventos_mantenimiento();
@@ -0,0 +1,141 @@
+-- La versión de cada tabla (ETag de la API y caché de lecturas) deja de ser
+-- un contador que cada sentencia actualiza en Versiones_Tabla. Ese UPDATE
+-- tomaba el lock de la fila de la tabla hasta el COMMIT: todas las
+-- escrituras a Equipos o al historial hacían fila detrás de él (una carga
+-- de 5000 equipos lo tenía toda la carga) y dos transacciones que tocaban
+-- varias tablas en distinto orden podían bloquearse entre sí.
+--
+-- Ahora cada sentencia que cambia filas agrega una fila a Cambios_Tabla
+-- (solo INSERT, sin locks compartidos). La versión es Versiones_Tabla.Version
+-- más las filas pendientes de Cambios_Tabla de esa tabla; el mantenimiento
+-- de la API (servidor_api.compactar_versiones) las pasa a Versiones_Tabla
+-- en una sola sentencia, así la suma nunca retrocede.
+--
+-- Además no se cuentan las sentencias que no cambiaron filas (el upsert del
+-- agente cuando la huella no cambió) ni las que solo tocan
+-- Equipos.Fecha_Ultimo_Reporte (el reporte periódico del agente): un
+-- reporte sin cambios ya no invalida los ETag.
+
+CREATE TABLE IF NOT EXISTS Cambios_Tabla (
+    Id_Cambio bigserial PRIMARY KEY,
+    Tabla varchar(60) NOT NULL,
+    Fecha_Cambio TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Conteo por tabla al leer la versión (index-only scan)
+CREATE INDEX IF NOT EXISTS idx_cambios_tabla_tabla ON Cambios_Tabla (Tabla);
+
+GRANT SELECT, INSERT ON Cambios_Tabla TO rol_tecnico;
+GRANT USAGE ON SEQUENCE cambios_tabla_id_cambio_seq TO rol_tecnico;
+GRANT ALL PRIVILEGES ON Cambios_Tabla TO rol_admin;
+GRANT ALL PRIVILEGES ON SEQUENCE cambios_tabla_id_cambio_seq TO rol_admin;
+
+-- regla cada sentencia que modifica la tabla registra un cambio. La usan los
+-- triggers sin tablas de transición: TRUNCATE, Usuarios (lista de columnas)
+-- y Roles
+CREATE OR REPLACE FUNCTION fn_incrementar_version_tabla()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO Cambios_Tabla (Tabla) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla igual, pero una sentencia sin filas (INSERT ... ON CONFLICT que no
+-- insertó, UPDATE o DELETE sin coincidencias) no cuenta
+CREATE OR REPLACE FUNCTION fn_version_tabla_si_cambio()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF NOT EXISTS (SELECT 1 FROM viejas) THEN
+            RETURN NULL;
+        END IF;
+    ELSIF NOT EXISTS (SELECT 1 FROM nuevas) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO Cambios_Tabla (Tabla) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- regla un UPDATE de Equipos cuenta solo si alguna fila cambió en algo más
+-- que Fecha_Ultimo_Reporte. Se comparan conjuntos (EXCEPT, por hash): con
+-- un JOIN dentro de EXISTS el planificador elige un nested loop entre las
+-- dos tablas de transición y un reporte de 2000 equipos tarda segundos
+CREATE OR REPLACE FUNCTION fn_version_equipos_cambio()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT to_jsonb(n) - 'fecha_ultimo_reporte' FROM nuevas n
+        EXCEPT
+        SELECT to_jsonb(v) - 'fecha_ultimo_reporte' FROM viejas v
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO Cambios_Tabla (Tabla) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- El NOTIFY de la caché de lecturas (0008) pasa a Cambios_Tabla. Compactar
+-- no cambia ninguna versión: Versiones_Tabla ya no notifica
+DROP TRIGGER IF EXISTS trg_notificar_cambio_tabla ON Versiones_Tabla;
+DROP TRIGGER IF EXISTS trg_notificar_cambio_tabla ON Cambios_Tabla;
+CREATE TRIGGER trg_notificar_cambio_tabla
+AFTER INSERT ON Cambios_Tabla
+FOR EACH ROW
+EXECUTE FUNCTION fn_notificar_cambio_tabla();
+
+--triggers de version con tablas de transición (uno por evento) y TRUNCATE aparte
+DROP TRIGGER IF EXISTS trg_version_equipos ON Equipos;
+CREATE TRIGGER trg_version_equipos_alta
+AFTER INSERT ON Equipos
+REFERENCING NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_version_tabla_si_cambio();
+
+CREATE TRIGGER trg_version_equipos_cambio
+AFTER UPDATE ON Equipos
+REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_version_equipos_cambio();
+
+CREATE TRIGGER trg_version_equipos_baja
+AFTER DELETE ON Equipos
+REFERENCING OLD TABLE AS viejas
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_version_tabla_si_cambio();
+
+CREATE TRIGGER trg_version_equipos_vaciado
+AFTER TRUNCATE ON Equipos
+FOR EACH STATEMENT
+EXECUTE FUNCTION fn_incrementar_version_tabla();
+
+-- Historial y responsables: mismas cuatro reglas en cada tabla
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['historial_estado', 'historial_mantenimiento',
+                                 'historial_traslados', 'responsables_equipo'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', 'trg_version_' || tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS nuevas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_version_tabla_si_cambio()',
+            'trg_version_' || tabla || '_alta', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_version_tabla_si_cambio()',
+            'trg_version_' || tabla || '_cambio', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS viejas '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_version_tabla_si_cambio()',
+            'trg_version_' || tabla || '_baja', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION fn_incrementar_version_tabla()',
+            'trg_version_' || tabla || '_vaciado', tabla);
+    END LOOP;
+END $$;
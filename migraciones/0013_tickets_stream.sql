@@ -0,0 +1,15 @@
+-- Tickets de un solo uso para abrir /api/stream. EventSource no envía
+-- encabezados y el token de sesión en ?token= quedaba en la URL (historial
+-- del navegador, logs de acceso de la API y de los proxies). Ahora el panel
+-- pide un ticket con POST /api/stream/ticket (con su token en Authorization)
+-- y lo pasa en ?ticket=. Abrir el stream borra el ticket; vence a los
+-- EVENTOS_TICKET_SEGUNDOS y los vencidos los borra el mantenimiento de la API.
+CREATE TABLE IF NOT EXISTS Tickets_Stream (
+    Ticket varchar(36) PRIMARY KEY,
+    -- Sesión que pidió el ticket: un login nuevo también lo invalida
+    Token varchar(100) NOT NULL,
+    Vence TIMESTAMP NOT NULL
+);
+
+GRANT SELECT, INSERT, DELETE ON Tickets_Stream TO rol_tecnico;
+GRANT ALL PRIVILEGES ON Tickets_Stream TO rol_admin;
@@ -0,0 +1,80 @@
+-- La hoja de vida se arma al leer desde Historial_Mantenimiento: registrar
+-- un mantenimiento ya no reescribe Equipos.Observaciones.
+-- Backfill (una sola vez): separar los párrafos "Mantenimiento (TIPO - dd/mm/aaaa): ..."
+-- que se anteponían a Observaciones. Los que ya están en el historial solo se
+-- quitan del texto; los que no, se insertan. Observaciones queda con la
+-- observación propia del equipo. trg_validar_mantenimiento se apaga solo
+-- dentro de esta transacción: los equipos ya dados de baja también tienen
+-- párrafos que pasar al historial.
+ALTER TABLE Historial_Mantenimiento DISABLE TRIGGER trg_validar_mantenimiento;
+
+DO $$
+DECLARE
+    eq RECORD;
+    parrafos text[];
+    partes text[];
+    cuerpo text;
+    resto text;
+    tipo text;
+    fecha date;
+    id_encontrado int;
+    usados int[];
+BEGIN
+    FOR eq IN
+        SELECT Nombre_Equipo, Observaciones FROM Equipos
+        WHERE Observaciones ~ '^Mantenimiento \((HARDWARE|SOFTWARE) - [0-9]{2}/[0-9]{2}/[0-9]{4}\): '
+    LOOP
+        parrafos := regexp_split_to_array(
+            eq.Observaciones,
+            E'\n\n(?=Mantenimiento \\((HARDWARE|SOFTWARE) - [0-9]{2}/[0-9]{2}/[0-9]{4}\\): )'
+        );
+        resto := NULL;
+        usados := '{}';
+
+        FOR i IN 1 .. array_length(parrafos, 1) LOOP
+            partes := regexp_match(
+                parrafos[i],
+                '^Mantenimiento \((HARDWARE|SOFTWARE) - ([0-9]{2}/[0-9]{2}/[0-9]{4})\): (.*)$'
+            );
+            tipo := partes[1];
+            fecha := to_date(partes[2], 'DD/MM/YYYY');
+            cuerpo := partes[3];
+
+            -- Buscar el registro del historial que origino el parrafo
+            SELECT m.Id_Mantenimiento INTO id_encontrado
+            FROM Historial_Mantenimiento m
+            WHERE m.fk_equipo_id = eq.Nombre_Equipo
+              AND m.Tipo_Mantenimiento = tipo
+              AND m.Fecha_Mantenimiento::date = fecha
+              AND NOT (m.Id_Mantenimiento = ANY(usados))
+              AND (m.Descripcion_Mantenimiento = cuerpo
+                   OR left(cuerpo, length(m.Descripcion_Mantenimiento) + 2) = m.Descripcion_Mantenimiento || E'\n\n')
+            ORDER BY length(m.Descripcion_Mantenimiento) DESC, m.Id_Mantenimiento
+            LIMIT 1;
+
+            IF id_encontrado IS NOT NULL THEN
+                usados := usados || id_encontrado;
+                SELECT substr(cuerpo, length(Descripcion_Mantenimiento) + 3) INTO resto
+                FROM Historial_Mantenimiento WHERE Id_Mantenimiento = id_encontrado;
+            ELSE
+                -- Sin registro: el ultimo parrafo puede traer pegada la observacion original
+                IF i = array_length(parrafos, 1) AND position(E'\n\n' IN cuerpo) > 0 THEN
+                    resto := substr(cuerpo, position(E'\n\n' IN cuerpo) + 2);
+                    cuerpo := left(cuerpo, position(E'\n\n' IN cuerpo) - 1);
+                ELSE
+                    resto := NULL;
+                END IF;
+                INSERT INTO Historial_Mantenimiento (
+                    fk_equipo_id, Tipo_Mantenimiento, Descripcion_Mantenimiento, Fecha_Mantenimiento
+                ) VALUES (eq.Nombre_Equipo, tipo, cuerpo, fecha);
+            END IF;
+        END LOOP;
+
+        UPDATE Equipos
+        SET Observaciones = NULLIF(btrim(resto), '')
+        WHERE Nombre_Equipo = eq.Nombre_Equipo;
+    END LOOP;
+END;
+$$;
+
+ALTER TABLE Historial_Mantenimiento ENABLE TRIGGER trg_validar_mantenimiento;
@@ -0,0 +1,434 @@
+"""
+Migraciones versionadas del esquema de la base de inventario.
+
+InventarioDB.sql crea la base desde cero; los cambios posteriores van en
+migraciones/NNNN_descripcion.sql y se aplican en orden. Las aplicadas se
+registran en Migraciones_Esquema (versión, nombre, suma SHA-256), así que
+correr el comando otra vez solo aplica las pendientes.
+
+- Una migración corre en una sola transacción, salvo que su primera línea
+  sea `-- migrar: sin-transaccion`. En ese caso se ejecuta sentencia por
+  sentencia en autocommit, que es lo que exige CREATE INDEX CONCURRENTLY.
+  Si una de esas migraciones se corta a la mitad, al reintentar se borran
+  los índices que quedaron inválidos y se vuelven a crear.
+- Un advisory lock impide que dos despliegues migren a la vez.
+
+Uso:
+    python migrar.py                 aplicar las pendientes
+    python migrar.py estado          listar aplicadas y pendientes
+    python migrar.py verificar       índices faltantes, inválidos, sin uso o redundantes
+
+La conexión usa DB_HOST, DB_PORT, DB_NAME, DB_USER y DB_PASSWORD (o el
+.env), igual que servidor_api.py.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+CARPETA_MIGRACIONES = os.path.join(RAIZ, 'migraciones')
+ESQUEMA_BASE = os.path.join(RAIZ, 'InventarioDB.sql')
+
+MARCA_SIN_TRANSACCION = '-- migrar: sin-transaccion'
+CLAVE_BLOQUEO = 'inventario_migraciones'
+
+PATRON_ARCHIVO = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+PATRON_CREAR_INDICE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I
+)
+PATRON_BORRAR_INDICE = re.compile(r'DROP\s+INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+EXISTS\s+)?(\w+)', re.I)
+
+QUERY_CREAR_TABLA = """
+    CREATE TABLE IF NOT EXISTS Migraciones_Esquema (
+        Version int PRIMARY KEY,
+        Nombre varchar(200) NOT NULL,
+        Suma_Verificacion char(64) NOT NULL,
+        Fecha_Aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        Duracion_Ms int
+    )
+"""
+QUERY_APLICADAS = "SELECT Version, Nombre, Suma_Verificacion, Fecha_Aplicacion FROM Migraciones_Esquema ORDER BY Version"
+QUERY_REGISTRAR = """
+    INSERT INTO Migraciones_Esquema (Version, Nombre, Suma_Verificacion, Duracion_Ms)
+    VALUES (%s, %s, %s, %s)
+"""
+QUERY_INDICE_VALIDO = """
+    SELECT i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE c.relname = lower(%s) AND pg_table_is_visible(c.oid)
+"""
+
+
+class Migracion:
+    def __init__(self, version, nombre, ruta):
+        self.version = version
+        self.nombre = nombre
+        self.ruta = ruta
+        with open(ruta, encoding='utf-8') as archivo:
+            self.texto = archivo.read()
+        self.suma = hashlib.sha256(self.texto.encode('utf-8')).hexdigest()
+        self.transaccional = not self.texto.lstrip().startswith(MARCA_SIN_TRANSACCION)
+
+    def __repr__(self):
+        return f"{self.version:04d}_{self.nombre}"
+
+
+def leer_migraciones(carpeta=CARPETA_MIGRACIONES):
+    """Migraciones de la carpeta ordenadas por versión"""
+    migraciones = {}
+    for archivo in sorted(os.listdir(carpeta)):
+        coincidencia = PATRON_ARCHIVO.match(archivo)
+        if not coincidencia:
+            continue
+        version = int(coincidencia.group(1))
+        if version in migraciones:
+            raise RuntimeError(f"Versión repetida {version:04d}: {migraciones[version].ruta} y {archivo}")
+        migraciones[version] = Migracion(version, coincidencia.group(2), os.path.join(carpeta, archivo))
+    return [migraciones[v] for v in sorted(migraciones)]
+
+
+def sentencias_sql(texto):
+    """Separar un script en sentencias respetando comentarios, cadenas y $$"""
+    sentencias, actual, i, n = [], [], 0, len(texto)
+    while i < n:
+        if texto.startswith('--', i):
+            fin = texto.find('\n', i)
+            i = n if fin == -1 else fin
+            continue
+        caracter = texto[i]
+        if caracter == "'":
+            fin = i + 1
+            while True:
+                fin = texto.find("'", fin)
+                if fin == -1:
+                    fin = n
+                    break
+                if texto.startswith("''", fin):
+                    fin += 2
+                    continue
+                break
+            actual.append(texto[i:fin + 1])
+            i = fin + 1
+            continue
+        if caracter == '$':
+            etiqueta = re.match(r'\$[A-Za-z_]*\$', texto[i:])
+            if etiqueta:
+                etiqueta = etiqueta.group()
+                fin = texto.find(etiqueta, i + len(etiqueta))
+                fin = n if fin == -1 else fin + len(etiqueta)
+                actual.append(texto[i:fin])
+                i = fin
+                continue
+        if caracter == ';':
+            sentencia = ''.join(actual).strip()
+            if sentencia:
+                sentencias.append(sentencia)
+            actual = []
+        else:
+            actual.append(caracter)
+        i += 1
+    sentencia = ''.join(actual).strip()
+    if sentencia:
+        sentencias.append(sentencia)
+    return sentencias
+
+
+def conectar(base=None):
+    load_dotenv(os.path.join(RAIZ, '.env'))
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 5432)),
+        dbname=base or os.getenv('DB_NAME', 'inventariodb'),
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD')
+    )
+    conn.set_client_encoding('UTF8')
+    return conn
+
+
+# =====================================================
+# APLICAR
+# =====================================================
+def migraciones_aplicadas(conn):
+    """version -> (nombre, suma, fecha)"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('migraciones_esquema') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return {}
+        cur.execute(QUERY_APLICADAS)
+        return {fila[0]: fila[1:] for fila in cur.fetchall()}
+
+
+def reparar_indice_invalido(cur, sentencia):
+    """
+    Un CREATE INDEX CONCURRENTLY interrumpido deja el índice creado pero
+    inválido, y IF NOT EXISTS lo daría por bueno: se borra para rehacerlo.
+    """
+    coincidencia = PATRON_CREAR_INDICE.match(sentencia)
+    if not coincidencia or not coincidencia.group(1):
+        return
+    cur.execute(QUERY_INDICE_VALIDO, (coincidencia.group(2),))
+    fila = cur.fetchone()
+    if fila and not fila[0]:
+        print(f"    índice inválido {coincidencia.group(2)}: se vuelve a crear")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {coincidencia.group(2)}")
+
+
+def aplicar_migracion(conn, migracion):
+    inicio = time.perf_counter()
+    if migracion.transaccional:
+        conn.autocommit = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute(migracion.texto)
+                cur.execute(QUERY_REGISTRAR, (
+                    migracion.version, migracion.nombre, migracion.suma,
+                    int((time.perf_counter() - inicio) * 1000)
+                ))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        return
+
+    # Sin transacción: cada sentencia queda hecha al terminar, por eso todas
+    # deben poder repetirse (IF NOT EXISTS / IF EXISTS)
+    with conn.cursor() as cur:
+        for sentencia in sentencias_sql(migracion.texto):
+            reparar_indice_invalido(cur, sentencia)
+            cur.execute(sentencia)
+        cur.execute(QUERY_REGISTRAR, (
+            migracion.version, migracion.nombre, migracion.suma,
+            int((time.perf_counter() - inicio) * 1000)
+        ))
+
+
+def aplicar_migraciones(conn, hasta=None):
+    """Aplicar en orden las migraciones pendientes. Retorna las aplicadas."""
+    conn.autocommit = True
+    aplicadas = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(hashtext(%s))", (CLAVE_BLOQUEO,))
+    try:
+        with conn.cursor() as cur:
+            cur.execute(QUERY_CREAR_TABLA)
+        hechas = migraciones_aplicadas(conn)
+        for migracion in leer_migraciones():
+            if hasta is not None and migracion.version > hasta:
+                break
+            if migracion.version in hechas:
+                if hechas[migracion.version][1] != migracion.suma:
+                    print(f"  aviso: {migracion} cambió después de aplicarse (no se vuelve a aplicar)")
+                continue
+            print(f"  aplicando {migracion}{'' if migracion.transaccional else ' (sin transacción)'}...", flush=True)
+            inicio = time.perf_counter()
+            aplicar_migracion(conn, migracion)
+            print(f"    listo en {time.perf_counter() - inicio:.1f} s")
+            aplicadas.append(migracion)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (CLAVE_BLOQUEO,))
+    return aplicadas
+
+
+# =====================================================
+# VERIFICAR
+# =====================================================
+QUERY_INDICES = """
+    SELECT c.relname, i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE pg_table_is_visible(c.oid)
+"""
+
+# Llaves foráneas cuya primera columna no encabeza ningún índice: cada
+# DELETE/UPDATE del padre y cada consulta por esa columna recorre la tabla.
+# En tablas particionadas se mira la llave de la tabla madre, no las copias
+# de cada partición (conparentid).
+QUERY_FK_SIN_INDICE = """
+    SELECT t.relname AS tabla, a.attname AS columna, con.conname AS restriccion
+    FROM pg_constraint con
+    JOIN pg_class t ON t.oid = con.conrelid
+    JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+    WHERE con.contype = 'f'
+      AND con.conparentid = 0
+      AND pg_table_is_visible(t.oid)
+      AND NOT EXISTS (
+          SELECT 1 FROM pg_index i
+          WHERE i.indrelid = con.conrelid AND i.indkey[0] = con.conkey[1]
+      )
+    ORDER BY 1, 2
+"""
+
+# Las lecturas y el tamaño de un índice particionado son la suma de los
+# índices de sus particiones (pg_stat_user_indexes solo lista estos)
+QUERY_SIN_USO = """
+    WITH RECURSIVE raiz AS (
+        SELECT s.indexrelid AS indice, s.indexrelid AS hoja FROM pg_stat_user_indexes s
+        UNION ALL
+        SELECT h.inhparent, raiz.hoja FROM raiz JOIN pg_inherits h ON h.inhrelid = raiz.indice
+    ), por_indice AS (
+        SELECT raiz.indice, sum(s.idx_scan) AS lecturas, sum(pg_relation_size(s.indexrelid)) AS bytes
+        FROM raiz
+        JOIN pg_stat_user_indexes s ON s.indexrelid = raiz.hoja
+        WHERE NOT EXISTS (SELECT 1 FROM pg_inherits h WHERE h.inhrelid = raiz.indice)
+        GROUP BY raiz.indice
+    )
+    SELECT t.relname AS tabla, ci.relname AS indice, p.lecturas, pg_size_pretty(p.bytes) AS tamano
+    FROM por_indice p
+    JOIN pg_index i ON i.indexrelid = p.indice
+    JOIN pg_class ci ON ci.oid = p.indice
+    JOIN pg_class t ON t.oid = i.indrelid
+    WHERE p.lecturas <= %s
+      AND NOT i.indisunique
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = p.indice)
+    ORDER BY p.bytes DESC
+"""
+
+# Índice b-tree cuyas columnas son el prefijo de otro índice de la misma
+# tabla (sin expresiones ni predicado): el más largo ya sirve sus consultas
+QUERY_REDUNDANTES = """
+    SELECT t.relname AS tabla, ci.relname AS indice, co.relname AS cubierto_por
+    FROM pg_index i
+    JOIN pg_index o ON o.indrelid = i.indrelid AND o.indexrelid <> i.indexrelid
+    JOIN pg_class ci ON ci.oid = i.indexrelid
+    JOIN pg_class co ON co.oid = o.indexrelid
+    JOIN pg_class t ON t.oid = i.indrelid
+    JOIN pg_am am ON am.oid = ci.relam AND am.amname = 'btree'
+    WHERE pg_table_is_visible(t.oid)
+      AND NOT i.indisunique
+      AND NOT EXISTS (SELECT 1 FROM pg_inherits h WHERE h.inhrelid = i.indexrelid)
+      AND i.indexprs IS NULL AND o.indexprs IS NULL
+      AND i.indpred IS NULL AND o.indpred IS NULL
+      AND co.relam = ci.relam
+      AND i.indnkeyatts <= o.indnkeyatts
+      AND (i.indkey::int2[])[0:i.indnkeyatts - 1] = (o.indkey::int2[])[0:i.indnkeyatts - 1]
+      AND (i.indnkeyatts < o.indnkeyatts OR ci.relname > co.relname)
+    ORDER BY 1, 2
+"""
+
+
+def indices_declarados():
+    """
+    Índices que deberían existir según InventarioDB.sql y las migraciones,
+    en orden de aplicación (un DROP posterior los quita de la lista).
+    Retorna nombre -> archivo donde se crea.
+    """
+    archivos = [ESQUEMA_BASE] + [m.ruta for m in leer_migraciones()]
+    declarados = {}
+    for ruta in archivos:
+        with open(ruta, encoding='utf-8') as archivo:
+            for sentencia in sentencias_sql(archivo.read()):
+                creado = PATRON_CREAR_INDICE.match(sentencia)
+                borrado = PATRON_BORRAR_INDICE.match(sentencia)
+                if creado:
+                    declarados[creado.group(2).lower()] = os.path.basename(ruta)
+                elif borrado:
+                    declarados.pop(borrado.group(1).lower(), None)
+    return declarados
+
+
+def verificar(conn, scans_minimos=0):
+    """Imprimir el informe. Retorna True si no hay problemas que corregir."""
+    correcto = True
+    hechas = migraciones_aplicadas(conn)
+
+    print("Migraciones:")
+    pendientes = [m for m in leer_migraciones() if m.version not in hechas]
+    modificadas = [m for m in leer_migraciones() if m.version in hechas and hechas[m.version][1] != m.suma]
+    for migracion in pendientes:
+        print(f"  pendiente   {migracion}")
+    for migracion in modificadas:
+        print(f"  modificada  {migracion} (el archivo cambió después de aplicarse)")
+    if not pendientes and not modificadas:
+        print("  al día")
+    correcto &= not pendientes and not modificadas
+
+    with conn.cursor() as cur:
+        cur.execute(QUERY_INDICES)
+        existentes = dict(cur.fetchall())
+
+        print("Índices declarados que faltan o son inválidos:")
+        problemas = 0
+        for nombre, origen in indices_declarados().items():
+            if nombre not in existentes:
+                print(f"  falta     {nombre} ({origen})")
+                problemas += 1
+            elif not existentes[nombre]:
+                print(f"  inválido  {nombre} ({origen}): CREATE INDEX CONCURRENTLY interrumpido")
+                problemas += 1
+        if not problemas:
+            print("  ninguno")
+        correcto &= not problemas
+
+        print("Llaves foráneas sin índice:")
+        cur.execute(QUERY_FK_SIN_INDICE)
+        filas = cur.fetchall()
+        for tabla, columna, restriccion in filas:
+            print(f"  {tabla}.{columna} ({restriccion})")
+        if not filas:
+            print("  ninguna")
+
+        cur.execute("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()")
+        desde = cur.fetchone()[0]
+        periodo = f"desde {desde:%Y-%m-%d %H:%M}" if desde else "desde que se creó la base"
+        print(f"Índices con {scans_minimos} lecturas o menos (estadísticas {periodo}):")
+        cur.execute(QUERY_SIN_USO, (scans_minimos,))
+        filas = cur.fetchall()
+        for tabla, indice, lecturas, tamano in filas:
+            print(f"  {indice:40} {tabla:28} {lecturas:>8} lecturas  {tamano}")
+        if not filas:
+            print("  ninguno")
+
+        print("Índices redundantes (prefijo de otro):")
+        cur.execute(QUERY_REDUNDANTES)
+        filas = cur.fetchall()
+        for tabla, indice, cubierto_por in filas:
+            print(f"  {indice} en {tabla}: cubierto por {cubierto_por}")
+        if not filas:
+            print("  ninguno")
+
+    return correcto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('comando', nargs='?', default='aplicar', choices=['aplicar', 'estado', 'verificar'])
+    parser.add_argument('--base', help='base de datos (por defecto DB_NAME)')
+    parser.add_argument('--hasta', type=int, help='aplicar solo hasta esta versión')
+    parser.add_argument('--scans-minimos', type=int, default=0,
+                        help='en verificar, índices con esta cantidad de lecturas o menos se listan como sin uso')
+    args = parser.parse_args(argv)
+
+    conn = conectar(args.base)
+    conn.autocommit = True
+    try:
+        if args.comando == 'aplicar':
+            aplicadas = aplicar_migraciones(conn, args.hasta)
+            print(f"{len(aplicadas)} migraciones aplicadas" if aplicadas else "Sin migraciones pendientes")
+        elif args.comando == 'estado':
+            hechas = migraciones_aplicadas(conn)
+            for migracion in leer_migraciones():
+                if migracion.version in hechas:
+                    fecha = hechas[migracion.version][2]
+                    print(f"  aplicada   {migracion}  {fecha:%Y-%m-%d %H:%M}")
+                else:
+                    print(f"  pendiente  {migracion}")
+        else:
+            return 0 if verificar(conn, args.scans_minimos) else 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,26 +1,102 @@
-from flask import Flask, request, jsonify, send_file, render_template
+from flask import Flask, Blueprint, Response, request, jsonify, render_template, make_response
 from flask_cors import CORS
-from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from datetime import date, datetime, timedelta, timezone
 import psycopg2 
-from psycopg2.extras import RealDictCursor
-import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
-from datetime import datetime
+from psycopg2.extras import RealDictCursor, execute_values
+from decimal import Decimal
 from functools import wraps
 import sys
 import uuid
+import json
+import math
+import random
+import base64
+import hashlib
+import gzip
+import re
+import select
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
 import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
 
+# Dependencias opcionales: serialización JSON rápida y compresión brotli
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Cargar las variables ocultas del archivo .env
 load_dotenv()
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-app = Flask(__name__)
-app.config['JSON_AS_ASCII'] = False
-app.json.ensure_ascii = False
-CORS(app)
+# =====================================================
+# SERIALIZACIÓN JSON
+# =====================================================
+class ProveedorJSONRapido(DefaultJSONProvider):
+    """
+    jsonify con orjson. Produce el mismo JSON que el proveedor por defecto
+    de Flask (llaves ordenadas, fechas en formato HTTP, Decimal como texto)
+    porque los tipos que orjson no maneja igual se delegan a `default`.
+    """
+
+    _DIAS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+    _MESES = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+    @classmethod
+    def _default_rapido(cls, o):
+        # Igual que werkzeug.http.http_date, sin pasar por email.utils
+        if isinstance(o, date):
+            if not isinstance(o, datetime):
+                o = datetime(o.year, o.month, o.day)
+            elif o.tzinfo is not None:
+                o = o.astimezone(timezone.utc)
+            return (
+                f"{cls._DIAS[o.weekday()]}, {o.day:02d} {cls._MESES[o.month - 1]} {o.year:04d} "
+                f"{o.hour:02d}:{o.minute:02d}:{o.second:02d} GMT"
+            )
+        return DefaultJSONProvider.default(o)
+
+    default = _default_rapido
+
+    opciones = 0
+    if orjson is not None:
+        opciones = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_SORT_KEYS
+            | orjson.OPT_NON_STR_KEYS
+        )
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.opciones).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        opciones = self.opciones | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            opciones |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=opciones),
+            mimetype=self.mimetype
+        )
+
+# Motor JSON: 'orjson' (por defecto si está instalado) o 'estandar'
+JSON_MOTOR = os.getenv('JSON_MOTOR', 'orjson' if orjson is not None else 'estandar')
+
+# Las rutas se registran en este blueprint; la app la arma crear_app()
+rutas = Blueprint('inventario', __name__)
 
 # =====================================================
 # CONFIGURACIÓN DE BASE DE DATOS
@@ -34,20 +110,860 @@ DB_CONFIG = {
     'client_encoding': 'utf8'
 }
 
+# Pool de conexiones: tamaño mínimo/máximo, segundos de espera al pedir
+# una conexión y segundos de inactividad tras los cuales se verifica
+DB_POOL_CONFIG = {
+    'min': int(os.getenv('DB_POOL_MIN', 2)),
+    'max': int(os.getenv('DB_POOL_MAX', 20)),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    'verificar_tras': float(os.getenv('DB_POOL_VERIFICAR_TRAS', 30))
+}
+
+# Caché token -> usuario de require_auth. El TTL acota cuánto tarda en dejar
+# de funcionar un token de un usuario desactivado desde otro proceso.
+AUTH_CACHE_CONFIG = {
+    'max_entradas': int(os.getenv('AUTH_CACHE_MAX', 1000)),
+    'ttl': float(os.getenv('AUTH_CACHE_TTL', 30))
+}
+
+# =====================================================
+# POOL DE CONEXIONES
+# =====================================================
+class PoolAgotadoError(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera"""
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones psycopg2 seguro para hilos y procesos hijos (fork).
+
+    - Mantiene hasta `maxconn` conexiones abiertas y precalienta `minconn`.
+    - Si todas están ocupadas espera hasta `timeout` segundos y luego
+      lanza PoolAgotadoError.
+    - Antes de entregar una conexión inactiva por más de `verificar_tras`
+      segundos ejecuta un SELECT 1; si falla la descarta y abre otra.
+    - En un proceso hijo (fork) no reutiliza las conexiones del padre.
+    """
+
+    def __init__(self, fabrica, minconn, maxconn, timeout, verificar_tras):
+        self._fabrica = fabrica
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.verificar_tras = verificar_tras
+        self._heredadas = []
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._todas = set()        # conexiones abiertas por este proceso
+        self._libres = []          # [(conexion, momento_devolucion)]
+        self._pendientes = 0       # cupos reservados mientras se conecta
+        self._stats = {
+            "creadas": 0,
+            "descartadas": 0,
+            "prestamos": 0,
+            "esperas": 0,
+            "tiempo_espera_total": 0.0,
+            "tiempo_espera_max": 0.0,
+            "timeouts": 0
+        }
+
+    def reiniciar_tras_fork(self):
+        """
+        Olvidar las conexiones heredadas del proceso padre. No se cierran:
+        cerrar el socket compartido terminaría la sesión del padre.
+        """
+        self._heredadas.extend(self._todas)
+        self._reiniciar()
+
+    def _es_valida(self, conn, devuelta_en):
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta_en < self.verificar_tras:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _cerrar(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def obtener(self):
+        """Tomar una conexión del pool (bloquea hasta `timeout` segundos)"""
+        if self._pid != os.getpid():
+            self.reiniciar_tras_fork()
+
+        inicio = time.monotonic()
+        espero = False
+        with self._cond:
+            while True:
+                if self._libres:
+                    conn, devuelta_en = self._libres.pop()
+                    break
+                if len(self._todas) + self._pendientes < self.maxconn:
+                    conn = None
+                    self._pendientes += 1
+                    break
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolAgotadoError(
+                        f"No hay conexiones disponibles tras {self.timeout}s (máximo {self.maxconn})"
+                    )
+                espero = True
+                self._cond.wait(restante)
+
+            self._stats["prestamos"] += 1
+            if espero:
+                espera = time.monotonic() - inicio
+                self._stats["esperas"] += 1
+                self._stats["tiempo_espera_total"] += espera
+                self._stats["tiempo_espera_max"] = max(self._stats["tiempo_espera_max"], espera)
+
+        # La verificación y la conexión nueva se hacen fuera del lock
+        if conn is not None and not self._es_valida(conn, devuelta_en):
+            with self._cond:
+                self._todas.discard(conn)
+                self._pendientes += 1
+                self._stats["descartadas"] += 1
+            self._cerrar(conn)
+            conn = None
+
+        if conn is None:
+            try:
+                conn = self._fabrica()
+            except Exception:
+                with self._cond:
+                    self._pendientes -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._pendientes -= 1
+                self._todas.add(conn)
+                self._stats["creadas"] += 1
+
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        """Devolver una conexión al pool, cerrando la transacción abierta"""
+        if conn not in self._todas:
+            # Heredada de otro proceso o ya descartada: no se toca
+            return
+
+        if not descartar and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        with self._cond:
+            if descartar or conn.closed:
+                self._todas.discard(conn)
+                self._stats["descartadas"] += 1
+            else:
+                self._libres.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+
+        if conn is not None:
+            self._cerrar(conn)
+
+    @contextmanager
+    def conexion(self):
+        """
+        Uso:
+            with db_pool.conexion() as conn:
+                cur = conn.cursor()
+                ...
+                conn.commit()
+
+        Si ocurre una excepción se hace rollback; la conexión siempre vuelve al pool.
+        """
+        conn = self.obtener()
+        descartar = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                descartar = True
+            raise
+        finally:
+            self.devolver(conn, descartar=descartar)
+
+    def precalentar(self):
+        """Abrir las `minconn` conexiones mínimas"""
+        conexiones = []
+        try:
+            while len(conexiones) < self.minconn:
+                conexiones.append(self.obtener())
+        finally:
+            for conn in conexiones:
+                self.devolver(conn)
+
+    def estadisticas(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min": self.minconn,
+                "max": self.maxconn,
+                "abiertas": len(self._todas),
+                "en_uso": len(self._todas) - len(self._libres),
+                "libres": len(self._libres),
+                "tiempo_espera_promedio": (
+                    stats["tiempo_espera_total"] / stats["esperas"] if stats["esperas"] else 0.0
+                )
+            })
+        return stats
+
+    def cerrar(self):
+        """Cerrar las conexiones libres (al apagar el servidor)"""
+        with self._cond:
+            libres = [conn for conn, _ in self._libres]
+            self._libres = []
+            self._todas.difference_update(libres)
+        for conn in libres:
+            self._cerrar(conn)
+
+
+# =====================================================
+# MÉTRICAS (formato Prometheus en /metrics)
+# =====================================================
+# Carpeta compartida donde cada worker deja su foto para que /metrics sume
+# todos los procesos (servidor_produccion.py crea una si no se indica) y
+# token opcional que se exige para leer /metrics
+METRICAS_CONFIG = {
+    'dir': os.getenv('API_METRICAS_DIR'),
+    'intervalo_volcado': float(os.getenv('API_METRICAS_INTERVALO', 1)),
+    'token': os.getenv('METRICAS_TOKEN')
+}
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# nombre -> (tipo, ayuda, etiquetas, buckets)
+DEFINICION_METRICAS = {
+    'inventario_solicitud_duracion_segundos': (
+        'histogram', 'Duración de la solicitud hasta enviar el último byte',
+        ('ruta', 'metodo', 'estado'), BUCKETS_SEGUNDOS),
+    'inventario_solicitud_db_segundos': (
+        'histogram', 'Tiempo en PostgreSQL por solicitud',
+        ('ruta', 'metodo'), BUCKETS_SEGUNDOS),
+    'inventario_respuesta_bytes': (
+        'histogram', 'Tamaño del cuerpo enviado (después de comprimir)',
+        ('ruta', 'metodo'), BUCKETS_BYTES),
+    'inventario_db_consultas_total': (
+        'counter', 'Sentencias ejecutadas en PostgreSQL',
+        ('ruta', 'metodo'), None),
+    'inventario_solicitudes_en_curso': (
+        'gauge', 'Solicitudes atendiéndose en este momento',
+        (), None),
+    'inventario_cache_lecturas_total': (
+        'counter', 'Búsquedas en la caché de lecturas (hit o miss)',
+        ('resultado',), None),
+    'inventario_cache_expulsiones_total': (
+        'counter', 'Entradas que salieron de la caché de lecturas (lru, vencida o invalidada)',
+        ('motivo',), None),
+    'inventario_cache_entradas': (
+        'gauge', 'Entradas en la caché de lecturas',
+        (), None),
+}
+
+# Medición de la solicitud en curso (None fuera de una solicitud)
+medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+class MedicionSolicitud:
+    """Tiempos de una solicitud: base de datos, número de consultas y fases"""
+
+    __slots__ = ('ruta', 'inicio', 'db', 'consultas', 'fases')
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.inicio = time.perf_counter()
+        self.db = 0.0
+        self.consultas = 0
+        self.fases = {}
+
+    def server_timing(self):
+        """Valor del encabezado Server-Timing (milisegundos)"""
+        partes = [f'{nombre};dur={segundos * 1000:.1f}' for nombre, segundos in self.fases.items()]
+        partes.append(f'db;dur={self.db * 1000:.1f};desc="{self.consultas} consultas"')
+        partes.append(f'total;dur={(time.perf_counter() - self.inicio) * 1000:.1f}')
+        return ', '.join(partes)
+
+
+def registrar_consulta(duracion):
+    medicion = medicion_actual.get()
+    if medicion is not None:
+        medicion.db += duracion
+        medicion.consultas += 1
+
+
+@contextmanager
+def medir_fase(nombre):
+    """Sumar la duración del bloque a la fase `nombre` del Server-Timing"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion = medicion_actual.get()
+        if medicion is not None:
+            medicion.fases[nombre] = medicion.fases.get(nombre, 0.0) + time.perf_counter() - inicio
+
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas en memoria de este proceso.
+
+    exportar() da una foto serializable; formato_prometheus() suma varias
+    fotos (una por worker) y las escribe en el formato de texto de Prometheus.
+    Los histogramas guardan la cuenta de cada bucket (el último es +Inf) y
+    al final la suma de los valores.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {nombre: {} for nombre in DEFINICION_METRICAS}
+        self._en_curso = 0
+        self.cambios = False
+
+    def _observar(self, nombre, etiquetas, valor):
+        buckets = DEFINICION_METRICAS[nombre][3]
+        serie = self._series[nombre].get(etiquetas)
+        if serie is None:
+            serie = self._series[nombre][etiquetas] = [0] * (len(buckets) + 1) + [0.0]
+        serie[bisect_left(buckets, valor)] += 1
+        serie[-1] += valor
+
+    def entrar(self):
+        with self._lock:
+            self._en_curso += 1
+            self.cambios = True
+        if METRICAS_CONFIG['dir'] and _hilo_volcado is None:
+            iniciar_volcado()
+
+    def salir(self, ruta, metodo, estado, duracion, medicion, tamano):
+        with self._lock:
+            self._en_curso -= 1
+            self._observar('inventario_solicitud_duracion_segundos', (ruta, metodo, str(estado)), duracion)
+            self._observar('inventario_solicitud_db_segundos', (ruta, metodo), medicion.db)
+            if tamano is not None:
+                self._observar('inventario_respuesta_bytes', (ruta, metodo), tamano)
+            consultas = self._series['inventario_db_consultas_total']
+            consultas[(ruta, metodo)] = consultas.get((ruta, metodo), 0) + medicion.consultas
+            self.cambios = True
+
+    def exportar(self):
+        # La caché de lecturas lleva sus propios contadores: se leen al exportar
+        cache = cache_lecturas.estadisticas()
+        with self._lock:
+            series = dict(
+                self._series,
+                inventario_solicitudes_en_curso={(): self._en_curso},
+                inventario_cache_lecturas_total={('hit',): cache['hits'], ('miss',): cache['misses']},
+                inventario_cache_expulsiones_total={
+                    ('lru',): cache['expulsadas'], ('vencida',): cache['expiradas'],
+                    ('invalidada',): cache['invalidadas']
+                },
+                inventario_cache_entradas={(): cache['entradas']}
+            )
+            return serializar_series(series)
+
+    def volcar(self):
+        """Dejar la foto de este worker en la carpeta compartida"""
+        self.cambios = False
+        escribir_foto_metricas(ruta_foto_metricas(os.getpid()), self.exportar())
+
+    @staticmethod
+    def formato_prometheus(fotos):
+        total = sumar_fotos(fotos)
+
+        def etiquetas_texto(nombres, valores, extra=''):
+            pares = [f'{n}="{escapar_etiqueta(v)}"' for n, v in zip(nombres, valores)]
+            if extra:
+                pares.append(extra)
+            return '{' + ','.join(pares) + '}' if pares else ''
+
+        lineas = []
+        for nombre, (tipo, ayuda, nombres, buckets) in DEFINICION_METRICAS.items():
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            series = total[nombre]
+            if tipo == 'gauge' and not series:
+                series = {(): 0}
+            for etiquetas, valor in sorted(series.items()):
+                if tipo != 'histogram':
+                    lineas.append(f'{nombre}{etiquetas_texto(nombres, etiquetas)} {valor}')
+                    continue
+                acumulado = 0
+                for limite, cuenta in zip(buckets + ('+Inf',), valor[:-1]):
+                    acumulado += cuenta
+                    le = f'le="{limite}"'
+                    lineas.append(f'{nombre}_bucket{etiquetas_texto(nombres, etiquetas, le)} {acumulado}')
+                lineas.append(f'{nombre}_sum{etiquetas_texto(nombres, etiquetas)} {valor[-1]}')
+                lineas.append(f'{nombre}_count{etiquetas_texto(nombres, etiquetas)} {acumulado}')
+        return '\n'.join(lineas) + '\n'
+
+
+def escapar_etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def ruta_foto_metricas(nombre, prefijo='metricas'):
+    return os.path.join(METRICAS_CONFIG['dir'], f'{prefijo}-{nombre}.json')
+
+
+def escribir_foto_metricas(ruta, foto):
+    # Escribir aparte y reemplazar: quien lee nunca ve un archivo a medias
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(foto, archivo)
+    os.replace(temporal, ruta)
+
+
+def leer_fotos_metricas(excluir=None, prefijo='metricas'):
+    """Fotos dejadas por los workers (y el acumulado de los que ya salieron)"""
+    fotos = []
+    carpeta = METRICAS_CONFIG['dir']
+    if not carpeta or not os.path.isdir(carpeta):
+        return fotos
+    for nombre in os.listdir(carpeta):
+        ruta = os.path.join(carpeta, nombre)
+        if not (nombre.startswith(f'{prefijo}-') and nombre.endswith('.json')) or ruta == excluir:
+            continue
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                fotos.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue
+    return fotos
+
+
+def serializar_series(series):
+    """{nombre: {etiquetas: valor}} -> foto JSON (las tuplas no pueden ser llaves)"""
+    return {
+        nombre: [[list(etiquetas), list(valor) if isinstance(valor, list) else valor]
+                 for etiquetas, valor in valores.items()]
+        for nombre, valores in series.items()
+    }
+
+
+def sumar_fotos(fotos):
+    """Sumar serie por serie las fotos de varios procesos"""
+    total = {nombre: {} for nombre in DEFINICION_METRICAS}
+    for foto in fotos:
+        for nombre, series in foto.items():
+            if nombre not in total:
+                continue
+            for etiquetas, valor in series:
+                etiquetas = tuple(etiquetas)
+                previo = total[nombre].get(etiquetas)
+                if previo is None:
+                    total[nombre][etiquetas] = list(valor) if isinstance(valor, list) else valor
+                elif isinstance(valor, list):
+                    total[nombre][etiquetas] = [a + b for a, b in zip(previo, valor)]
+                else:
+                    total[nombre][etiquetas] = previo + valor
+    return total
+
+
+def consolidar_metricas_worker(pid):
+    """
+    Sumar la foto de un worker que terminó al acumulado y borrarla, para que
+    los contadores no retrocedan cuando los workers se reciclan. Lo llama el
+    proceso principal de servidor_produccion.py.
+    """
+    ruta = ruta_foto_metricas(pid)
+    if not os.path.exists(ruta):
+        return
+    acumulado = ruta_foto_metricas('acumulado')
+    fotos = []
+    for origen in (ruta, acumulado):
+        try:
+            with open(origen, encoding='utf-8') as archivo:
+                fotos.append(json.load(archivo))
+        except (OSError, ValueError):
+            continue
+    total = sumar_fotos(fotos)
+    # Las solicitudes en curso y las entradas en caché de un proceso que ya
+    # no existe no cuentan
+    del total['inventario_solicitudes_en_curso']
+    del total['inventario_cache_entradas']
+    escribir_foto_metricas(acumulado, serializar_series(total))
+    os.remove(ruta)
+
+
+metricas = RegistroMetricas()
+
+# Un hilo por proceso vuelca cada `intervalo_volcado` segundos lo que cambió
+# (métricas y consultas lentas): otro worker nunca ve datos más viejos que eso
+_hilo_volcado = None
+_lock_volcado = threading.Lock()
+
+def iniciar_volcado():
+    global _hilo_volcado
+    with _lock_volcado:
+        if _hilo_volcado is None:
+            _hilo_volcado = threading.Thread(target=_bucle_volcado, daemon=True)
+            _hilo_volcado.start()
+
+def _bucle_volcado():
+    while True:
+        time.sleep(METRICAS_CONFIG['intervalo_volcado'])
+        try:
+            volcar_registros()
+        except OSError as e:
+            print(f"No se pudieron volcar las métricas: {e}")
+
+def volcar_registros(forzar=False):
+    for registro in (metricas, consultas_lentas):
+        if forzar or registro.cambios:
+            registro.volcar()
+
+
+@rutas.before_app_request
+def iniciar_medicion():
+    ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+    medicion_actual.set(MedicionSolicitud(ruta))
+    metricas.entrar()
+
+
+# Se registra antes que la compresión, así corre después (Flask ejecuta los
+# after_request en orden inverso) y mide el tamaño ya comprimido
+@rutas.after_app_request
+def terminar_medicion(respuesta):
+    medicion = medicion_actual.get()
+    if medicion is None:
+        return respuesta
+    respuesta.headers['Server-Timing'] = medicion.server_timing()
+
+    ruta = medicion.ruta
+    metodo = request.method
+    tamano = None if respuesta.is_streamed else respuesta.content_length
+    registro = metricas
+
+    # Se registra al cerrar la respuesta: las descargas por partes (Excel)
+    # cuentan hasta el último byte, con las consultas hechas mientras tanto
+    def registrar():
+        medicion_actual.set(None)
+        registro.salir(ruta, metodo, respuesta.status_code,
+                       time.perf_counter() - medicion.inicio, medicion, tamano)
+
+    respuesta.call_on_close(registrar)
+    return respuesta
+
+
+class CursorMedido:
+    """
+    Mezcla para cursores psycopg2 que suma a la solicitud en curso el tiempo
+    y número de sentencias. En los cursores de servidor (con nombre) las
+    filas se traen con fetch*, así que también se miden.
+    """
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        exito = False
+        try:
+            resultado = super().execute(query, vars)
+            exito = True
+            return resultado
+        finally:
+            duracion = time.perf_counter() - inicio
+            registrar_consulta(duracion)
+            if duracion >= CONSULTAS_LENTAS_CONFIG['umbral']:
+                registrar_consulta_lenta(query, vars, duracion, self if exito else None)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            duracion = time.perf_counter() - inicio
+            registrar_consulta(duracion)
+            if duracion >= CONSULTAS_LENTAS_CONFIG['umbral']:
+                primeros = vars_list[0] if isinstance(vars_list, (list, tuple)) and vars_list else None
+                registrar_consulta_lenta(query, primeros, duracion)
+
+    def _medir_fetch(self, metodo, *args):
+        if self.name is None:
+            return metodo(*args)
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            registrar_consulta(time.perf_counter() - inicio)
+
+    def fetchone(self):
+        return self._medir_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._medir_fetch(super().fetchmany, *(() if size is None else (size,)))
+
+    def fetchall(self):
+        return self._medir_fetch(super().fetchall)
+
+
+_CURSORES_MEDIDOS = {}
+
+def cursor_medido(clase):
+    """Subclase medida de un cursor psycopg2 (cursor, RealDictCursor, ...)"""
+    medido = _CURSORES_MEDIDOS.get(clase)
+    if medido is None:
+        medido = _CURSORES_MEDIDOS[clase] = type(f'{clase.__name__}Medido', (CursorMedido, clase), {})
+    return medido
+
+
+class ConexionMedida(psycopg2.extensions.connection):
+    """Conexión cuyos cursores (cualquiera sea su cursor_factory) se miden"""
+
+    def cursor(self, *args, **kwargs):
+        clase = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = cursor_medido(clase)
+        return super().cursor(*args, **kwargs)
+
+
+# =====================================================
+# CONSULTAS LENTAS
+# =====================================================
+# Las sentencias de al menos `umbral` segundos van a un búfer circular de
+# `max_entradas`. Con probabilidad `muestra_explain` se guarda además su
+# EXPLAIN (ANALYZE, BUFFERS), que vuelve a ejecutar la consulta (0 = nunca)
+CONSULTAS_LENTAS_CONFIG = {
+    'umbral': float(os.getenv('CONSULTAS_LENTAS_UMBRAL_MS', 200)) / 1000,
+    'max_entradas': int(os.getenv('CONSULTAS_LENTAS_MAX', 1000)),
+    'muestra_explain': float(os.getenv('CONSULTAS_LENTAS_MUESTRA_EXPLAIN', 0))
+}
+
+_SQL_COMENTARIOS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_SQL_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_SQL_MARCADORES = re.compile(r'%(?:\(\w+\))?s')
+_SQL_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SQL_ARREGLOS = re.compile(r'\bARRAY\[[^\]]*\]', re.I)
+_SQL_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SQL_FILAS = re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+')
+_SQL_ESPACIOS = re.compile(r'\s+')
+_SQL_ESCRITURA = re.compile(r'\b(insert|update|delete|merge)\b')
+
+def normalizar_sql(query):
+    """
+    Texto de la huella de una sentencia: sin comentarios, con los literales
+    y marcadores como ?, las listas y filas de VALUES colapsadas y los
+    espacios normalizados. Un mismo armado con otros valores da la misma
+    huella.
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = str(query)
+    texto = _SQL_COMENTARIOS.sub(' ', query)
+    texto = _SQL_CADENAS.sub('?', texto)
+    texto = _SQL_MARCADORES.sub('?', texto)
+    texto = _SQL_NUMEROS.sub('?', texto)
+    texto = _SQL_ARREGLOS.sub('ARRAY[?]', texto)
+    texto = _SQL_LISTAS.sub('(?)', texto)
+    texto = _SQL_FILAS.sub('(?)', texto)
+    return _SQL_ESPACIOS.sub(' ', texto).strip().lower()
+
+def tipo_parametro(valor):
+    if valor is None:
+        return 'null'
+    if isinstance(valor, bool):
+        return 'bool'
+    if isinstance(valor, (int, float, Decimal)):
+        return 'num'
+    if isinstance(valor, (date, datetime)):
+        return 'fecha'
+    if isinstance(valor, str):
+        # En los LIKE importa si el patrón empieza con comodín
+        return 'str%' if valor.startswith('%') else 'str'
+    if isinstance(valor, (list, tuple)):
+        return f'list[{len(valor)}]'
+    return type(valor).__name__
+
+def forma_parametros(params):
+    """Tipos de los parámetros, sin sus valores: '(str%, num, list[3])'"""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{clave}: {tipo_parametro(valor)}' for clave, valor in sorted(params.items())) + '}'
+    return '(' + ', '.join(tipo_parametro(valor) for valor in params) + ')'
+
+def entrada_consulta_lenta(query, params, duracion):
+    sql = normalizar_sql(query)
+    medicion = medicion_actual.get()
+    return {
+        "huella": hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16],
+        "sql": sql,
+        "ruta": medicion.ruta if medicion is not None else '-',
+        "parametros": forma_parametros(params),
+        "duracion_ms": round(duracion * 1000, 2),
+        "momento": time.time(),
+        "plan": None
+    }
+
+def muestrear_plan(sql):
+    """¿Capturar el plan de esta ejecución? Solo lecturas y según la muestra"""
+    muestra = CONSULTAS_LENTAS_CONFIG['muestra_explain']
+    if muestra <= 0 or random.random() >= muestra:
+        return False
+    return sql.startswith('select') or (sql.startswith('with') and not _SQL_ESCRITURA.search(sql))
+
+def capturar_plan(conn, query, params):
+    """
+    EXPLAIN (ANALYZE, BUFFERS) en un cursor aparte y dentro de un SAVEPOINT:
+    ni el resultado pendiente ni la transacción de quien llamó cambian.
+    """
+    cur = psycopg2.extensions.cursor(conn)    # sin medir
+    savepoint = not conn.autocommit
+    prefijo = 'EXPLAIN (ANALYZE, BUFFERS) '
+    try:
+        if savepoint:
+            cur.execute("SAVEPOINT captura_plan")
+        try:
+            cur.execute(prefijo.encode() + query if isinstance(query, bytes) else prefijo + query, params)
+            plan = '\n'.join(fila[0] for fila in cur.fetchall())
+        except psycopg2.Error as e:
+            if savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT captura_plan")
+            return f"No se pudo obtener el plan: {e}"
+        if savepoint:
+            cur.execute("RELEASE SAVEPOINT captura_plan")
+        return plan
+    finally:
+        cur.close()
+
+def registrar_consulta_lenta(query, params, duracion, cursor=None):
+    """Anotar una sentencia lenta; `cursor` solo si terminó bien (para el plan)"""
+    try:
+        entrada = entrada_consulta_lenta(query, params, duracion)
+        if cursor is not None and cursor.name is None and muestrear_plan(entrada['sql']):
+            entrada['plan'] = capturar_plan(cursor.connection, query, params)
+        consultas_lentas.registrar(entrada)
+    except Exception as e:
+        # El registro nunca debe romper la consulta que se está midiendo
+        print("CONSULTAS LENTAS ERROR:", e)
+
+
+class RegistroConsultasLentas:
+    """Búfer circular de las consultas lentas de este proceso"""
+
+    def __init__(self, max_entradas):
+        self._lock = threading.Lock()
+        self._entradas = deque(maxlen=max_entradas)
+        self.cambios = False
+
+    def registrar(self, entrada):
+        with self._lock:
+            self._entradas.append(entrada)
+            self.cambios = True
+        if METRICAS_CONFIG['dir'] and _hilo_volcado is None:
+            iniciar_volcado()
+
+    def exportar(self):
+        with self._lock:
+            return list(self._entradas)
+
+    def volcar(self):
+        """Dejar las entradas de este worker en la carpeta compartida"""
+        self.cambios = False
+        escribir_foto_metricas(ruta_foto_metricas(os.getpid(), 'lentas'), self.exportar())
+
+
+consultas_lentas = RegistroConsultasLentas(CONSULTAS_LENTAS_CONFIG['max_entradas'])
+
+
+def consolidar_consultas_lentas_worker(pid):
+    """Pasar las entradas de un worker que terminó al acumulado (ver consolidar_metricas_worker)"""
+    ruta = ruta_foto_metricas(pid, 'lentas')
+    if not os.path.exists(ruta):
+        return
+    acumulado = ruta_foto_metricas('acumulado', 'lentas')
+    entradas = []
+    for origen in (acumulado, ruta):
+        try:
+            with open(origen, encoding='utf-8') as archivo:
+                entradas.extend(json.load(archivo))
+        except (OSError, ValueError):
+            continue
+    entradas.sort(key=lambda entrada: entrada['momento'])
+    escribir_foto_metricas(acumulado, entradas[-CONSULTAS_LENTAS_CONFIG['max_entradas']:])
+    os.remove(ruta)
+
+
+def percentil(ordenados, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+def resumir_consultas_lentas(entradas):
+    """Agrupar por huella: cantidad, p50/p95/p99, rutas, formas de parámetros y último plan"""
+    grupos = {}
+    for entrada in entradas:
+        grupos.setdefault(entrada['huella'], []).append(entrada)
+
+    resumen = []
+    for huella, grupo in grupos.items():
+        duraciones = sorted(entrada['duracion_ms'] for entrada in grupo)
+        grupo.sort(key=lambda entrada: entrada['momento'])
+        con_plan = [entrada for entrada in grupo if entrada.get('plan')]
+        resumen.append({
+            "huella": huella,
+            "sql": grupo[-1]['sql'],
+            "cantidad": len(grupo),
+            "p50_ms": percentil(duraciones, 50),
+            "p95_ms": percentil(duraciones, 95),
+            "p99_ms": percentil(duraciones, 99),
+            "max_ms": duraciones[-1],
+            "total_ms": round(sum(duraciones), 2),
+            "rutas": dict(Counter(entrada['ruta'] for entrada in grupo).most_common()),
+            "parametros": dict(Counter(entrada['parametros'] for entrada in grupo).most_common()),
+            "ultima_vez": datetime.fromtimestamp(grupo[-1]['momento']).isoformat(),
+            "plan": con_plan[-1]['plan'] if con_plan else None
+        })
+    resumen.sort(key=lambda grupo: grupo['total_ms'], reverse=True)
+    return resumen
+
+
 # =====================================================
 # FUNCIONES DE BASE DE DATOS
 # =====================================================
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = psycopg2.connect(**DB_CONFIG)
+    """Abrir una conexión nueva (la usa el pool; los endpoints usan db_pool)"""
+    conn = psycopg2.connect(**DB_CONFIG, connection_factory=ConexionMedida)
     conn.set_client_encoding('UTF8')
     return conn
 
+def crear_pool():
+    return PoolConexiones(
+        get_db_connection,
+        minconn=DB_POOL_CONFIG['min'],
+        maxconn=DB_POOL_CONFIG['max'],
+        timeout=DB_POOL_CONFIG['timeout'],
+        verificar_tras=DB_POOL_CONFIG['verificar_tras']
+    )
+
+db_pool = crear_pool()
+
+# Se busca db_pool al momento del fork: iniciar_worker() puede reemplazarlo
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=lambda: db_pool.reiniciar_tras_fork())
+
 def ejecutar_query(query, params=None, fetchone=False, fetchall=True, commit=False):
-    """Ejecutar query y retornar resultados"""
-    conn = None
-    try:
-        conn = get_db_connection()
+    """Ejecutar query con una conexión del pool y retornar resultados"""
+    with db_pool.conexion() as conn:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         cursor.execute(query, params or ())
         
@@ -59,18 +975,170 @@ def ejecutar_query(query, params=None, fetchone=False, fetchall=True, commit=Fal
             return cursor.fetchone()
         if fetchall:
             return cursor.fetchall()
-            
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
+
+# =====================================================
+# CACHÉ EN MEMORIA (TTL + LRU)
+# =====================================================
+class CacheTTL:
+    """
+    Caché acotada en memoria del proceso, segura para hilos.
+
+    Cada entrada vence a los `ttl` segundos; si se supera `max_entradas`
+    se expulsa la usada hace más tiempo (LRU).
+    """
+
+    def __init__(self, max_entradas, ttl):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._datos = OrderedDict()   # clave -> (vence_en, valor)
+        self._stats = {"hits": 0, "misses": 0, "expiradas": 0, "expulsadas": 0, "invalidadas": 0}
+
+    def obtener(self, clave):
+        """Retorna el valor o None si no está o ya venció"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self._stats["misses"] += 1
+                return None
+            vence_en, valor = entrada
+            if vence_en <= time.monotonic():
+                del self._datos[clave]
+                self._stats["expiradas"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._datos.move_to_end(clave)
+            self._stats["hits"] += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._guardar(clave, valor)
+
+    def _guardar(self, clave, valor):
+        """guardar() con el lock ya tomado"""
+        self._datos[clave] = (time.monotonic() + self.ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+            self._stats["expulsadas"] += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            if self._datos.pop(clave, None) is not None:
+                self._stats["invalidadas"] += 1
+
+    def invalidar_si(self, condicion):
+        """Eliminar las entradas cuyo (clave, valor) cumpla la condición"""
+        with self._lock:
+            claves = [c for c, (_, v) in self._datos.items() if condicion(c, v)]
+            for clave in claves:
+                del self._datos[clave]
+            self._stats["invalidadas"] += len(claves)
+
+    def limpiar(self):
+        with self._lock:
+            self._stats["invalidadas"] += len(self._datos)
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            consultas = stats["hits"] + stats["misses"]
+            stats.update({
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl": self.ttl,
+                "hit_ratio": stats["hits"] / consultas if consultas else 0.0
+            })
+        return stats
+
+# =====================================================
+# COMPRESIÓN DE RESPUESTAS
+# =====================================================
+# Se comprimen las respuestas de al menos `minimo` bytes si el cliente lo
+# acepta (brotli si está instalado, si no gzip)
+COMPRESION_CONFIG = {
+    'minimo': int(os.getenv('COMPRESION_MINIMO', 1024)),
+    'nivel_gzip': int(os.getenv('COMPRESION_NIVEL_GZIP', 5)),
+    'calidad_brotli': int(os.getenv('COMPRESION_CALIDAD_BROTLI', 5))
+}
+TIPOS_COMPRIMIBLES = {
+    'application/json', 'text/html', 'text/plain', 'text/css',
+    'text/csv', 'application/javascript'
+}
+
+def elegir_codificacion(accept_encodings):
+    """'br', 'gzip' o None según Accept-Encoding"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=COMPRESION_CONFIG['calidad_brotli'])
+    return gzip.compress(datos, compresslevel=COMPRESION_CONFIG['nivel_gzip'])
+
+@rutas.after_app_request
+def comprimir_respuesta(respuesta):
+    if (respuesta.status_code != 200
+            or respuesta.direct_passthrough
+            or respuesta.is_streamed
+            or 'Content-Encoding' in respuesta.headers
+            or respuesta.mimetype not in TIPOS_COMPRIMIBLES):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.accept_encodings)
+    datos = respuesta.get_data()
+    if codificacion is None or len(datos) < COMPRESION_CONFIG['minimo']:
+        return respuesta
+
+    with medir_fase('comp'):
+        respuesta.set_data(comprimir(datos, codificacion))
+    respuesta.headers['Content-Encoding'] = codificacion
+    # Un ETag fuerte identifica los bytes exactos: cada codificación tiene el suyo
+    etag, debil = respuesta.get_etag()
+    if etag:
+        respuesta.set_etag(f"{etag}-{codificacion}", weak=debil)
+    return respuesta
 
 # =====================================================
 # DECORADOR DE AUTENTICACIÓN
 # =====================================================
+def crear_auth_cache():
+    return CacheTTL(AUTH_CACHE_CONFIG['max_entradas'], AUTH_CACHE_CONFIG['ttl'])
+
+auth_cache = crear_auth_cache()
+
+QUERY_USUARIO_POR_TOKEN = """
+    SELECT u.*, r.Nombre_Rol
+    FROM Usuarios u
+    JOIN Roles r ON u.fk_Id_Rol = r.Id_Rol
+    WHERE u.Token = %s AND u.Estado_Usuario = TRUE
+"""
+
+def invalidar_usuario_cache(cedula):
+    """Quitar de la caché de autenticación los tokens de un usuario"""
+    auth_cache.invalidar_si(lambda token, user: str(user['cedula_usuario']) == str(cedula))
+
+def usuario_por_token(token):
+    """Usuario activo dueño del token (pasando por auth_cache) o None"""
+    with medir_fase('auth'):
+        user = auth_cache.obtener(token)
+        if user is None:
+            user = ejecutar_query(QUERY_USUARIO_POR_TOKEN, (token,), fetchone=True)
+
+            if not user:
+                return None
+
+            user = dict(user)
+            auth_cache.guardar(token, user)
+    return user
+
+
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -82,15 +1150,8 @@ def require_auth(f):
         try:
             token = auth.split(" ")[1]
 
-            query = """
-                SELECT u.*, r.Nombre_Rol
-                FROM Usuarios u
-                JOIN Roles r ON u.fk_Id_Rol = r.Id_Rol
-                WHERE u.Token = %s AND u.Estado_Usuario = TRUE
-            """
-            user = ejecutar_query(query, (token,), fetchone=True)
-
-            if not user:
+            user = usuario_por_token(token)
+            if user is None:
                 return jsonify({"error": "Token inválido"}), 401
 
             request.current_user = user
@@ -123,7 +1184,7 @@ def require_write_permission(f):
     Bloquea a usuarios con rol CONSULTA.
     
     Uso:
-        @app.route('/api/equipos', methods=['POST'])
+        @rutas.route('/api/equipos', methods=['POST'])
         @require_auth
         @require_write_permission  
         def registrar_equipo():
@@ -145,44 +1206,748 @@ def require_write_permission(f):
     return decorated_function
 
 # =====================================================
-# ENDPOINTS - AUTENTICACIÓN
+# DECORADOR ETAG (GET CONDICIONAL)
 # =====================================================
-@app.route('/api/login', methods=['POST'])
-def login():
-    try:
-        data = request.get_json()
-        print("ingreso al login")
-        if not data:
-            return jsonify({"error": "No se enviaron datos"}), 400
+# Forma de las respuestas; cambiarla invalida todos los ETag emitidos
+VERSION_API = '1'
 
-        cedula = data.get('cedula')
-        password = data.get('password')
+# Versión = la ya compactada en Versiones_Tabla + los cambios pendientes en
+# Cambios_Tabla (migraciones/0012). Una sola sentencia ve las dos con la
+# misma foto, así compactar no cambia el resultado
+QUERY_VERSIONES = """
+    SELECT t.Tabla,
+           COALESCE(v.Version, 0) + (SELECT count(*) FROM Cambios_Tabla c WHERE c.Tabla = t.Tabla) AS Version
+    FROM unnest(%s::varchar[]) AS t(Tabla)
+    LEFT JOIN Versiones_Tabla v ON v.Tabla = t.Tabla
+"""
 
-        if not cedula or not password:
-            return jsonify({"error": "Cédula y contraseña obligatorias"}), 400
+def versiones_tablas(tablas):
+    """
+    Versión actual de cada tabla: cuántas sentencias la cambiaron (triggers
+    de sentencia de migraciones/0012). Búsquedas por índice en las dos tablas.
+    """
+    filas = ejecutar_query(QUERY_VERSIONES, (list(tablas),))
+    versiones = {fila['tabla']: fila['version'] for fila in filas}
+    return [versiones.get(tabla, 0) for tabla in tablas]
 
-        query = """
-            SELECT u.Cedula_Usuario, u.Nombre_Usuario, r.Nombre_Rol, r.Id_Rol
-            FROM Usuarios u
-            JOIN Roles r ON u.fk_Id_Rol = r.Id_Rol
-            WHERE u.Cedula_Usuario = %s
-            AND u.Password_Usuario = %s
-            AND u.Estado_Usuario = TRUE
-        """
+def calcular_etag(ruta, args, versiones):
+    """ETag de una respuesta: ruta, parámetros y versión de las tablas que lee"""
+    parametros = sorted(args.items(multi=True))
+    base = f"{VERSION_API}|{ruta}|{parametros}|{versiones}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()
 
-        user = ejecutar_query(query, (cedula, password), fetchone=True)
+def variantes_etag(etag):
+    """comprimir_respuesta agrega -gzip / -br al ETag de la versión comprimida"""
+    return (etag, f"{etag}-gzip", f"{etag}-br")
 
-        if not user:
-            return jsonify({"error": "Credenciales inválidas"}), 401
+def con_etag(*tablas):
+    """
+    Responder 304 Not Modified si ninguna de las tablas cambió desde que el
+    cliente recibió la respuesta (If-None-Match). Va después de require_auth:
 
-        token = str(uuid.uuid4())
+        @rutas.route('/api/equipos', methods=['GET'])
+        @require_auth
+        @con_etag('equipos')
+        def listar_equipos():
+            ...
 
-        ejecutar_query(
-            "UPDATE Usuarios SET Token = %s WHERE Cedula_Usuario = %s",
-            (token, cedula),
-            commit=True
+    La versión se lee ANTES de ejecutar la consulta: si hay una escritura en
+    medio, el ETag queda viejo y el cliente vuelve a descargar (nunca al revés).
+    """
+    tablas = tuple(tabla.lower() for tabla in tablas)
+
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                versiones = versiones_tablas(tablas)
+            except Exception as e:
+                print("ETAG ERROR:", e)
+                return f(*args, **kwargs)
+
+            etag = calcular_etag(request.path, request.args, versiones)
+
+            for variante in variantes_etag(etag):
+                if request.if_none_match.contains(variante):
+                    respuesta = make_response('', 304)
+                    respuesta.set_etag(variante)
+                    break
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+                respuesta.set_etag(etag)
+
+            # El navegador guarda la respuesta pero siempre la revalida
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            return respuesta
+        return decorated_function
+    return decorador
+
+# =====================================================
+# ESCUCHA DE NOTIFICACIONES (LISTEN)
+# =====================================================
+class EscuchaCanal:
+    """
+    Hilo con una conexión propia (fuera del pool) que hace LISTEN en `canal`
+    y entrega los payloads recibidos, en lotes, a `al_notificar`. Si la
+    conexión se cae reintenta con espera creciente; `al_conectar` corre
+    cada vez que la escucha queda activa (para vaciar o recuperar lo que se
+    perdió mientras no había conexión).
+    """
+
+    def __init__(self, canal, al_notificar, al_conectar=None, nombre=None):
+        self.canal = canal
+        self.al_notificar = al_notificar
+        self.al_conectar = al_conectar
+        self.nombre = nombre or canal
+        self.escuchando = False
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        """Iniciar el hilo si hace falta; True si ya escucha"""
+        if self._hilo is None:
+            with self._lock:
+                if self._hilo is None:
+                    self._hilo = threading.Thread(target=self._escuchar, daemon=True)
+                    self._hilo.start()
+        return self.escuchando
+
+    def _escuchar(self):
+        espera = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**DB_CONFIG)
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {self.canal}")
+                if self.al_conectar is not None:
+                    self.al_conectar()
+                self.escuchando = True
+                espera = 1
+                while True:
+                    # Cada 30 s sin notificaciones se comprueba la conexión
+                    if not select.select([conn], [], [], 30)[0]:
+                        conn.cursor().execute("SELECT 1")
+                    else:
+                        conn.poll()
+                        payloads = [notificacion.payload for notificacion in conn.notifies]
+                        conn.notifies.clear()
+                        if payloads:
+                            self.al_notificar(payloads)
+            except (psycopg2.Error, OSError) as e:
+                print(f"{self.nombre} sin escucha de {self.canal}: {e}")
+            finally:
+                self.escuchando = False
+                if conn is not None:
+                    conn.close()
+            time.sleep(espera)
+            espera = min(espera * 2, 30)
+
+# =====================================================
+# CACHÉ DE LECTURAS ENTRE WORKERS (LISTEN/NOTIFY)
+# =====================================================
+# Cada worker guarda en memoria las respuestas de lectura frecuentes. Cada
+# una recuerda las tablas que leyó, y el trigger de Cambios_Tabla
+# (migraciones/0008 y 0012) notifica en CANAL_CAMBIOS el nombre de la tabla que
+# cambió: un hilo por worker escucha y borra esas entradas. Así una
+# escritura en cualquier worker (o directa en la base) se ve en todos.
+CACHE_LECTURAS_CONFIG = {
+    'max_entradas': int(os.getenv('CACHE_LECTURAS_MAX', 2000)),
+    # Respaldo por si se pierde una notificación; la invalidación normal es por NOTIFY
+    'ttl': float(os.getenv('CACHE_LECTURAS_TTL', 300)),
+    'activa': os.getenv('CACHE_LECTURAS', '1') != '0'
+}
+CANAL_CAMBIOS = 'inventario_cambios'
+
+
+class CacheLecturas(CacheTTL):
+    """
+    Caché de respuestas por endpoint y parámetros, invalidada por tabla.
+
+    Mientras el hilo de escucha no está conectado la caché no se usa (otro
+    worker podría escribir sin que este se entere); al reconectar se vacía.
+    Una respuesta que se armó mientras llegaba una notificación de sus
+    tablas no se guarda (podría ser anterior al cambio).
+    """
+
+    def __init__(self, max_entradas, ttl):
+        super().__init__(max_entradas, ttl)
+        self._generaciones = Counter()    # tabla -> notificaciones recibidas
+        self._epoca = 0                   # reconexiones del hilo de escucha
+        self._stats["notificaciones"] = 0
+        self._escucha = EscuchaCanal(
+            CANAL_CAMBIOS, self._notificaciones, al_conectar=self._vaciar, nombre='Caché de lecturas'
         )
 
+    @property
+    def escuchando(self):
+        return self._escucha.escuchando
+
+    def disponible(self):
+        """Iniciar el hilo de escucha si hace falta; True si ya escucha"""
+        return self._escucha.iniciar()
+
+    def generacion(self, tablas):
+        with self._lock:
+            return self._epoca, tuple(self._generaciones[tabla] for tabla in tablas)
+
+    def guardar_vigente(self, clave, valor, tablas, generacion):
+        """Guardar solo si no llegó ninguna notificación de `tablas` desde `generacion`"""
+        with self._lock:
+            if self.escuchando and (self._epoca, tuple(self._generaciones[t] for t in tablas)) == generacion:
+                self._guardar(clave, (tablas, valor))
+
+    def obtener(self, clave):
+        entrada = super().obtener(clave)
+        return None if entrada is None else entrada[1]
+
+    def invalidar_tabla(self, tabla):
+        with self._lock:
+            self._generaciones[tabla] += 1
+            self._stats["notificaciones"] += 1
+            claves = [c for c, (_, (tablas, _v)) in self._datos.items() if tabla in tablas]
+            for clave in claves:
+                del self._datos[clave]
+            self._stats["invalidadas"] += len(claves)
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        stats["escuchando"] = self.escuchando
+        return stats
+
+    def _notificaciones(self, tablas):
+        for tabla in tablas:
+            self.invalidar_tabla(tabla)
+
+    def _vaciar(self):
+        with self._lock:
+            self._epoca += 1
+            self._stats["invalidadas"] += len(self._datos)
+            self._datos.clear()
+
+
+def crear_cache_lecturas():
+    return CacheLecturas(CACHE_LECTURAS_CONFIG['max_entradas'], CACHE_LECTURAS_CONFIG['ttl'])
+
+cache_lecturas = crear_cache_lecturas()
+
+
+def clave_cache(endpoint, parametros_ruta, args):
+    """
+    Endpoint y parámetros normalizados (orden fijo) de la solicitud. El
+    endpoint va sin el blueprint: la misma ruta en Flask y en el modo
+    async comparte entrada.
+    """
+    return (
+        endpoint.rpartition('.')[2],
+        tuple(sorted(parametros_ruta.items())),
+        tuple(sorted(args.items(multi=True)))
+    )
+
+
+def con_cache(*tablas):
+    """
+    Servir la respuesta desde cache_lecturas mientras ninguna de las tablas
+    que lee cambie. Va después de require_auth (y de con_etag, así un 304
+    no pasa por la caché). Solo para respuestas iguales para todo usuario
+    autenticado:
+
+        @rutas.route('/api/roles', methods=['GET'])
+        @require_auth
+        @con_cache('roles')
+        def listar_roles():
+            ...
+    """
+    tablas = tuple(tabla.lower() for tabla in tablas)
+
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not CACHE_LECTURAS_CONFIG['activa'] or not cache_lecturas.disponible():
+                return f(*args, **kwargs)
+
+            clave = clave_cache(request.endpoint, kwargs, request.args)
+            guardada = cache_lecturas.obtener(clave)
+            if guardada is not None:
+                cuerpo, tipo = guardada
+                return Response(cuerpo, content_type=tipo)
+
+            generacion = cache_lecturas.generacion(tablas)
+            respuesta = make_response(f(*args, **kwargs))
+            if respuesta.status_code == 200 and not respuesta.is_streamed:
+                cache_lecturas.guardar_vigente(
+                    clave, (respuesta.get_data(), respuesta.content_type), tablas, generacion
+                )
+            return respuesta
+        return decorated_function
+    return decorador
+
+# =====================================================
+# EVENTOS EN VIVO (/api/stream)
+# =====================================================
+# Los triggers de migraciones/0009 guardan cada cambio en Eventos_Inventario
+# y lo notifican en CANAL_EVENTOS. Cada worker tiene un solo hilo de escucha
+# (una conexión) y un búfer con los últimos eventos ya convertidos a texto
+# SSE: todos los clientes conectados a ese worker leen del mismo búfer. Un
+# cliente que vuelve con Last-Event-ID recibe desde la tabla lo que se perdió.
+#
+# Id_Evento sigue el orden de inserción, no el de commit: una transacción
+# puede confirmar un id menor después de que otra confirmó uno mayor. Al
+# reanudar (el cliente o la escucha del worker) se vuelven a leer los
+# últimos `margen` ids anteriores y se descartan los repetidos por id: el
+# búfer del worker no los repite y el cliente ignora los que ya aplicó.
+EVENTOS_CONFIG = {
+    # Eventos recientes en memoria por worker
+    'buffer': int(os.getenv('EVENTOS_BUFFER', 2000)),
+    # Máximo de eventos que se reenvían al reanudar; con más el cliente recarga
+    'repetir_max': int(os.getenv('EVENTOS_REPETIR_MAX', 5000)),
+    # Ids anteriores al último conocido que se vuelven a leer al reanudar
+    'margen': int(os.getenv('EVENTOS_MARGEN', 200)),
+    # Segundos que una conexión nueva espera a que el worker escuche el canal
+    'espera_escucha': float(os.getenv('EVENTOS_ESPERA_ESCUCHA', 5)),
+    # Horas que se guardan los eventos (los borra el mantenimiento)
+    'retencion_horas': float(os.getenv('EVENTOS_RETENCION_HORAS', 24)),
+    # Segundos sin eventos tras los que se envía un comentario (la conexión sigue viva)
+    'latido': float(os.getenv('EVENTOS_LATIDO', 15)),
+    # Milisegundos que espera EventSource antes de reconectar
+    'reintento_ms': int(os.getenv('EVENTOS_REINTENTO_MS', 3000)),
+    # Segundos que vale un ticket de POST /api/stream/ticket sin usar
+    'ticket_segundos': float(os.getenv('EVENTOS_TICKET_SEGUNDOS', 30))
+}
+CANAL_EVENTOS = 'inventario_eventos'
+CABECERAS_SSE = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+# Siempre devuelve al menos una fila con el primer y último id de la tabla;
+# los eventos posteriores a %s vienen en las columnas de la derecha
+QUERY_EVENTOS_DESDE = """
+    SELECT e.id, e.tipo, e.equipo, e.datos, limites.primero, limites.ultimo
+    FROM (SELECT min(Id_Evento) AS primero, max(Id_Evento) AS ultimo FROM Eventos_Inventario) limites
+    LEFT JOIN LATERAL (
+        SELECT Id_Evento AS id, Tipo AS tipo, Equipo AS equipo, Datos AS datos
+        FROM Eventos_Inventario
+        WHERE Id_Evento > %s
+        ORDER BY Id_Evento
+        LIMIT %s
+    ) e ON TRUE
+"""
+
+QUERY_EVENTOS_POR_ID = """
+    SELECT Id_Evento AS id, Tipo AS tipo, Equipo AS equipo, Datos AS datos
+    FROM Eventos_Inventario
+    WHERE Id_Evento = ANY(%s)
+    ORDER BY Id_Evento
+"""
+
+QUERY_PODAR_EVENTOS = "DELETE FROM Eventos_Inventario WHERE Fecha < CURRENT_TIMESTAMP - make_interval(secs => %s)"
+
+# Tickets de un solo uso para abrir el stream (migraciones/0013)
+QUERY_CREAR_TICKET_STREAM = """
+    INSERT INTO Tickets_Stream (Ticket, Token, Vence)
+    VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+"""
+
+# Borra el ticket y retorna el usuario si no había vencido y su sesión sigue
+# siendo la vigente (mismas columnas que QUERY_USUARIO_POR_TOKEN)
+QUERY_CANJEAR_TICKET_STREAM = """
+    WITH ticket AS (
+        DELETE FROM Tickets_Stream WHERE Ticket = %s RETURNING Token, Vence
+    )
+    SELECT u.*, r.Nombre_Rol
+    FROM ticket t
+    JOIN Usuarios u ON u.Token = t.Token
+    JOIN Roles r ON u.fk_Id_Rol = r.Id_Rol
+    WHERE t.Vence > CURRENT_TIMESTAMP AND u.Estado_Usuario = TRUE
+"""
+
+QUERY_PODAR_TICKETS_STREAM = "DELETE FROM Tickets_Stream WHERE Vence < CURRENT_TIMESTAMP"
+
+
+def texto_sse(evento):
+    """Evento en formato text/event-stream: id, tipo y el evento en JSON compacto"""
+    datos = json.dumps(evento, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+def texto_reinicio(ultimo_id):
+    """Aviso de que se perdieron eventos: el cliente debe recargar sus listados"""
+    return texto_sse({'id': ultimo_id, 'tipo': 'reiniciar'})
+
+
+def evento_de_fila(fila):
+    return {'id': fila['id'], 'tipo': fila['tipo'], 'equipo': fila['equipo'], 'datos': fila['datos']}
+
+
+def desde_con_margen(ultimo_id):
+    """Desde qué id se relee al reanudar después de `ultimo_id` (ver EVENTOS_CONFIG)"""
+    return max(ultimo_id - EVENTOS_CONFIG['margen'], 0)
+
+
+def parametros_repeticion(ultimo_id):
+    """Parámetros de QUERY_EVENTOS_DESDE para un cliente que vuelve con `ultimo_id`"""
+    return desde_con_margen(ultimo_id), EVENTOS_CONFIG['repetir_max'] + EVENTOS_CONFIG['margen'] + 1
+
+
+def repeticion_eventos(filas, ultimo_id):
+    """
+    Textos a reenviar a un cliente que vuelve con `ultimo_id` (filas de
+    QUERY_EVENTOS_DESDE con parametros_repeticion) y los ids reenviados.
+    Incluye los del margen anterior a `ultimo_id`, que el cliente descarta
+    si ya los tenía. Si no se puede completar (demasiados, ya borrados por
+    la retención o un id mayor que el último de la base) se envía un aviso
+    de reinicio.
+    """
+    primero, ultimo = filas[0]['primero'], filas[0]['ultimo'] or 0
+    eventos = [evento_de_fila(fila) for fila in filas if fila['id'] is not None]
+    if (len(eventos) > EVENTOS_CONFIG['repetir_max'] + EVENTOS_CONFIG['margen']
+            or ultimo_id > ultimo
+            or (primero is not None and primero > ultimo_id + 1)):
+        return [texto_reinicio(ultimo)], set()
+    return [texto_sse(evento) for evento in eventos], {evento['id'] for evento in eventos}
+
+
+class DifusorEventos:
+    """
+    Reparte los eventos de CANAL_EVENTOS entre los clientes de /api/stream
+    del worker. Cada evento recibido toma la siguiente posición del búfer
+    (orden de llegada); cada cliente recuerda su posición y espera a que
+    haya una mayor. Los clientes de Flask esperan en una Condition; los del
+    modo async registran un asyncio.Event que el hilo de escucha activa.
+    """
+
+    def __init__(self, max_buffer):
+        self._cond = threading.Condition()
+        self._buffer = deque()      # (posicion, id, texto SSE)
+        self._ids = set()
+        self._max_buffer = max_buffer
+        self._posicion = 0
+        self._avisos = set()        # (loop, asyncio.Event) de los clientes async
+        self._iniciado = False
+        self.ultimo_id = 0
+        self.cerrado = False
+        self._escucha = EscuchaCanal(
+            CANAL_EVENTOS, self._notificaciones, al_conectar=self._recuperar,
+            nombre='Eventos en vivo'
+        )
+
+    @property
+    def escuchando(self):
+        return self._escucha.escuchando
+
+    def disponible(self):
+        """Iniciar el hilo de escucha si hace falta; True si ya escucha"""
+        return self._escucha.iniciar()
+
+    def esperar_escucha(self, segundos):
+        """
+        Iniciar la escucha si hace falta y esperar hasta `segundos` a que
+        esté activa. Una conexión que toma su posición antes del LISTEN
+        perdería lo que se confirme mientras tanto.
+        """
+        fin = time.monotonic() + segundos
+        while not self.disponible():
+            if time.monotonic() >= fin:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def posicion_actual(self):
+        with self._cond:
+            return self._posicion
+
+    def agregar(self, eventos):
+        with self._cond:
+            for evento in eventos:
+                if evento['id'] in self._ids:
+                    continue
+                self._anexar(evento['id'], texto_sse(evento))
+                self.ultimo_id = max(self.ultimo_id, evento['id'])
+        self._avisar()
+
+    def reiniciar(self):
+        """Se perdieron eventos: todos los clientes reciben el aviso de reinicio"""
+        with self._cond:
+            self._anexar(None, texto_reinicio(self.ultimo_id))
+        self._avisar()
+
+    def cerrar(self):
+        """
+        El worker se detiene: las respuestas abiertas terminan y EventSource
+        reconecta (con Last-Event-ID) a otro worker
+        """
+        with self._cond:
+            self.cerrado = True
+        self._avisar()
+
+    def siguientes(self, posicion, omitir=()):
+        """
+        Textos de los eventos posteriores a `posicion` (sin los ids de
+        `omitir`, ya reenviados al reanudar) y la nueva posición. Si el
+        búfer ya descartó alguno de ellos, el aviso de reinicio.
+        """
+        with self._cond:
+            if self._buffer and posicion < self._buffer[0][0] - 1:
+                return [texto_reinicio(self.ultimo_id)], self._posicion
+            textos = []
+            for posicion_evento, id_evento, texto in reversed(self._buffer):
+                if posicion_evento <= posicion:
+                    break
+                if id_evento not in omitir:
+                    textos.append(texto)
+            textos.reverse()
+            return textos, self._posicion
+
+    def esperar(self, posicion, segundos):
+        """Esperar hasta `segundos` a que llegue un evento después de `posicion`"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._posicion > posicion or self.cerrado, segundos)
+
+    def registrar_aviso(self, loop, aviso):
+        with self._cond:
+            self._avisos.add((loop, aviso))
+
+    def quitar_aviso(self, loop, aviso):
+        with self._cond:
+            self._avisos.discard((loop, aviso))
+
+    def _anexar(self, id_evento, texto):
+        if len(self._buffer) >= self._max_buffer:
+            self._ids.discard(self._buffer.popleft()[1])
+        self._posicion += 1
+        self._buffer.append((self._posicion, id_evento, texto))
+        if id_evento is not None:
+            self._ids.add(id_evento)
+
+    def _avisar(self):
+        with self._cond:
+            self._cond.notify_all()
+            avisos = list(self._avisos)
+        for loop, aviso in avisos:
+            try:
+                loop.call_soon_threadsafe(aviso.set)
+            except RuntimeError:
+                # El loop ya se cerró (el proceso está terminando)
+                pass
+
+    def _notificaciones(self, payloads):
+        eventos, faltantes = [], []
+        for payload in payloads:
+            try:
+                evento = json.loads(payload)
+            except ValueError:
+                continue
+            if 'tipo' in evento:
+                eventos.append(evento)
+            else:
+                faltantes.append(evento['id'])
+        if faltantes:
+            # Eventos que no cabían en el payload de NOTIFY
+            try:
+                eventos.extend(evento_de_fila(fila) for fila in ejecutar_query(QUERY_EVENTOS_POR_ID, (faltantes,)))
+                eventos.sort(key=lambda evento: evento['id'])
+            except Exception as e:
+                print(f"No se pudieron leer los eventos {faltantes}: {e}")
+                self.reiniciar()
+        self.agregar(eventos)
+
+    def _recuperar(self):
+        """
+        Al (re)conectar: leer lo que se notificó mientras no había escucha,
+        con el margen de ids anteriores (agregar descarta los repetidos)
+        """
+        try:
+            if not self._iniciado:
+                # Primera escucha del worker: las conexiones esperan a que
+                # esté activa (esperar_escucha), no hay clientes atrasados
+                self._iniciado = True
+                filas = ejecutar_query(QUERY_EVENTOS_DESDE, (0, 0))
+                with self._cond:
+                    self.ultimo_id = max(self.ultimo_id, filas[0]['ultimo'] or 0)
+                return
+            filas = ejecutar_query(QUERY_EVENTOS_DESDE, (desde_con_margen(self.ultimo_id), self._max_buffer + 1))
+            eventos = [evento_de_fila(fila) for fila in filas if fila['id'] is not None]
+            if len(eventos) > self._max_buffer:
+                with self._cond:
+                    self.ultimo_id = max(self.ultimo_id, filas[0]['ultimo'] or 0)
+                self.reiniciar()
+            else:
+                self.agregar(eventos)
+        except Exception as e:
+            print(f"No se pudieron recuperar los eventos perdidos: {e}")
+            self.reiniciar()
+
+
+def crear_difusor_eventos():
+    return DifusorEventos(EVENTOS_CONFIG['buffer'])
+
+difusor_eventos = crear_difusor_eventos()
+
+
+def credencial_stream(headers, args):
+    """
+    ('token', token) de Authorization: Bearer, o ('ticket', ticket) de
+    ?ticket= (EventSource no envía encabezados). (None, None) sin ninguno.
+    El token de la sesión nunca viaja en la URL.
+    """
+    auth = headers.get('Authorization', '')
+    if auth.startswith("Bearer "):
+        return 'token', auth.split(" ")[1]
+    if args.get('ticket'):
+        return 'ticket', args.get('ticket')
+    return None, None
+
+
+def usuario_por_ticket(ticket):
+    """Usuario del ticket (que queda usado) o None si no existe o venció"""
+    with db_pool.conexion() as conn:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(QUERY_CANJEAR_TICKET_STREAM, (ticket,))
+        user = cursor.fetchone()
+        conn.commit()
+    return dict(user) if user else None
+
+
+def leer_ultimo_evento(headers, args):
+    """
+    Último evento que tiene el cliente: Last-Event-ID (reconexión de
+    EventSource) o ?ultimo_id= (primera conexión de una página que ya tenía
+    datos). None si no envió ninguno.
+    """
+    valor = headers.get('Last-Event-ID') or args.get('ultimo_id')
+    if not valor:
+        return None
+    try:
+        ultimo_id = int(valor)
+    except ValueError:
+        raise ParametroInvalidoError("Last-Event-ID debe ser un número entero")
+    if ultimo_id < 0:
+        raise ParametroInvalidoError("Last-Event-ID no puede ser negativo")
+    return ultimo_id
+
+
+def flujo_eventos(difusor, posicion, textos, omitir):
+    """
+    Cuerpo de /api/stream en Flask: lo reenviado al reanudar y luego los
+    eventos del búfer a medida que llegan. Cada cliente ocupa un hilo que
+    pasa casi todo el tiempo dormido en la Condition del difusor.
+    """
+    yield f"retry: {EVENTOS_CONFIG['reintento_ms']}\n\n"
+    if textos:
+        yield ''.join(textos)
+    while not difusor.cerrado:
+        textos, posicion = difusor.siguientes(posicion, omitir)
+        if textos:
+            yield ''.join(textos)
+        elif not difusor.esperar(posicion, EVENTOS_CONFIG['latido']):
+            yield ": latido\n\n"
+
+
+@rutas.route('/api/stream', methods=['GET'])
+def stream_eventos():
+    """
+    Eventos de cambio en vivo (text/event-stream): equipo (alta o columnas
+    que cambiaron), equipo_eliminado, estado, traslado, mantenimiento,
+    responsable_asignado, responsable_liberado y reiniciar. El "id" de cada
+    evento sirve para reanudar con Last-Event-ID o ?ultimo_id=; al reanudar
+    pueden repetirse eventos ya enviados, el cliente los descarta por id.
+    Se abre con
+    Authorization: Bearer o con un ticket de POST /api/stream/ticket.
+    """
+    tipo, credencial = credencial_stream(request.headers, request.args)
+    if not credencial:
+        return jsonify({"error": "No autorizado"}), 401
+    try:
+        if tipo == 'token':
+            user = usuario_por_token(credencial)
+        else:
+            user = usuario_por_ticket(credencial)
+    except Exception as e:
+        print("AUTH ERROR:", e)
+        user = None
+    if user is None:
+        return jsonify({"error": "Token inválido"}), 401
+
+    try:
+        ultimo_id = leer_ultimo_evento(request.headers, request.args)
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # La posición se toma con la escucha activa y antes de leer lo perdido:
+    # lo que llegue mientras tanto sale del búfer (sin repetir los ids ya
+    # reenviados)
+    difusor = difusor_eventos
+    if not difusor.esperar_escucha(EVENTOS_CONFIG['espera_escucha']):
+        return jsonify({"error": "Eventos en vivo no disponibles"}), 503
+    posicion = difusor.posicion_actual()
+    textos, omitir = [], set()
+    if ultimo_id is not None:
+        try:
+            filas = ejecutar_query(QUERY_EVENTOS_DESDE, parametros_repeticion(ultimo_id))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        textos, omitir = repeticion_eventos(filas, ultimo_id)
+
+    return Response(
+        flujo_eventos(difusor, posicion, textos, omitir),
+        mimetype='text/event-stream',
+        headers=CABECERAS_SSE
+    )
+
+
+@rutas.route('/api/stream/ticket', methods=['POST'])
+@require_auth
+def ticket_stream():
+    """
+    Ticket de un solo uso para abrir /api/stream?ticket= desde EventSource.
+    Vence a los EVENTOS_TICKET_SEGUNDOS; al reconectar se pide otro.
+    """
+    ticket = str(uuid.uuid4())
+    token = request.headers['Authorization'].split(" ")[1]
+    try:
+        ejecutar_query(QUERY_CREAR_TICKET_STREAM, (ticket, token, EVENTOS_CONFIG['ticket_segundos']), commit=True)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"ticket": ticket, "vence_en": EVENTOS_CONFIG['ticket_segundos']}), 200
+
+# =====================================================
+# ENDPOINTS - AUTENTICACIÓN
+# =====================================================
+QUERY_LOGIN = """
+    SELECT u.Cedula_Usuario, u.Nombre_Usuario, r.Nombre_Rol, r.Id_Rol
+    FROM Usuarios u
+    JOIN Roles r ON u.fk_Id_Rol = r.Id_Rol
+    WHERE u.Cedula_Usuario = %s
+    AND u.Password_Usuario = %s
+    AND u.Estado_Usuario = TRUE
+"""
+QUERY_GUARDAR_TOKEN = "UPDATE Usuarios SET Token = %s WHERE Cedula_Usuario = %s"
+
+@rutas.route('/api/login', methods=['POST'])
+def login():
+    try:
+        data = request.get_json()
+        print("ingreso al login")
+        if not data:
+            return jsonify({"error": "No se enviaron datos"}), 400
+
+        cedula = data.get('cedula')
+        password = data.get('password')
+
+        if not cedula or not password:
+            return jsonify({"error": "Cédula y contraseña obligatorias"}), 400
+
+        user = ejecutar_query(QUERY_LOGIN, (cedula, password), fetchone=True)
+
+        if not user:
+            return jsonify({"error": "Credenciales inválidas"}), 401
+
+        token = str(uuid.uuid4())
+
+        ejecutar_query(QUERY_GUARDAR_TOKEN, (token, cedula), commit=True)
+        # El token anterior deja de ser válido
+        invalidar_usuario_cache(cedula)
+
         user_dict = {
             "cedula_usuario": user['cedula_usuario'],
             "nombre_usuario": user['nombre_usuario'],
@@ -201,139 +1966,829 @@ def login():
         traceback.print_exc()
         return jsonify({"error": "Error interno del servidor"}), 500
 
+# =====================================================
+# BÚSQUEDA POR SUBCADENA (pg_trgm)
+# =====================================================
+# Los filtros "busqueda" usan LOWER(col) LIKE '%texto%'. Cada expresión
+# LOWER(col) tiene un índice GIN gin_trgm_ops (migraciones/0005), así que
+# PostgreSQL los resuelve con un Bitmap Index Scan en vez de recorrer la tabla.
+CAMPOS_BUSQUEDA_EQUIPOS = ('Nombre_Equipo', 'Ip_Equipo', 'Placa_Torre')
+CAMPOS_BUSQUEDA_GLOBAL = ('Nombre_Equipo', 'Ip_Equipo', 'Placa_Torre', 'Placa_Monitor', 'Serial_Equipo')
+
+def patron_busqueda(texto):
+    """Patrón '%texto%' en minúsculas, escapando los comodines de LIKE"""
+    texto = texto.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{texto}%'
+
+def condicion_busqueda_equipos(texto, campos=CAMPOS_BUSQUEDA_EQUIPOS):
+    """Condición OR sobre columnas de Equipos. Retorna (sql, params)"""
+    patron = patron_busqueda(texto)
+    sql = " OR ".join(f"LOWER({campo}) LIKE %s" for campo in campos)
+    return f"({sql})", [patron] * len(campos)
+
+def condicion_equipo_buscado(columna_fk, texto):
+    """
+    Filtro para tablas de historial: en lugar de un OR entre columnas de dos
+    tablas (que obliga a un recorrido secuencial del JOIN), se buscan primero
+    los equipos por nombre o IP usando los índices trigram y luego sus filas
+    de historial por la llave foránea. Retorna (sql, params).
+    """
+    sql, params = condicion_busqueda_equipos(texto, ('Nombre_Equipo', 'Ip_Equipo'))
+    return f"{columna_fk} IN (SELECT Nombre_Equipo FROM Equipos WHERE {sql})", params
+
+
+# =====================================================
+# HISTORIAL ARCHIVADO (?archivo=1)
+# =====================================================
+# archivar_historial.py saca los meses viejos del historial particionado a
+# archivos .csv.gz registrados en Historial_Archivado. Con ?archivo=1 los
+# listados y reportes de historial también los leen: los meses que tocan
+# la consulta se cargan en una tabla temporal de la transacción. Cada mes
+# se descomprime entero, así que se exige una ventana de fechas
+# (fecha_inicio) y como mucho HISTORIAL_ARCHIVO_MAX_MESES meses.
+HISTORIAL_ARCHIVO_DIR = os.getenv(
+    'HISTORIAL_ARCHIVO_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archivo_historial')
+)
+HISTORIAL_ARCHIVO_MAX_MESES = int(os.getenv('HISTORIAL_ARCHIVO_MAX_MESES', 12))
+
+QUERY_ARCHIVOS_HISTORIAL = """
+    SELECT Archivo, Columnas
+    FROM Historial_Archivado
+    WHERE Tabla = %s
+      AND (%s::timestamp IS NULL OR Hasta > %s::timestamp)
+      AND (%s::timestamp IS NULL OR Desde <= %s::timestamp)
+    ORDER BY Desde
+"""
+
+
+def pide_archivo(args):
+    return args.get('archivo', '').lower() in ('1', 'true', 'si', 'sí')
+
+
+def cargar_archivo(conn, tabla, desde, hasta=None, equipo=None):
+    """
+    Cargar los meses archivados de `tabla` entre `desde` y `hasta` (y solo
+    las filas de `equipo`, si se indica) en una tabla temporal. Retorna la
+    relación de la que deben leer las consultas: la tabla sola si no hay
+    meses archivados en el rango, o la unión de ambas.
+    """
+    if desde is None:
+        raise ParametroInvalidoError(
+            "Con archivo=1 indique fecha_inicio (y fecha_fin): solo se cargan los meses archivados de ese rango"
+        )
+    cursor = conn.cursor()
+    cursor.execute(QUERY_ARCHIVOS_HISTORIAL, (tabla, desde, desde, hasta, hasta))
+    archivos = cursor.fetchall()
+    if not archivos:
+        return tabla
+    if len(archivos) > HISTORIAL_ARCHIVO_MAX_MESES:
+        raise ParametroInvalidoError(
+            f"El rango incluye {len(archivos)} meses archivados; "
+            f"con archivo=1 se admiten hasta {HISTORIAL_ARCHIVO_MAX_MESES}"
+        )
+
+    temporal = f"{tabla}_archivo"
+    cursor.execute(f"CREATE TEMP TABLE {temporal} (LIKE {tabla}) ON COMMIT DROP")
+    filtro = cursor.mogrify(" WHERE fk_equipo_id = %s", (equipo,)).decode() if equipo else ""
+    for archivo, columnas in archivos:
+        nombres = ", ".join(c['nombre'] for c in columnas)
+        with gzip.open(os.path.join(HISTORIAL_ARCHIVO_DIR, archivo), 'rb') as entrada:
+            cursor.copy_expert(
+                f"COPY {temporal} ({nombres}) FROM STDIN WITH (FORMAT csv, HEADER, NULL '\\N'){filtro}", entrada
+            )
+    return f"(SELECT * FROM {tabla} UNION ALL SELECT * FROM {temporal})"
+
+
+def ventana_archivo(args):
+    """(desde, hasta) de ?fecha_inicio=&fecha_fin= para los listados por equipo"""
+    return leer_fecha(args, 'fecha_inicio'), leer_fecha(args, 'fecha_fin', fin=True)
+
+
+def ejecutar_query_historial(armar, tabla, desde=None, hasta=None, equipo=None):
+    """
+    ejecutar_query de los listados de historial. armar(fuente) retorna
+    (query, params) leyendo el historial desde `fuente`: la tabla, o con
+    ?archivo=1 la unión con los meses archivados de [desde, hasta).
+    """
+    if tabla is None or not pide_archivo(request.args):
+        return ejecutar_query(*armar(tabla))
+    with db_pool.conexion() as conn:
+        query, params = armar(cargar_archivo(conn, tabla, desde, hasta, equipo))
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(query, params or ())
+        return cursor.fetchall()
+
+# =====================================================
+# FILTROS Y PAGINACIÓN DE EQUIPOS
+# =====================================================
+# Claves de orden permitidas: expresión SQL y tipo para el valor del cursor.
+# Las columnas que admiten NULL se ordenan por COALESCE para que la
+# comparación por filas (keyset) sea válida; cada expresión tiene su índice
+# compuesto con Nombre_Equipo (migraciones/0004).
+ORDENES_EQUIPOS = {
+    'nombre': ("Nombre_Equipo", "text"),
+    'unidad': ("Unidad_Actual", "text"),
+    'estado': ("Estado_Equipo", "text"),
+    'tipo': ("COALESCE(Tipo_Equipo, '')", "text"),
+    'area': ("COALESCE(Tipo_Area, '')", "text"),
+    'fecha': ("COALESCE(Fecha_actualizacion_equipo, 'epoch'::timestamp)", "timestamp")
+}
+
+LIMITE_PAGINA_DEFECTO = 100
+LIMITE_PAGINA_MAXIMO = 1000
+
+class ParametroInvalidoError(ValueError):
+    """Parámetro de consulta inválido (se responde con 400)"""
+
+
+def construir_filtros_equipos(args):
+    """
+    Construir el WHERE de Equipos a partir de los filtros de listar_equipos
+    (unidad, estado, tipo, area, busqueda). Retorna (sql, params).
+    """
+    condiciones = []
+    params = []
+
+    # FILTRO 1: Unidad
+    if args.get('unidad'):
+        condiciones.append("Unidad_Actual = %s")
+        params.append(args.get('unidad'))
+
+    # FILTRO 2: Estado
+    if args.get('estado'):
+        condiciones.append("Estado_Equipo = %s")
+        params.append(args.get('estado'))
+
+    # FILTRO 3: Tipo de Equipo
+    if args.get('tipo'):
+        condiciones.append("Tipo_Equipo = %s")
+        params.append(args.get('tipo'))
+
+    # FILTRO 4: Área
+    if args.get('area'):
+        condiciones.append("Tipo_Area = %s")
+        params.append(args.get('area'))
+
+    # FILTRO 5: Búsqueda por Nombre, IP o Placa (índices trigram)
+    if args.get('busqueda'):
+        sql, params_busqueda = condicion_busqueda_equipos(args.get('busqueda'))
+        condiciones.append(sql)
+        params.extend(params_busqueda)
+
+    sql = " AND ".join(condiciones) if condiciones else "TRUE"
+    return sql, params
+
+
+FILTROS_EQUIPOS = ('unidad', 'estado', 'tipo', 'area', 'busqueda')
+
+
+def filtro_equipos_lote(data):
+    """
+    WHERE de Equipos para las operaciones en lote: la lista `equipos`
+    (nombres) y/o los filtros de listar_equipos. Sin ninguno se rechaza,
+    para que un cuerpo incompleto no toque todo el inventario.
+    Retorna (sql, params).
+    """
+    # En el cuerpo JSON los filtros pueden llegar con cualquier tipo: un
+    # número o una lista no se comparan con la columna de texto
+    for filtro in FILTROS_EQUIPOS:
+        valor = data.get(filtro)
+        if valor is not None and not isinstance(valor, str):
+            raise ParametroInvalidoError(f"{filtro} debe ser texto")
+    sql, params = construir_filtros_equipos(data)
+    equipos = data.get('equipos')
+    if equipos is not None:
+        if (not isinstance(equipos, list) or not equipos
+                or not all(isinstance(nombre, str) and nombre for nombre in equipos)):
+            raise ParametroInvalidoError("equipos debe ser una lista de nombres de equipo")
+        sql = f"{sql} AND Nombre_Equipo = ANY(%s)" if params else "Nombre_Equipo = ANY(%s)"
+        params.append(list(dict.fromkeys(equipos)))
+    if not params:
+        raise ParametroInvalidoError("Indique equipos o al menos un filtro (unidad, estado, tipo, area, busqueda)")
+    return sql, params
+
+
+# Columnas de Equipos que se pueden pedir con ?fields= (en el orden de la tabla)
+COLUMNAS_EQUIPOS = [
+    'Nombre_Equipo', 'Marca_Equipo', 'Tipo_Equipo', 'Tipo_Area', 'Unidad_Actual',
+    'Procesador_Equipo', 'Ram_Equipo', 'Tipo_Ram', 'Disco_Equipo', 'Sistema_Operativo',
+    'Ip_Equipo', 'Observaciones', 'Arquitectura_Equipo', 'Placa_Torre', 'Placa_Monitor',
+    'Office', 'Version_Office', 'Mac_Equipo', 'Licencia_Windows_Equipo', 'Serial_Equipo',
+    'Antivirus_Equipo', 'Modelo_Equipo', 'Estado_Equipo', 'Fecha_actualizacion_equipo',
+    'Huella_Equipo', 'Fecha_Ultimo_Reporte'
+]
+COLUMNAS_EQUIPOS_POR_CAMPO = {c.lower(): c for c in COLUMNAS_EQUIPOS}
+
+# Hoja de vida: los mantenimientos (más recientes primero) se arman al leer
+# desde Historial_Mantenimiento, seguidos de la observación propia del equipo.
+# Es el mismo texto que antes se reescribía en Equipos.Observaciones.
+SQL_HOJA_DE_VIDA = """
+    CASE WHEN hv.texto IS NULL THEN Equipos.Observaciones
+         ELSE concat_ws(E'\\n\\n', hv.texto, NULLIF(btrim(Equipos.Observaciones), ''))
+    END
+"""
+SQL_TEXTO_HOJA_DE_VIDA = """
+    string_agg(
+        concat('Mantenimiento (', m.Tipo_Mantenimiento, ' - ',
+               to_char(m.Fecha_Mantenimiento, 'DD/MM/YYYY'), '): ',
+               m.Descripcion_Mantenimiento),
+        E'\\n\\n' ORDER BY m.Fecha_Mantenimiento DESC, m.Id_Mantenimiento DESC
+    )
+"""
+# Una subconsulta por equipo: barata cuando un filtro, una página o un solo
+# equipo acotan las filas
+SQL_JOIN_HOJA_DE_VIDA = f"""
+    LEFT JOIN LATERAL (
+        SELECT {SQL_TEXTO_HOJA_DE_VIDA} AS texto
+        FROM Historial_Mantenimiento m
+        WHERE m.fk_equipo_id = Equipos.Nombre_Equipo
+    ) hv ON TRUE
+"""
+# Todo Equipos: el historial se agrega una sola vez (GROUP BY) y se une por
+# hash. Con 2000 equipos es menos de la mitad que la subconsulta por fila
+SQL_JOIN_HOJA_DE_VIDA_AGRUPADA = f"""
+    LEFT JOIN (
+        SELECT m.fk_equipo_id, {SQL_TEXTO_HOJA_DE_VIDA} AS texto
+        FROM Historial_Mantenimiento m
+        GROUP BY m.fk_equipo_id
+    ) hv ON hv.fk_equipo_id = Equipos.Nombre_Equipo
+"""
+
+# Vistas predefinidas; "full" es la fila completa (respuesta de siempre)
+PRESETS_CAMPOS_EQUIPOS = {
+    'summary': ['Nombre_Equipo', 'Marca_Equipo', 'Modelo_Equipo', 'Tipo_Equipo', 'Tipo_Area',
+                'Unidad_Actual', 'Estado_Equipo', 'Ip_Equipo', 'Fecha_actualizacion_equipo'],
+    'hardware': ['Nombre_Equipo', 'Marca_Equipo', 'Modelo_Equipo', 'Tipo_Equipo',
+                 'Procesador_Equipo', 'Ram_Equipo', 'Tipo_Ram', 'Disco_Equipo',
+                 'Arquitectura_Equipo', 'Sistema_Operativo', 'Mac_Equipo', 'Serial_Equipo',
+                 'Placa_Torre', 'Placa_Monitor'],
+    'full': COLUMNAS_EQUIPOS
+}
+
+
+def proyeccion_equipos(args, todos=False):
+    """
+    Traducir ?fields= (columnas y/o presets separados por coma) a la lista
+    de columnas del SELECT y el JOIN que necesite. Nombre_Equipo siempre se
+    incluye porque es la clave del equipo y del cursor. Sin fields se
+    retorna la fila completa. Con todos=True la consulta lee Equipos
+    completo (sin filtro ni página) y la hoja de vida se agrega de una vez.
+    Retorna (columnas_sql, join_sql).
+    """
+    valor = (args.get('fields') or '').strip() or 'full'
+
+    columnas = ['Nombre_Equipo']
+    for campo in valor.split(','):
+        campo = campo.strip().lower()
+        if not campo:
+            continue
+        if campo in PRESETS_CAMPOS_EQUIPOS:
+            nuevas = PRESETS_CAMPOS_EQUIPOS[campo]
+        elif campo in COLUMNAS_EQUIPOS_POR_CAMPO:
+            nuevas = [COLUMNAS_EQUIPOS_POR_CAMPO[campo]]
+        else:
+            raise ParametroInvalidoError(f"Campo no permitido en fields: {campo}")
+        columnas.extend(c for c in nuevas if c not in columnas)
+
+    join = ""
+    if 'Observaciones' in columnas:
+        join = SQL_JOIN_HOJA_DE_VIDA_AGRUPADA if todos else SQL_JOIN_HOJA_DE_VIDA
+    seleccion = [
+        f"{SQL_HOJA_DE_VIDA} AS Observaciones" if c == 'Observaciones' else f"Equipos.{c}"
+        for c in columnas
+    ]
+    return ", ".join(seleccion), join
+
+
+def codificar_cursor(datos):
+    """Cursor opaco para el cliente (JSON en base64 url-safe)"""
+    texto = json.dumps(datos, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, tipos):
+    """
+    Leer un cursor de codificar_cursor. `tipos` son los tipos de cada valor
+    de 'v' (str, int o datetime, que llega como texto ISO y se convierte).
+    Cualquier otra forma es un cursor inválido (400), no un error de SQL.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise ParametroInvalidoError("Cursor inválido")
+
+    valores = datos.get('v') if isinstance(datos, dict) else None
+    if not isinstance(valores, list) or len(valores) != len(tipos):
+        raise ParametroInvalidoError("Cursor inválido")
+    for i, (valor, tipo) in enumerate(zip(valores, tipos)):
+        if tipo is datetime and isinstance(valor, str):
+            try:
+                valores[i] = datetime.fromisoformat(valor)
+            except ValueError:
+                raise ParametroInvalidoError("Cursor inválido")
+        elif tipo is int and (isinstance(valor, bool) or not isinstance(valor, int)):
+            raise ParametroInvalidoError("Cursor inválido")
+        elif tipo is not int and not isinstance(valor, tipo):
+            raise ParametroInvalidoError("Cursor inválido")
+    return datos
+
+
+def leer_limite(args, requerido=False, parametro='limit'):
+    """Leer ?limit= (None si no se envió y no es requerido)"""
+    limite = args.get(parametro)
+    if limite is None:
+        return LIMITE_PAGINA_DEFECTO if requerido else None
+    try:
+        limite = int(limite)
+    except ValueError:
+        raise ParametroInvalidoError(f"{parametro} debe ser un número entero")
+    if limite < 1:
+        raise ParametroInvalidoError(f"{parametro} debe ser mayor que cero")
+    return min(limite, LIMITE_PAGINA_MAXIMO)
+
+
+def estimar_filas(query, params=None):
+    """
+    Número aproximado de filas según las estadísticas del planificador
+    (EXPLAIN sin ejecutar la consulta), en lugar de un COUNT(*)
+    """
+    plan = ejecutar_query("EXPLAIN (FORMAT JSON) " + query, params, fetchone=True, fetchall=False)
+    return filas_del_plan(plan)
+
+
+def filas_del_plan(fila_explain):
+    """Leer "Plan Rows" de la fila que devuelve EXPLAIN (FORMAT JSON)"""
+    plan = fila_explain['QUERY PLAN']
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+# =====================================================
+# REGISTRO DE EQUIPOS (PAYLOAD DEL AGENTE)
+# =====================================================
+# Columna de Equipos -> clave del objeto $datos que arma inventario.ps1
+# (se aceptan alias para compatibilidad con registrar_equipo)
+CAMPOS_EQUIPO_PAYLOAD = [
+    ('Nombre_Equipo', ('Nombre_Equipo',)),
+    ('Marca_Equipo', ('Marca',)),
+    ('Modelo_Equipo', ('Modelo',)),
+    ('Tipo_Equipo', ('Tipo_Equipo',)),
+    ('Tipo_Area', ('Tipo_Area',)),
+    ('Unidad_Actual', ('Unidad',)),
+    ('Procesador_Equipo', ('Procesador',)),
+    ('Ram_Equipo', ('RAM_GB',)),
+    ('Tipo_Ram', ('Tipo_RAM',)),
+    ('Disco_Equipo', ('Discos',)),
+    ('Sistema_Operativo', ('Sistema_Operativo',)),
+    ('Ip_Equipo', ('IP',)),
+    ('Observaciones', ('Observaciones',)),
+    ('Arquitectura_Equipo', ('Arquitectura',)),
+    ('Placa_Torre', ('Placa_Equipo',)),
+    ('Placa_Monitor', ('Placa_Pantalla',)),
+    ('Office', ('Office',)),
+    ('Version_Office', ('Version_Office',)),
+    ('Mac_Equipo', ('MAC',)),
+    ('Licencia_Windows_Equipo', ('Licencia_Windows',)),
+    ('Serial_Equipo', ('Serial', 'Serial_PC')),
+    ('Antivirus_Equipo', ('Antivirus',))
+]
+COLUMNAS_EQUIPO_PAYLOAD = [columna for columna, _ in CAMPOS_EQUIPO_PAYLOAD]
+
+# Columnas que se sobrescriben cuando el equipo ya existe (las mismas de
+# registrar_equipo; placas y serial solo se guardan al crear el equipo)
+COLUMNAS_EQUIPO_ACTUALIZABLES = [
+    'Marca_Equipo', 'Modelo_Equipo', 'Tipo_Equipo', 'Tipo_Area', 'Unidad_Actual',
+    'Procesador_Equipo', 'Ram_Equipo', 'Tipo_Ram', 'Disco_Equipo', 'Sistema_Operativo',
+    'Ip_Equipo', 'Observaciones', 'Arquitectura_Equipo', 'Office', 'Version_Office',
+    'Mac_Equipo', 'Licencia_Windows_Equipo', 'Antivirus_Equipo'
+]
+
+# Longitud máxima de las columnas varchar de Equipos (InventarioDB.sql)
+LONGITUD_COLUMNAS_EQUIPO = {
+    'Nombre_Equipo': 30, 'Marca_Equipo': 100, 'Modelo_Equipo': 50, 'Tipo_Equipo': 50,
+    'Tipo_Area': 50, 'Unidad_Actual': 50, 'Procesador_Equipo': 50, 'Tipo_Ram': 20,
+    'Disco_Equipo': 100, 'Sistema_Operativo': 50, 'Ip_Equipo': 50, 'Arquitectura_Equipo': 20,
+    'Placa_Torre': 50, 'Placa_Monitor': 50, 'Office': 80, 'Version_Office': 50,
+    'Mac_Equipo': 100, 'Licencia_Windows_Equipo': 100, 'Serial_Equipo': 30, 'Antivirus_Equipo': 50
+}
+
+CARGA_MASIVA_MAX = int(os.getenv('CARGA_MASIVA_MAX', 5000))
+
+def equipo_desde_payload(data):
+    """
+    Convertir el payload del agente en {columna: valor} validado.
+    Lanza ParametroInvalidoError con el motivo del rechazo.
+    """
+    if not isinstance(data, dict):
+        raise ParametroInvalidoError("Cada equipo debe ser un objeto JSON")
+
+    fila = {}
+    for columna, claves in CAMPOS_EQUIPO_PAYLOAD:
+        valor = None
+        for clave in claves:
+            if data.get(clave) is not None:
+                valor = data.get(clave)
+                break
+        fila[columna] = valor
+
+    if not fila['Nombre_Equipo'] or not str(fila['Nombre_Equipo']).strip():
+        raise ParametroInvalidoError("Falta Nombre_Equipo")
+    if not fila['Unidad_Actual']:
+        raise ParametroInvalidoError("Falta Unidad")
+
+    if fila['Ram_Equipo'] not in (None, ''):
+        try:
+            fila['Ram_Equipo'] = int(round(float(fila['Ram_Equipo'])))
+        except (TypeError, ValueError):
+            raise ParametroInvalidoError(f"RAM_GB inválido: {fila['Ram_Equipo']}")
+    else:
+        fila['Ram_Equipo'] = None
+
+    for columna, maximo in LONGITUD_COLUMNAS_EQUIPO.items():
+        if fila[columna] is not None:
+            fila[columna] = str(fila[columna])
+            if len(fila[columna]) > maximo:
+                raise ParametroInvalidoError(f"{columna} supera {maximo} caracteres")
+
+    return fila
+
+
+def leer_lote_equipos():
+    """
+    Leer el cuerpo de /api/equipos/bulk: arreglo JSON, {"equipos": [...]}
+    o NDJSON (un objeto por línea). Retorna [(indice, objeto o error)].
+    """
+    tipo = (request.mimetype or '').lower()
+    if tipo in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+        items = []
+        for indice, linea in enumerate(request.stream):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                items.append((indice, json.loads(linea)))
+            except ValueError as e:
+                items.append((indice, ParametroInvalidoError(f"JSON inválido: {e}")))
+        return items
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('equipos')
+    if not isinstance(data, list):
+        raise ParametroInvalidoError("Se esperaba un arreglo de equipos o NDJSON")
+    return list(enumerate(data))
+
+
+# El trigger trg_huella_equipo calcula Huella_Equipo de la fila propuesta
+# (EXCLUDED) y de la guardada; si coinciden no se reescribe la fila
+ASIGNACIONES_UPSERT = ",\n            ".join(
+    f"{columna} = EXCLUDED.{columna}" for columna in COLUMNAS_EQUIPO_ACTUALIZABLES
+)
+QUERY_UPSERT_EQUIPOS = f"""
+    INSERT INTO Equipos ({', '.join(COLUMNAS_EQUIPO_PAYLOAD)})
+    VALUES %s
+    ON CONFLICT (Nombre_Equipo) DO UPDATE SET
+            {ASIGNACIONES_UPSERT},
+            Fecha_actualizacion_equipo = CURRENT_TIMESTAMP,
+            Fecha_Ultimo_Reporte = CURRENT_TIMESTAMP
+    WHERE Equipos.Huella_Equipo IS DISTINCT FROM EXCLUDED.Huella_Equipo
+    RETURNING Nombre_Equipo, (xmax = 0) AS insertado
+"""
+QUERY_MARCAR_REPORTE = "UPDATE Equipos SET Fecha_Ultimo_Reporte = CURRENT_TIMESTAMP WHERE Nombre_Equipo = ANY(%s)"
+
+
+def valores_upsert(filas):
+    """
+    Filas ordenadas por nombre (dos cargas simultáneas bloquean filas en el
+    mismo orden y no se produce un interbloqueo) como tuplas del INSERT
+    """
+    filas = sorted(filas, key=lambda fila: fila['Nombre_Equipo'])
+    return [tuple(fila[columna] for columna in COLUMNAS_EQUIPO_PAYLOAD) for fila in filas]
+
+
+def acciones_upsert(filas, devueltas):
+    """
+    {Nombre_Equipo: accion} a partir de las filas que devolvió el upsert;
+    las que no volvieron no cambiaron. Retorna (acciones, sin_cambios).
+    """
+    acciones = {
+        nombre: 'registrado' if insertado else 'actualizado'
+        for nombre, insertado in devueltas
+    }
+    sin_cambios = [fila['Nombre_Equipo'] for fila in filas if fila['Nombre_Equipo'] not in acciones]
+    for nombre in sin_cambios:
+        acciones[nombre] = 'sin_cambios'
+    return acciones, sin_cambios
+
+
+def upsert_equipos(cur, filas):
+    """
+    Insertar o actualizar equipos con un solo INSERT ... ON CONFLICT.
+    Si la huella no cambió solo se marca Fecha_Ultimo_Reporte. Retorna
+    {Nombre_Equipo: accion} con accion = 'registrado', 'actualizado' o
+    'sin_cambios'.
+    """
+    devueltas = execute_values(cur, QUERY_UPSERT_EQUIPOS, valores_upsert(filas), page_size=500, fetch=True)
+    acciones, sin_cambios = acciones_upsert(filas, devueltas)
+    if sin_cambios:
+        cur.execute(QUERY_MARCAR_REPORTE, (sin_cambios,))
+    return acciones
+
 # =====================================================
 # ENDPOINTS - EQUIPOS (CON FILTROS COMPLETOS)
 # =====================================================
-@app.route('/api/equipos', methods=['POST'])
+@rutas.route('/api/equipos', methods=['POST'])
 @require_auth
 @require_write_permission  
 def registrar_equipo():
-    """Registrar o actualizar equipo"""
+    """
+    Registrar o actualizar equipo. Si el agente reporta los mismos datos
+    no se reescribe la fila (accion = sin_cambios).
+    """
     try:
-        data = request.json
-        
-        # Verificar si existe
-        query_check = "SELECT Nombre_Equipo FROM Equipos WHERE Nombre_Equipo = %s"
-        existe = ejecutar_query(query_check, (data['Nombre_Equipo'],), fetchone=True, fetchall=False)
-        
-        if existe:
-            # Actualizar
-            query = """
-                UPDATE Equipos SET
-                    Marca_Equipo = %s,
-                    Tipo_Equipo = %s,
-                    Tipo_Area = %s,
-                    Unidad_Actual = %s,
-                    Procesador_Equipo = %s,
-                    Ram_Equipo = %s,
-                    Tipo_Ram = %s,
-                    Disco_Equipo = %s,
-                    Sistema_Operativo = %s,
-                    Ip_Equipo = %s,
-                    Observaciones = %s,
-                    Arquitectura_Equipo = %s,
-                    Office = %s,
-                    Version_Office = %s,
-                    Mac_Equipo = %s,
-                    Licencia_Windows_Equipo = %s,
-                    Antivirus_Equipo = %s,
-                    Modelo_Equipo = %s,
-                    Fecha_actualizacion_equipo = CURRENT_TIMESTAMP
-                WHERE Nombre_Equipo = %s
-            """
-            params = (
-                data.get('Marca'), data.get('Modelo'), data.get('Tipo_Area'),
-                data.get('Unidad'), data.get('Procesador'), data.get('RAM_GB'),
-                data.get('Tipo_RAM'), data.get('Discos'), data.get('Sistema_Operativo'),
-                data.get('IP'), data.get('Observaciones'), data.get('Arquitectura'),
-                data.get('Office'), data.get('Version_Office'), data.get('MAC'),
-                data.get('Licencia_Windows'), data.get('Antivirus'), data.get('Tipo_Equipo'),
-                data['Nombre_Equipo']
-            )
-            ejecutar_query(query, params, commit=True)
-            accion = "actualizado"
-        else:
-            # Insertar
-            query = """
-                INSERT INTO Equipos (
-                    Nombre_Equipo, Marca_Equipo, Tipo_Equipo, Tipo_Area, Unidad_Actual,
-                    Procesador_Equipo, Ram_Equipo, Tipo_Ram, Disco_Equipo, Sistema_Operativo,
-                    Ip_Equipo, Observaciones, Arquitectura_Equipo, Placa_Torre, Placa_Monitor, Office, Version_Office,
-                    Mac_Equipo, Licencia_Windows_Equipo, Serial_Equipo, Antivirus_Equipo, Modelo_Equipo
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            params = (
-                data['Nombre_Equipo'], data.get('Marca'), data.get('Tipo_Equipo'),
-                data.get('Tipo_Area'), data.get('Unidad'), data.get('Procesador'),
-                data.get('RAM_GB'), data.get('Tipo_RAM'), data.get('Discos'),
-                data.get('Sistema_Operativo'), data.get('IP'), data.get('Observaciones'),
-                data.get('Arquitectura'), data.get('Placa_Equipo'), data.get('Placa_Pantalla'), 
-                data.get('Office'), data.get('Version_Office'),
-                data.get('MAC'), data.get('Licencia_Windows'), data.get('Serial'),
-                data.get('Antivirus'), data.get('Modelo')
-            )
-            ejecutar_query(query, params, commit=True)
-            accion = "registrado"
-        
-        return jsonify({"success": True, "mensaje": f"Equipo {accion}"}), 200
+        try:
+            fila = equipo_desde_payload(request.json)
+        except ParametroInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
+
+        with db_pool.conexion() as conn:
+            cur = conn.cursor()
+            accion = upsert_equipos(cur, [fila])[fila['Nombre_Equipo']]
+            conn.commit()
+        if accion != 'sin_cambios':
+            estadisticas_snapshot.invalidar()
+
+        mensaje = "Equipo sin cambios" if accion == 'sin_cambios' else f"Equipo {accion}"
+        return jsonify({"success": True, "mensaje": mensaje, "accion": accion}), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/equipos', methods=['GET'])
+@rutas.route('/api/equipos/bulk', methods=['POST'])
 @require_auth
+@require_write_permission
+def registrar_equipos_lote():
+    """
+    Registrar o actualizar muchos equipos en una sola transacción.
+
+    Acepta un arreglo JSON (o NDJSON) con el mismo payload que envía
+    inventario.ps1 y aplica todo con un INSERT ... ON CONFLICT por páginas.
+    Retorna el resultado de cada elemento: registrado, actualizado,
+    sin_cambios o rechazado.
+    """
+    try:
+        items = leer_lote_equipos()
+        if len(items) > CARGA_MASIVA_MAX:
+            return jsonify({"error": f"El lote supera el máximo de {CARGA_MASIVA_MAX} equipos"}), 413
+
+        resultados = {}
+        validos = {}    # Nombre_Equipo -> (indice, fila)
+        for indice, item in items:
+            try:
+                if isinstance(item, Exception):
+                    raise item
+                fila = equipo_desde_payload(item)
+            except ParametroInvalidoError as e:
+                resultados[indice] = {"indice": indice, "resultado": "rechazado", "error": str(e)}
+                continue
+
+            nombre = fila['Nombre_Equipo']
+            if nombre in validos:
+                # ON CONFLICT no puede tocar la misma fila dos veces: gana el último
+                anterior = validos[nombre][0]
+                resultados[anterior] = {
+                    "indice": anterior, "nombre_equipo": nombre, "resultado": "rechazado",
+                    "error": "Reemplazado por otro registro del mismo equipo en el lote"
+                }
+            validos[nombre] = (indice, fila)
+
+        if validos:
+            with db_pool.conexion() as conn:
+                cur = conn.cursor()
+                acciones = upsert_equipos(cur, [fila for _, fila in validos.values()])
+                conn.commit()
+            if any(accion != 'sin_cambios' for accion in acciones.values()):
+                estadisticas_snapshot.invalidar()
+
+            for nombre, accion in acciones.items():
+                indice = validos[nombre][0]
+                resultados[indice] = {"indice": indice, "nombre_equipo": nombre, "resultado": accion}
+
+        lista = [resultados[i] for i in sorted(resultados)]
+        resumen = {"registrado": 0, "actualizado": 0, "sin_cambios": 0, "rechazado": 0}
+        for r in lista:
+            resumen[r["resultado"]] += 1
+
+        return jsonify({
+            "success": True,
+            "resumen": resumen,
+            "resultados": lista
+        }), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+def consulta_listar_equipos(args):
+    """
+    Armar la consulta de listar_equipos a partir de sus parámetros.
+    Retorna un dict con query y params, y para la paginación por keyset
+    limite, orden, direccion y query_base (para total_aproximado).
+    Sin limit ni cursor, limite es None y se lista todo.
+    """
+    where, params = construir_filtros_equipos(args)
+    cursor = args.get('cursor')
+    limite = leer_limite(args, requerido=bool(cursor))
+    columnas, join = proyeccion_equipos(args, todos=limite is None and not params)
+
+    if limite is None:
+        return {
+            "query": f"SELECT {columnas} FROM Equipos {join} WHERE {where} ORDER BY Nombre_Equipo",
+            "params": tuple(params) if params else None,
+            "limite": None
+        }
+
+    orden = args.get('orden', 'nombre')
+    direccion = args.get('dir', 'asc').lower()
+    if orden not in ORDENES_EQUIPOS:
+        raise ParametroInvalidoError(f"orden debe ser uno de: {', '.join(ORDENES_EQUIPOS)}")
+    if direccion not in ('asc', 'desc'):
+        raise ParametroInvalidoError("dir debe ser asc o desc")
+
+    expresion, tipo_valor = ORDENES_EQUIPOS[orden]
+    comparador = '>' if direccion == 'asc' else '<'
+
+    condiciones_pagina = ""
+    params_pagina = list(params)
+    if cursor:
+        datos_cursor = decodificar_cursor(cursor, (datetime if tipo_valor == 'timestamp' else str, str))
+        if datos_cursor.get('o') != orden or datos_cursor.get('d') != direccion:
+            raise ParametroInvalidoError("El cursor no corresponde al orden solicitado")
+        valor, nombre = datos_cursor['v']
+        if orden == 'nombre':
+            condiciones_pagina = f" AND Nombre_Equipo {comparador} %s"
+            params_pagina.append(nombre)
+        else:
+            condiciones_pagina = f" AND ({expresion}, Nombre_Equipo) {comparador} (%s::{tipo_valor}, %s)"
+            params_pagina.extend([valor, nombre])
+
+    if orden == 'nombre':
+        orden_sql = f"Nombre_Equipo {direccion.upper()}"
+    else:
+        orden_sql = f"{expresion} {direccion.upper()}, Nombre_Equipo {direccion.upper()}"
+
+    # Se pide una fila extra para saber si hay página siguiente
+    query = f"""
+        SELECT {columnas}, {expresion} AS clave_orden FROM Equipos {join}
+        WHERE {where}{condiciones_pagina}
+        ORDER BY {orden_sql}
+        LIMIT %s
+    """
+    params_pagina.append(limite + 1)
+    return {
+        "query": query,
+        "params": tuple(params_pagina),
+        "limite": limite,
+        "orden": orden,
+        "direccion": direccion,
+        "query_base": f"SELECT Nombre_Equipo FROM Equipos WHERE {where}",
+        "params_base": tuple(params) if params else None
+    }
+
+
+def pagina_equipos(filas, consulta):
+    """Respuesta de listar_equipos a partir de las filas de consulta_listar_equipos"""
+    limite = consulta['limite']
+    if limite is None:
+        return {
+            "success": True,
+            "equipos": [dict(e) for e in filas]
+        }
+
+    siguiente_cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente_cursor = codificar_cursor({
+            'o': consulta['orden'],
+            'd': consulta['direccion'],
+            'v': [ultima['clave_orden'], ultima['nombre_equipo']]
+        })
+
+    equipos = []
+    for fila in filas:
+        equipo = dict(fila)
+        equipo.pop('clave_orden', None)
+        equipos.append(equipo)
+
+    return {
+        "success": True,
+        "equipos": equipos,
+        "siguiente_cursor": siguiente_cursor
+    }
+
+
+@rutas.route('/api/equipos', methods=['GET'])
+@require_auth
+@con_etag('equipos', 'historial_mantenimiento')
 def listar_equipos():
-    """Listar equipos con TODOS los filtros implementados"""
+    """
+    Listar equipos con TODOS los filtros implementados.
+
+    Paginación por keyset (opcional): ?limit=N&cursor=<siguiente_cursor>
+    &orden=nombre|unidad|estado|tipo|area|fecha&dir=asc|desc&total=1
+    Sin limit ni cursor se retorna la lista completa, como siempre.
+
+    Columnas (opcional): ?fields=summary|hardware|full o lista de columnas,
+    p. ej. ?fields=nombre_equipo,unidad_actual
+    """
     try:
-        query = "SELECT * FROM Equipos WHERE 1=1"
-        params = []
-        
-        # FILTRO 1: Unidad
-        if request.args.get('unidad'):
-            query += " AND Unidad_Actual = %s"
-            params.append(request.args.get('unidad'))
-        
-        # FILTRO 2: Estado
-        if request.args.get('estado'):
-            query += " AND Estado_Equipo = %s"
-            params.append(request.args.get('estado'))
-        
-        # FILTRO 3: Tipo de Equipo
-        if request.args.get('tipo'):
-            query += " AND Tipo_Equipo = %s"
-            params.append(request.args.get('tipo'))
-        
-        # FILTRO 4: Área (NUEVO - CORREGIDO)
-        if request.args.get('area'):
-            query += " AND Tipo_Area = %s"
-            params.append(request.args.get('area'))
-        
-        # FILTRO 5: Búsqueda por Nombre o IP (NUEVO - CORREGIDO)
-        if request.args.get('busqueda'):
-            busqueda = request.args.get('busqueda')
-            query += " AND (LOWER(Nombre_Equipo) LIKE %s OR LOWER(Ip_Equipo) LIKE %s OR LOWER(Placa_Torre) LIKE %s)"
-            params.append(f'%{busqueda.lower()}%')
-            params.append(f'%{busqueda.lower()}%')
-            params.append(f'%{busqueda.lower()}%')
-        
-        query += " ORDER BY Nombre_Equipo"
-        
-        equipos = ejecutar_query(query, tuple(params) if params else None)
+        consulta = consulta_listar_equipos(request.args)
+        filas = ejecutar_query(consulta['query'], consulta['params'])
+        respuesta = pagina_equipos(filas, consulta)
+
+        if consulta['limite'] is not None and request.args.get('total') in ('1', 'true', 'aprox'):
+            respuesta["total_aproximado"] = estimar_filas(consulta['query_base'], consulta['params_base'])
+
+        return jsonify(respuesta), 200
         
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def consulta_busqueda_global(texto, limite):
+    """Consulta de /api/buscar: retorna (query, params)"""
+    condicion, params = condicion_busqueda_equipos(texto, CAMPOS_BUSQUEDA_GLOBAL)
+    similitudes = ", ".join(f"similarity(LOWER({campo}), %s)" for campo in CAMPOS_BUSQUEDA_GLOBAL)
+    coincidencias = " ".join(
+        f"WHEN LOWER({campo}) LIKE %s THEN '{campo.lower()}'" for campo in CAMPOS_BUSQUEDA_GLOBAL
+    )
+    # Coincidencia exacta primero, luego prefijo y luego similitud trigram
+    query = f"""
+        SELECT Nombre_Equipo, Ip_Equipo, Placa_Torre, Placa_Monitor, Serial_Equipo,
+               Unidad_Actual, Tipo_Equipo, Estado_Equipo,
+               CASE {coincidencias} END AS coincidencia,
+               (CASE
+                    WHEN %s IN (LOWER(Nombre_Equipo), LOWER(Ip_Equipo), LOWER(Placa_Torre),
+                                LOWER(Placa_Monitor), LOWER(Serial_Equipo)) THEN 2
+                    WHEN LOWER(Nombre_Equipo) LIKE %s THEN 1
+                    ELSE 0
+                END + GREATEST({similitudes})) AS relevancia
+        FROM Equipos
+        WHERE {condicion}
+        ORDER BY relevancia DESC, Nombre_Equipo
+        LIMIT %s
+    """
+    texto_min = texto.lower()
+    prefijo = patron_busqueda(texto)[1:]
+    params_query = (
+        params
+        + [texto_min, prefijo]
+        + [texto_min] * len(CAMPOS_BUSQUEDA_GLOBAL)
+        + params
+        + [limite]
+    )
+    return query, tuple(params_query)
+
+
+@rutas.route('/api/buscar', methods=['GET'])
+@require_auth
+def buscar_equipos():
+    """
+    Búsqueda global ordenada por relevancia en nombre, IP, placas y serial.
+    Uso: /api/buscar?q=texto&limit=20
+    """
+    try:
+        texto = (request.args.get('q') or '').strip()
+        if not texto:
+            return jsonify({"error": "Falta el parámetro q"}), 400
+        limite = leer_limite(request.args, requerido=True)
+
+        query, params = consulta_busqueda_global(texto, limite)
+        resultados = ejecutar_query(query, params)
         return jsonify({
             "success": True,
-            "equipos": [dict(e) for e in equipos]
+            "resultados": [dict(r) for r in resultados]
         }), 200
-        
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/equipos/<equipo>', methods=['GET'])
+@rutas.route('/api/equipos/<equipo>', methods=['GET'])
 @require_auth
+@con_etag('equipos', 'historial_mantenimiento')
 def obtener_equipo(equipo):
-    """Obtener información de un equipo"""
+    """Obtener información de un equipo (admite ?fields= como listar_equipos)"""
     try:
-        query = "SELECT * FROM Equipos WHERE Nombre_Equipo = %s"
+        columnas, join = proyeccion_equipos(request.args)
+        query = f"SELECT {columnas} FROM Equipos {join} WHERE Equipos.Nombre_Equipo = %s"
         equipo_data = ejecutar_query(query, (equipo,), fetchone=True, fetchall=False)
         
         if not equipo_data:
@@ -341,10 +2796,154 @@ def obtener_equipo(equipo):
         
         return jsonify(dict(equipo_data)), 200
         
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# =====================================================
+# HOJA DE VIDA COMPLETA (DOSSIER)
+# =====================================================
+# Secciones del dossier: subconsulta correlacionada con Equipos y
+# orden, igual que en los endpoints de historial de cada tabla
+SECCIONES_DOSSIER = {
+    'mantenimientos': """
+        SELECT m.*, u.Nombre_Usuario as tecnico
+        FROM Historial_Mantenimiento m
+        LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
+        WHERE m.fk_equipo_id = Equipos.Nombre_Equipo
+        ORDER BY m.Fecha_Mantenimiento DESC, m.Id_Mantenimiento DESC
+    """,
+    'traslados': """
+        SELECT t.*, u.Nombre_Usuario as tecnico
+        FROM Historial_Traslados t
+        LEFT JOIN Usuarios u ON t.fk_tecnico_id = u.Cedula_Usuario
+        WHERE t.fk_equipo_id = Equipos.Nombre_Equipo
+        ORDER BY t.Fecha DESC, t.Id_Traslado DESC
+    """,
+    'responsables': """
+        SELECT r.*, u.Nombre_Usuario, u.Nombre_Usuario as tecnico
+        FROM Responsables_Equipo r
+        LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
+        WHERE r.fk_equipo_id = Equipos.Nombre_Equipo
+        ORDER BY r.Fecha_Inicio DESC, r.Id_Responsabilidad DESC
+    """,
+    'estados': """
+        SELECT h.*
+        FROM Historial_Estado h
+        WHERE h.fk_equipo_id = Equipos.Nombre_Equipo
+        ORDER BY h.Fecha_Estado DESC, h.Id_Historial DESC
+    """
+}
+
+# Columnas de fecha dentro de las secciones (json_agg las entrega como texto ISO)
+CAMPOS_FECHA_DOSSIER = {'fecha_mantenimiento', 'fecha', 'fecha_inicio', 'fecha_fin', 'fecha_estado'}
+
+DOSSIER_LOTE_MAX = 500
+
+TABLAS_DOSSIER = ('equipos', 'historial_mantenimiento', 'historial_traslados',
+                  'responsables_equipo', 'historial_estado', 'usuarios')
+
+
+def query_dossier(args, where):
+    """
+    Armar la consulta del dossier: columnas del equipo (?fields=) más una
+    columna json_agg por sección, todo en un solo viaje a la base.
+    Límite por sección con ?limit_<seccion>=N o ?limit=N para todas.
+    Retorna (query, params_secciones); los params del WHERE van después.
+    """
+    columnas, join = proyeccion_equipos(args)
+    limite_general = leer_limite(args)
+
+    subconsultas = []
+    params = []
+    for seccion, sql in SECCIONES_DOSSIER.items():
+        limite = leer_limite(args, parametro=f'limit_{seccion}') or limite_general
+        subconsultas.append(
+            f"(SELECT COALESCE(json_agg(s), '[]'::json) FROM ({sql} LIMIT %s) s) AS dossier_{seccion}"
+        )
+        params.append(limite)
+
+    query = f"""
+        SELECT {columnas}, {', '.join(subconsultas)}
+        FROM Equipos {join}
+        WHERE {where}
+        ORDER BY Equipos.Nombre_Equipo
+    """
+    return query, params
+
+
+def fila_a_dossier(fila):
+    """Separar la fila en equipo + secciones y convertir las fechas de las secciones"""
+    equipo = dict(fila)
+    dossier = {}
+    for seccion in SECCIONES_DOSSIER:
+        registros = equipo.pop(f'dossier_{seccion}') or []
+        for registro in registros:
+            for campo in CAMPOS_FECHA_DOSSIER.intersection(registro):
+                if registro[campo]:
+                    registro[campo] = datetime.fromisoformat(registro[campo])
+        dossier[seccion] = registros
+    dossier['equipo'] = equipo
+    return dossier
+
+
+@rutas.route('/api/equipos/<equipo>/dossier', methods=['GET'])
+@require_auth
+@con_etag(*TABLAS_DOSSIER)
+def obtener_dossier(equipo):
+    """
+    Equipo con su historial de mantenimientos, traslados, responsables y
+    estados en una sola consulta. Uso: ?limit=10 o ?limit_mantenimientos=5
+    """
+    try:
+        query, params = query_dossier(request.args, "Equipos.Nombre_Equipo = %s")
+        fila = ejecutar_query(query, tuple(params + [equipo]), fetchone=True, fetchall=False)
+
+        if not fila:
+            return jsonify({"error": "Equipo no encontrado"}), 404
+
+        return jsonify(fila_a_dossier(fila)), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@rutas.route('/api/equipos/dossier', methods=['GET'])
+@require_auth
+@con_etag(*TABLAS_DOSSIER)
+def listar_dossiers():
+    """
+    Dossiers de varios equipos para imprimir en lote: ?equipos=PC1,PC2 o los
+    mismos filtros de listar_equipos (unidad, estado, tipo, area, busqueda).
+    Máximo DOSSIER_LOTE_MAX equipos por solicitud.
+    """
+    try:
+        where, params_where = construir_filtros_equipos(request.args)
+        if request.args.get('equipos'):
+            nombres = [n.strip() for n in request.args.get('equipos').split(',') if n.strip()]
+            where += " AND Equipos.Nombre_Equipo = ANY(%s)"
+            params_where.append(nombres)
+
+        query, params = query_dossier(request.args, where)
+        query += " LIMIT %s"
+        filas = ejecutar_query(query, tuple(params + params_where + [DOSSIER_LOTE_MAX + 1]))
+
+        if len(filas) > DOSSIER_LOTE_MAX:
+            return jsonify({"error": f"Demasiados equipos: máximo {DOSSIER_LOTE_MAX} por solicitud"}), 400
+
+        return jsonify({
+            "success": True,
+            "dossiers": [fila_a_dossier(f) for f in filas]
+        }), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/equipos/<equipo>/estado', methods=['PUT'])
+@rutas.route('/api/equipos/<equipo>/estado', methods=['PUT'])
 @require_auth
 @require_write_permission
 def cambiar_estado(equipo):
@@ -362,23 +2961,26 @@ def cambiar_estado(equipo):
         
         estado_anterior = result['estado_equipo']
         
-        # Establecer rol para triggers
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        if user['nombre_rol'] == 'ADMINISTRADOR':
-            cursor.execute("SET app.rol = 'ADMIN'")
-        else:
-            cursor.execute("SET app.rol = 'TECNICO'")
-        
-        cursor.execute("""
-            UPDATE Equipos 
-            SET Estado_Equipo = %s 
-            WHERE Nombre_Equipo = %s
-        """, (nuevo_estado, equipo))
-        
-        conn.commit()
-        conn.close()
+        # Establecer rol para triggers (SET LOCAL: la conexión vuelve al pool
+        # y el rol no debe quedar fijado para la siguiente petición)
+        with db_pool.conexion() as conn:
+            cursor = conn.cursor()
+            
+            if user['nombre_rol'] == 'ADMINISTRADOR':
+                cursor.execute("SET LOCAL app.rol = 'ADMIN'")
+            else:
+                cursor.execute("SET LOCAL app.rol = 'TECNICO'")
+            
+            cursor.execute("""
+                UPDATE Equipos 
+                SET Estado_Equipo = %s 
+                WHERE Nombre_Equipo = %s
+            """, (nuevo_estado, equipo))
+            actualizado = cursor.rowcount == 1
+            
+            conn.commit()
+        if actualizado:
+            estadisticas_snapshot.ajustar("por_estado", estado_anterior, nuevo_estado)
         
         # Registrar en historial
         query_historial = """
@@ -395,117 +2997,96 @@ def cambiar_estado(equipo):
 # =====================================================
 # ENDPOINTS - MANTENIMIENTOS
 # =====================================================
-@app.route('/api/mantenimientos', methods=['POST'])
+# {historial} es la relación de la que se lee: la tabla, o con ?archivo=1
+# la unión con los meses archivados (ver ejecutar_query_historial)
+QUERY_MANTENIMIENTOS_EQUIPO = """
+    SELECT m.*, u.Nombre_Usuario as tecnico
+    FROM {historial} m
+    LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
+    WHERE m.fk_equipo_id = %s
+    ORDER BY m.Fecha_Mantenimiento DESC
+"""
+QUERY_MANTENIMIENTOS = """
+    SELECT m.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
+    FROM {historial} m
+    LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
+    LEFT JOIN Equipos e ON m.fk_equipo_id = e.Nombre_Equipo
+    WHERE 1=1
+"""
+
+@rutas.route('/api/mantenimientos', methods=['POST'])
 @require_auth
 @require_write_permission
 def registrar_mantenimiento():
-    """Registrar mantenimiento y automatizar observaciones"""
+    """
+    Registrar mantenimiento. La hoja de vida del equipo se arma al leer
+    desde Historial_Mantenimiento, así que basta con insertar la fila.
+    """
     try:
         data = request.json
         equipo = data['equipo']
         tipo = data['tipo']
         descripcion = data['descripcion']
         tecnico_id = request.current_user.get('cedula_usuario') if hasattr(request, 'current_user') else None
-        
-        conn = get_db_connection()
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        try:
-            # 1. Guardar en el historial de mantenimientos
-            query_mant = """
-                INSERT INTO Historial_Mantenimiento (
-                    fk_equipo_id, Tipo_Mantenimiento, Descripcion_Mantenimiento, fk_tecnico_id
-                ) VALUES (%s, %s, %s, %s)
-            """
-            cur.execute(query_mant, (equipo, tipo, descripcion, tecnico_id))
-            
-            # 2. Consultar las observaciones actuales del equipo
-            cur.execute("SELECT Observaciones FROM Equipos WHERE Nombre_Equipo = %s", (equipo,))
-            equipo_actual = cur.fetchone()
-            obs_actuales = equipo_actual['observaciones'] if equipo_actual and equipo_actual['observaciones'] else ""
-            
-            # 3. Construir el nuevo texto para la Hoja de Vida
-            fecha_hoy = datetime.now().strftime("%d/%m/%Y")
-            texto_mantenimiento = f"Mantenimiento ({tipo} - {fecha_hoy}): {descripcion}"
-            
-            # Unir lo nuevo con lo viejo (para no borrar datos anteriores)
-            nueva_obs = f"{texto_mantenimiento}\n\n{obs_actuales}".strip()
-            
-            # 4. Actualizar la tabla Equipos
-            query_update = """
-                UPDATE Equipos 
-                SET Observaciones = %s,
-                    Fecha_actualizacion_equipo = CURRENT_TIMESTAMP
-                WHERE Nombre_Equipo = %s
-            """
-            cur.execute(query_update, (nueva_obs, equipo))
-            
-            conn.commit()
-            return jsonify({"success": True, "mensaje": "Mantenimiento registrado"}), 200
-            
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cur.close()
-            conn.close()
+        
+        query_mant = """
+            INSERT INTO Historial_Mantenimiento (
+                fk_equipo_id, Tipo_Mantenimiento, Descripcion_Mantenimiento, fk_tecnico_id
+            ) VALUES (%s, %s, %s, %s)
+        """
+        ejecutar_query(query_mant, (equipo, tipo, descripcion, tecnico_id), commit=True)
+        
+        return jsonify({"success": True, "mensaje": "Mantenimiento registrado"}), 200
             
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/mantenimientos/<equipo>', methods=['GET'])
+@rutas.route('/api/mantenimientos/<equipo>', methods=['GET'])
 @require_auth
+@con_etag('historial_mantenimiento', 'usuarios')
+@con_cache('historial_mantenimiento', 'usuarios')
 def obtener_mantenimientos(equipo):
     """Obtener historial de mantenimientos de un equipo específico"""
     try:
-        query = """
-            SELECT m.*, u.Nombre_Usuario as tecnico
-            FROM Historial_Mantenimiento m
-            LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
-            WHERE m.fk_equipo_id = %s
-            ORDER BY m.Fecha_Mantenimiento DESC
-        """
-        mantenimientos = ejecutar_query(query, (equipo,))
+        mantenimientos = ejecutar_query_historial(
+            lambda fuente: (QUERY_MANTENIMIENTOS_EQUIPO.format(historial=fuente), (equipo,)),
+            'historial_mantenimiento', *ventana_archivo(request.args), equipo=equipo
+        )
         return jsonify([dict(m) for m in mantenimientos]), 200
         
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/mantenimientos', methods=['GET'])
+@rutas.route('/api/mantenimientos', methods=['GET'])
 @require_auth
+@con_etag('historial_mantenimiento', 'usuarios', 'equipos')
 def listar_todos_mantenimientos():
-    """Listar TODOS los mantenimientos (OPTIMIZADO CON BÚSQUEDA)"""
-    try:
-        query = """
-            SELECT m.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
-            FROM Historial_Mantenimiento m
-            LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
-            LEFT JOIN Equipos e ON m.fk_equipo_id = e.Nombre_Equipo
-            WHERE 1=1
-        """
-        params = []
-        
-        # FILTRO: Búsqueda por equipo
-        if request.args.get('busqueda'):
-            busqueda = request.args.get('busqueda')
-            query += " AND (LOWER(m.fk_equipo_id) LIKE %s OR LOWER(e.Ip_Equipo) LIKE %s)"
-            params.append(f'%{busqueda.lower()}%')
-            params.append(f'%{busqueda.lower()}%')
-        
-        query += " ORDER BY m.Fecha_Mantenimiento DESC"
-        
-        mantenimientos = ejecutar_query(query, tuple(params) if params else None)
-        return jsonify([dict(m) for m in mantenimientos]), 200
-        
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """Listar mantenimientos (filtros y paginación: ver listar_reporte_historial)"""
+    return listar_reporte_historial('mantenimientos')
 
 # =====================================================
 # ENDPOINTS - TRASLADOS
 # =====================================================
-@app.route('/api/traslados', methods=['POST'])
+QUERY_TRASLADOS_EQUIPO = """
+    SELECT t.*, u.Nombre_Usuario as tecnico
+    FROM {historial} t
+    LEFT JOIN Usuarios u ON t.fk_tecnico_id = u.Cedula_Usuario
+    WHERE t.fk_equipo_id = %s
+    ORDER BY t.Fecha DESC
+"""
+QUERY_TRASLADOS = """
+    SELECT t.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
+    FROM {historial} t
+    LEFT JOIN Usuarios u ON t.fk_tecnico_id = u.Cedula_Usuario
+    LEFT JOIN Equipos e ON t.fk_equipo_id = e.Nombre_Equipo
+    WHERE 1=1
+"""
+
+@rutas.route('/api/traslados', methods=['POST'])
 @require_auth
 @require_write_permission
 def registrar_traslado():
@@ -518,71 +3099,156 @@ def registrar_traslado():
                 fk_equipo_id, Sede_Origen, Sede_Destino, Observacion, fk_tecnico_id
             ) VALUES (%s, %s, %s, %s, %s)
         """
-        ejecutar_query(query, (
-            data['equipo'], data['origen'], data['destino'], 
-            data.get('observacion'), request.current_user.get('cedula_usuario') if hasattr(request, 'current_user') else None
-        ), commit=True)
-        
         # Actualizar unidad actual del equipo
         query_update = "UPDATE Equipos SET Unidad_Actual = %s WHERE Nombre_Equipo = %s"
-        ejecutar_query(query_update, (data['destino'], data['equipo']), commit=True)
+
+        # Historial y unidad actual en la misma transacción: o quedan los dos o ninguno
+        with db_pool.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(query, (
+                data['equipo'], data['origen'], data['destino'],
+                data.get('observacion'), request.current_user.get('cedula_usuario') if hasattr(request, 'current_user') else None
+            ))
+            cur.execute(query_update, (data['destino'], data['equipo']))
+            conn.commit()
+        estadisticas_snapshot.invalidar()
         
         return jsonify({"success": True, "mensaje": "Traslado registrado"}), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/traslados/<equipo>', methods=['GET'])
+
+# Traslado en lote en una sola sentencia: `previos` bloquea las filas y toma
+# la unidad actual como origen, el UPDATE mueve los equipos y el INSERT
+# registra el historial con lo que devolvió el UPDATE. Los equipos que ya
+# están en el destino no se tocan. Las filas se bloquean en orden de nombre
+# (ver QUERY_BLOQUEAR_EQUIPOS_LOTE).
+QUERY_TRASLADAR_LOTE = """
+    WITH previos AS MATERIALIZED (
+        SELECT Nombre_Equipo, Unidad_Actual AS Origen
+        FROM Equipos
+        WHERE {filtro} AND Unidad_Actual <> %s
+        ORDER BY Nombre_Equipo
+        FOR NO KEY UPDATE
+    ), movidos AS (
+        UPDATE Equipos
+        SET Unidad_Actual = %s
+        FROM previos
+        WHERE Equipos.Nombre_Equipo = previos.Nombre_Equipo
+        RETURNING Equipos.Nombre_Equipo, previos.Origen
+    )
+    INSERT INTO Historial_Traslados (fk_equipo_id, Sede_Origen, Sede_Destino, Observacion, fk_tecnico_id)
+    SELECT Nombre_Equipo, Origen, %s, %s, %s
+    FROM movidos
+    ORDER BY Nombre_Equipo
+    RETURNING fk_equipo_id, Sede_Origen
+"""
+
+# Longitud de Equipos.Unidad_Actual (InventarioDB.sql)
+LARGO_UNIDAD = 50
+
+
+@rutas.route('/api/traslados/lote', methods=['POST'])
 @require_auth
-def obtener_traslados(equipo):
-    """Obtener historial de traslados de un equipo específico"""
+@require_write_permission
+def registrar_traslado_lote():
+    """
+    Trasladar a `destino` los equipos de una lista (equipos) o que cumplan
+    los filtros de listar_equipos (unidad, estado, tipo, area, busqueda).
+    El origen de cada traslado es la unidad actual del equipo.
+    """
     try:
-        query = """
-            SELECT t.*, u.Nombre_Usuario as tecnico
-            FROM Historial_Traslados t
-            LEFT JOIN Usuarios u ON t.fk_tecnico_id = u.Cedula_Usuario
-            WHERE t.fk_equipo_id = %s
-            ORDER BY t.Fecha DESC
-        """
-        traslados = ejecutar_query(query, (equipo,))
-        return jsonify([dict(t) for t in traslados]), 200
-        
+        data = request.json or {}
+        destino = data.get('destino')
+        if not isinstance(destino, str) or not destino.strip():
+            return jsonify({"error": "Falta la unidad de destino"}), 400
+        destino = destino.strip()
+        if len(destino) > LARGO_UNIDAD:
+            return jsonify({"error": f"destino supera {LARGO_UNIDAD} caracteres"}), 400
+
+        try:
+            filtro, params = filtro_equipos_lote(data)
+        except ParametroInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
+
+        tecnico = request.current_user.get('cedula_usuario')
+        with db_pool.conexion() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(
+                QUERY_TRASLADAR_LOTE.format(filtro=filtro),
+                params + [destino, destino, destino, data.get('observacion'), tecnico]
+            )
+            filas = cur.fetchall()
+            conn.commit()
+        if filas:
+            estadisticas_snapshot.invalidar()
+
+        respuesta = {
+            "success": True,
+            "mensaje": f"Se trasladaron {len(filas)} equipos a {destino}.",
+            "traslados": [{"equipo": f['fk_equipo_id'], "origen": f['sede_origen']} for f in filas]
+        }
+        if data.get('equipos'):
+            movidos = {f['fk_equipo_id'] for f in filas}
+            # No existen, no cumplen los filtros o ya estaban en el destino
+            respuesta["sin_mover"] = sorted(set(data['equipos']) - movidos)
+        return jsonify(respuesta), 200
+
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/traslados', methods=['GET'])
+@rutas.route('/api/traslados/<equipo>', methods=['GET'])
 @require_auth
-def listar_todos_traslados():
-    """Listar TODOS los traslados (OPTIMIZADO CON BÚSQUEDA)"""
+@con_etag('historial_traslados', 'usuarios')
+@con_cache('historial_traslados', 'usuarios')
+def obtener_traslados(equipo):
+    """Obtener historial de traslados de un equipo específico"""
     try:
-        query = """
-            SELECT t.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
-            FROM Historial_Traslados t
-            LEFT JOIN Usuarios u ON t.fk_tecnico_id = u.Cedula_Usuario
-            LEFT JOIN Equipos e ON t.fk_equipo_id = e.Nombre_Equipo
-            WHERE 1=1
-        """
-        params = []
-        
-        # FILTRO: Búsqueda por equipo
-        if request.args.get('busqueda'):
-            busqueda = request.args.get('busqueda')
-            query += " AND (LOWER(t.fk_equipo_id) LIKE %s OR LOWER(e.Ip_Equipo) LIKE %s)"
-            params.append(f'%{busqueda.lower()}%')
-            params.append(f'%{busqueda.lower()}%')
-        
-        query += " ORDER BY t.Fecha DESC"
-        
-        traslados = ejecutar_query(query, tuple(params) if params else None)
+        traslados = ejecutar_query_historial(
+            lambda fuente: (QUERY_TRASLADOS_EQUIPO.format(historial=fuente), (equipo,)),
+            'historial_traslados', *ventana_archivo(request.args), equipo=equipo
+        )
         return jsonify([dict(t) for t in traslados]), 200
         
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@rutas.route('/api/traslados', methods=['GET'])
+@require_auth
+@con_etag('historial_traslados', 'usuarios', 'equipos')
+def listar_todos_traslados():
+    """Listar traslados (filtros y paginación: ver listar_reporte_historial)"""
+    return listar_reporte_historial('traslados')
+
 # =====================================================
 # ENDPOINTS - RESPONSABLES (OPTIMIZADO Y COMPLETO)
 # =====================================================
-@app.route('/api/responsables', methods=['POST'])
+QUERY_RESPONSABLES_EQUIPO = """
+    SELECT r.*, u.Nombre_Usuario as tecnico
+    FROM Responsables_Equipo r
+    LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
+    WHERE r.fk_equipo_id = %s
+    ORDER BY r.Fecha_Inicio DESC
+"""
+QUERY_HISTORIAL_RESPONSABLE = """
+    SELECT r.*, u.Nombre_Usuario
+    FROM Responsables_Equipo r
+    LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
+    WHERE fk_equipo_id = %s
+    ORDER BY Fecha_Inicio DESC
+"""
+QUERY_RESPONSABLES = """
+    SELECT r.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
+    FROM Responsables_Equipo r
+    LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
+    LEFT JOIN Equipos e ON r.fk_equipo_id = e.Nombre_Equipo
+    WHERE 1=1
+"""
+
+@rutas.route('/api/responsables', methods=['POST'])
 @require_auth
 @require_write_permission
 def asignar_responsable():
@@ -621,7 +3287,7 @@ def asignar_responsable():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/responsables/<equipo>', methods=['PUT'])
+@rutas.route('/api/responsables/<equipo>', methods=['PUT'])
 @require_auth
 @require_write_permission
 def liberar_responsable(equipo):
@@ -645,90 +3311,342 @@ def liberar_responsable(equipo):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/responsables/historial/<equipo>', methods=['GET'])
+@rutas.route('/api/responsables/historial/<equipo>', methods=['GET'])
 @require_auth
+@con_etag('responsables_equipo', 'usuarios')
+@con_cache('responsables_equipo', 'usuarios')
 def historial_responsable(equipo):
-    query = """
-        SELECT r.*, u.Nombre_Usuario 
-        FROM Responsables_Equipo r 
-        LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario 
-        WHERE fk_equipo_id = %s 
-        ORDER BY Fecha_Inicio DESC
-    """
-    historial = ejecutar_query(query, (equipo,))
+    historial = ejecutar_query(QUERY_HISTORIAL_RESPONSABLE, (equipo,))
     return jsonify([dict(h) for h in historial]), 200
 
-@app.route('/api/responsables/<equipo>', methods=['GET'])
+@rutas.route('/api/responsables/<equipo>', methods=['GET'])
 @require_auth
+@con_etag('responsables_equipo', 'usuarios')
+@con_cache('responsables_equipo', 'usuarios')
 def obtener_responsables(equipo):
     try:
-        query = """
-            SELECT r.*, u.Nombre_Usuario as tecnico
-            FROM Responsables_Equipo r
-            LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
-            WHERE r.fk_equipo_id = %s
-            ORDER BY r.Fecha_Inicio DESC
-        """
-        responsables = ejecutar_query(query, (equipo,))
+        responsables = ejecutar_query(QUERY_RESPONSABLES_EQUIPO, (equipo,))
         return jsonify([dict(r) for r in responsables]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/responsables', methods=['GET'])
+@rutas.route('/api/responsables', methods=['GET'])
 @require_auth
+@con_etag('responsables_equipo', 'usuarios', 'equipos')
 def listar_todos_responsables():
+    """Listar responsables (filtros y paginación: ver listar_reporte_historial)"""
+    return listar_reporte_historial('responsables')
+
+# =====================================================
+# LISTADOS DE HISTORIAL: VENTANA DE FECHAS Y PAGINACIÓN
+# =====================================================
+# Mantenimientos, traslados, responsables e historial de estados con los
+# mismos filtros y paginación por keyset sobre (fecha, id) descendente, que
+# es el orden de los índices *_fecha (migraciones/0002). Sin fecha_inicio
+# se listan los últimos HISTORIAL_VENTANA_DIAS días (hasta fecha_fin o hoy)
+# y sin ninguna fecha, además, en páginas de LIMITE_PAGINA_DEFECTO filas.
+HISTORIAL_VENTANA_DIAS = int(os.getenv('HISTORIAL_VENTANA_DIAS', 90))
+
+QUERY_HISTORIAL_ESTADOS = """
+    SELECT h.*, e.Marca_Equipo, e.Modelo_Equipo, e.Unidad_Actual
+    FROM {historial} h
+    LEFT JOIN Equipos e ON h.fk_equipo_id = e.Nombre_Equipo
+    WHERE 1=1
+"""
+
+# alias de la tabla, columnas de fecha e id, columna del filtro ?estado=
+# (estado actual del equipo, o el estado nuevo en el historial de estados),
+# columna que se cuenta en el resumen de la página y tabla particionada
+# (para ?archivo=1)
+REPORTES_HISTORIAL = {
+    'mantenimientos': {
+        'query': QUERY_MANTENIMIENTOS, 'alias': 'm', 'fecha': 'Fecha_Mantenimiento', 'id': 'Id_Mantenimiento',
+        'estado': 'e.Estado_Equipo', 'agrupar': 'tipo_mantenimiento', 'tabla': 'historial_mantenimiento'
+    },
+    'traslados': {
+        'query': QUERY_TRASLADOS, 'alias': 't', 'fecha': 'Fecha', 'id': 'Id_Traslado',
+        'estado': 'e.Estado_Equipo', 'agrupar': 'sede_destino', 'tabla': 'historial_traslados'
+    },
+    'responsables': {
+        'query': QUERY_RESPONSABLES, 'alias': 'r', 'fecha': 'Fecha_Inicio', 'id': 'Id_Responsabilidad',
+        'estado': 'e.Estado_Equipo', 'agrupar': 'tecnico', 'tabla': None
+    },
+    'estados': {
+        'query': QUERY_HISTORIAL_ESTADOS, 'alias': 'h', 'fecha': 'Fecha_Estado', 'id': 'Id_Historial',
+        'estado': 'h.Estado_Nuevo', 'agrupar': 'estado_nuevo', 'tabla': 'historial_estado'
+    }
+}
+
+
+def leer_fecha(args, parametro, fin=False):
+    """
+    Leer una fecha (AAAA-MM-DD) o fecha y hora ISO. Con fin=True una fecha
+    sola incluye todo ese día (se retorna el inicio del día siguiente,
+    para comparar con <). None si no se envió.
+    """
+    valor = args.get(parametro)
+    if not valor:
+        return None
     try:
-        query = """
-            SELECT r.*, u.Nombre_Usuario as tecnico, e.Marca_Equipo, e.Modelo_Equipo
-            FROM Responsables_Equipo r
-            LEFT JOIN Usuarios u ON r.fk_tecnico_id = u.Cedula_Usuario
-            LEFT JOIN Equipos e ON r.fk_equipo_id = e.Nombre_Equipo
-            WHERE 1=1
-        """
-        params = []
-        if request.args.get('busqueda'):
-            busqueda = request.args.get('busqueda')
-            query += " AND (LOWER(r.fk_equipo_id) LIKE %s OR LOWER(e.Ip_Equipo) LIKE %s)"
-            params.append(f'%{busqueda.lower()}%')
-            params.append(f'%{busqueda.lower()}%')
-        
-        query += " ORDER BY r.Fecha_Inicio DESC"
-        responsables = ejecutar_query(query, tuple(params) if params else None)
-        return jsonify([dict(r) for r in responsables]), 200
+        fecha = datetime.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalidoError(f"{parametro} debe tener el formato AAAA-MM-DD")
+    if fin and len(valor) == 10:
+        fecha += timedelta(days=1)
+    return fecha
+
+
+def consulta_reporte_historial(reporte, args, fuente=None):
+    """
+    Armar la consulta de un listado de historial a partir de sus parámetros:
+    busqueda, fecha_inicio, fecha_fin, unidad y estado. Siempre se pagina:
+    sin limit, páginas de LIMITE_PAGINA_DEFECTO filas (hasta
+    LIMITE_PAGINA_MAXIMO con limit). `fuente` reemplaza a la tabla de
+    historial (ver ejecutar_query_historial).
+    Retorna un dict con query, params y lo que necesita pagina_historial.
+    """
+    config = REPORTES_HISTORIAL[reporte]
+    fecha = f"{config['alias']}.{config['fecha']}"
+    id_fila = f"{config['alias']}.{config['id']}"
+    cursor = args.get('cursor')
+
+    desde = leer_fecha(args, 'fecha_inicio')
+    hasta = leer_fecha(args, 'fecha_fin', fin=True)
+    limite = leer_limite(args, requerido=True)
+    if desde is None:
+        desde = datetime.combine((hasta or datetime.now()).date(), datetime.min.time()) \
+            - timedelta(days=HISTORIAL_VENTANA_DIAS)
+
+    # Las fechas se comparan contra la columna sin funciones: el índice por
+    # fecha y la poda de particiones mensuales dependen de eso
+    query = config['query'].format(historial=fuente or config['tabla'])
+    params = []
+    if desde:
+        query += f" AND {fecha} >= %s"
+        params.append(desde)
+    if hasta:
+        query += f" AND {fecha} < %s"
+        params.append(hasta)
+    if args.get('unidad'):
+        query += " AND e.Unidad_Actual = %s"
+        params.append(args.get('unidad'))
+    if args.get('estado'):
+        query += f" AND {config['estado']} = %s"
+        params.append(args.get('estado'))
+    if args.get('busqueda'):
+        sql, params_busqueda = condicion_equipo_buscado(f"{config['alias']}.fk_equipo_id", args.get('busqueda'))
+        query += " AND " + sql
+        params.extend(params_busqueda)
+
+    consulta = {
+        "reporte": reporte,
+        "limite": limite,
+        "tabla": config['tabla'],
+        "desde": desde,
+        "hasta": hasta
+    }
+    if cursor:
+        datos_cursor = decodificar_cursor(cursor, (datetime, int))
+        if datos_cursor.get('r') != reporte:
+            raise ParametroInvalidoError("El cursor no corresponde a este listado")
+        valor_fecha, valor_id = datos_cursor['v']
+        query += f" AND ({fecha}, {id_fila}) < (%s::timestamp, %s)"
+        params.extend([valor_fecha, valor_id])
+
+    # Se pide una fila extra para saber si hay página siguiente
+    consulta["query"] = query + f" ORDER BY {fecha} DESC, {id_fila} DESC LIMIT %s"
+    consulta["params"] = tuple(params) + (limite + 1,)
+    return consulta
+
+
+def pagina_historial(filas, consulta):
+    """
+    Respuesta de un listado de historial: las filas de la página, el cursor
+    siguiente, la ventana usada y un resumen de la página (para el
+    encabezado del reporte sin otra consulta sobre toda la tabla).
+    """
+    limite = consulta['limite']
+    config = REPORTES_HISTORIAL[consulta['reporte']]
+    clave_fecha = config['fecha'].lower()
+    clave_id = config['id'].lower()
+
+    siguiente_cursor = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente_cursor = codificar_cursor({
+            'r': consulta['reporte'],
+            'v': [ultima[clave_fecha], ultima[clave_id]]
+        })
+
+    agrupados = Counter('' if f[config['agrupar']] is None else str(f[config['agrupar']]) for f in filas)
+    return {
+        "success": True,
+        consulta['reporte']: [dict(f) for f in filas],
+        "siguiente_cursor": siguiente_cursor,
+        # ISO sin zona: el panel la muestra sin conversiones de hora local
+        "ventana": {
+            "fecha_inicio": consulta['desde'].isoformat() if consulta['desde'] else None,
+            "fecha_fin": consulta['hasta'].isoformat() if consulta['hasta'] else None
+        },
+        "resumen": {
+            "filas": len(filas),
+            "equipos": len({f['fk_equipo_id'] for f in filas}),
+            "fecha_max": filas[0][clave_fecha] if filas else None,
+            "fecha_min": filas[-1][clave_fecha] if filas else None,
+            f"por_{config['agrupar']}": dict(agrupados.most_common())
+        }
+    }
+
+
+def listar_reporte_historial(reporte):
+    """
+    Cuerpo común de los listados de historial (GET /api/mantenimientos,
+    /api/traslados, /api/responsables y /api/reportes/historial-estados).
+
+    Filtros: ?fecha_inicio=AAAA-MM-DD&fecha_fin=AAAA-MM-DD&unidad=&estado=
+    &busqueda=. Paginación por keyset: ?limit=N&cursor=<siguiente_cursor>;
+    siempre responde una página, con o sin fechas. Sin fecha_inicio la
+    ventana es de HISTORIAL_VENTANA_DIAS días (la usada va en la respuesta).
+    Con ?archivo=1 incluye los meses archivados del historial.
+    """
+    try:
+        consulta = consulta_reporte_historial(reporte, request.args)
+
+        def armar(fuente):
+            con_fuente = consulta_reporte_historial(reporte, request.args, fuente)
+            return con_fuente['query'], con_fuente['params']
+
+        filas = ejecutar_query_historial(armar, consulta['tabla'], consulta['desde'], consulta['hasta'])
+        return jsonify(pagina_historial(filas, consulta)), 200
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # =====================================================
-# ENDPOINTS - ESTADÍSTICAS Y REPORTES
+# ESTADÍSTICAS EN MEMORIA
 # =====================================================
-@app.route('/api/estadisticas', methods=['GET'])
-@require_auth
-def obtener_estadisticas():
-    """Obtener estadísticas generales"""
-    try:
+# Segundos que se sirve la misma foto de estadísticas. Las escrituras de
+# este proceso la invalidan o la ajustan; el TTL acota lo desactualizada
+# que puede estar frente a cambios hechos por otros procesos.
+ESTADISTICAS_TTL = float(os.getenv('ESTADISTICAS_TTL', 60))
+
+# Una sola pasada sobre Equipos: total, por estado, por unidad y por tipo
+QUERY_ESTADISTICAS = """
+    SELECT Estado_Equipo, Unidad_Actual, Tipo_Equipo,
+           GROUPING(Estado_Equipo) AS sin_estado,
+           GROUPING(Unidad_Actual) AS sin_unidad,
+           GROUPING(Tipo_Equipo) AS sin_tipo,
+           COUNT(*) AS count
+    FROM Equipos
+    GROUP BY GROUPING SETS ((Estado_Equipo), (Unidad_Actual), (Tipo_Equipo), ())
+"""
+
+class SnapshotEstadisticas:
+    """
+    Foto en memoria de /api/estadisticas.
+
+    Solo un hilo a la vez recalcula la foto; los demás esperan y reutilizan
+    el resultado. ajustar() corrige los contadores sin volver a consultar.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._lock_calculo = threading.Lock()
+        self._foto = None      # (stats, generado_monotonic, generado_en)
+        self._version = 0
+
+    def _vigente(self, foto):
+        return foto is not None and time.monotonic() - foto[1] < self.ttl
+
+    def invalidar(self):
+        with self._lock:
+            self._foto = None
+            self._version += 1
+
+    def ajustar(self, grupo, anterior, nuevo):
+        """Mover un equipo de `anterior` a `nuevo` dentro de por_estado/por_unidad/por_tipo"""
+        if anterior == nuevo:
+            return
+        with self._lock:
+            if self._foto is None:
+                return
+            stats, generado, generado_en = self._foto
+            conteos = dict(stats[grupo])
+            if conteos.get(anterior, 0) <= 0:
+                # La foto no coincide con la base de datos: se recalcula
+                self._foto = None
+                self._version += 1
+                return
+            conteos[anterior] -= 1
+            if conteos[anterior] == 0:
+                del conteos[anterior]
+            conteos[nuevo] = conteos.get(nuevo, 0) + 1
+            self._foto = (dict(stats, **{grupo: conteos}), generado, generado_en)
+            self._version += 1
+
+    def _calcular(self):
         stats = {
-            "total_equipos": ejecutar_query("SELECT COUNT(*) as count FROM Equipos", fetchone=True, fetchall=False)['count'],
+            "total_equipos": 0,
             "por_estado": {},
             "por_unidad": {},
             "por_tipo": {}
         }
-        
-        # Por estado
-        query = "SELECT Estado_Equipo, COUNT(*) as count FROM Equipos GROUP BY Estado_Equipo"
-        for row in ejecutar_query(query):
-            stats["por_estado"][row['estado_equipo']] = row['count']
-        
-        # Por unidad
-        query = "SELECT Unidad_Actual, COUNT(*) as count FROM Equipos GROUP BY Unidad_Actual"
-        for row in ejecutar_query(query):
-            stats["por_unidad"][row['unidad_actual']] = row['count']
-        
-        # Por tipo
-        query = "SELECT Tipo_Equipo, COUNT(*) as count FROM Equipos GROUP BY Tipo_Equipo"
-        for row in ejecutar_query(query):
-            stats["por_tipo"][row['tipo_equipo']] = row['count']
-        
-        return jsonify(stats), 200
+        for row in ejecutar_query(QUERY_ESTADISTICAS):
+            if not row['sin_estado']:
+                stats["por_estado"][row['estado_equipo']] = row['count']
+            elif not row['sin_unidad']:
+                stats["por_unidad"][row['unidad_actual']] = row['count']
+            elif not row['sin_tipo']:
+                stats["por_tipo"][row['tipo_equipo']] = row['count']
+            else:
+                stats["total_equipos"] = row['count']
+        return stats
+
+    def obtener(self):
+        """Retorna (stats, generado_en, desde_cache)"""
+        foto = self._foto
+        if self._vigente(foto):
+            return foto[0], foto[2], True
+
+        with self._lock_calculo:
+            foto = self._foto
+            if self._vigente(foto):
+                return foto[0], foto[2], True
+
+            version = self._version
+            stats = self._calcular()
+            generado_en = datetime.now()
+            with self._lock:
+                # Si hubo una escritura mientras se calculaba no se guarda
+                if self._version == version:
+                    self._foto = (stats, time.monotonic(), generado_en)
+            return stats, generado_en, False
+
+    def en_memoria(self):
+        """Stats de la foto vigente, sin calcularla si no hay (None)"""
+        foto = self._foto
+        return foto[0] if self._vigente(foto) else None
+
+
+estadisticas_snapshot = SnapshotEstadisticas(ESTADISTICAS_TTL)
+
+# =====================================================
+# ENDPOINTS - ESTADÍSTICAS Y REPORTES
+# =====================================================
+@rutas.route('/api/estadisticas', methods=['GET'])
+@require_auth
+def obtener_estadisticas():
+    """Obtener estadísticas generales (foto en memoria, ver ESTADISTICAS_TTL)"""
+    try:
+        stats, generado_en, desde_cache = estadisticas_snapshot.obtener()
+        respuesta = dict(stats)
+        respuesta["generado_en"] = generado_en.isoformat()
+        respuesta["antiguedad_segundos"] = round((datetime.now() - generado_en).total_seconds(), 3)
+        respuesta["desde_cache"] = desde_cache
+        return jsonify(respuesta), 200
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -736,8 +3654,9 @@ def obtener_estadisticas():
 # =====================================================
 # ENDPOINTS - USUARIOS (SOLO SUPERUSUARIO)
 # =====================================================
-@app.route('/api/usuarios', methods=['GET'])
+@rutas.route('/api/usuarios', methods=['GET'])
 @require_auth
+@con_cache('usuarios', 'roles')
 def listar_usuarios():
     """Listar todos los usuarios"""
     try:
@@ -753,7 +3672,7 @@ def listar_usuarios():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/usuarios', methods=['POST'])
+@rutas.route('/api/usuarios', methods=['POST'])
 @require_auth
 @require_superuser
 def crear_usuario():
@@ -773,7 +3692,7 @@ def crear_usuario():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/usuarios/<int:cedula>', methods=['PUT'])
+@rutas.route('/api/usuarios/<int:cedula>', methods=['PUT'])
 @require_auth
 @require_superuser
 def actualizar_usuario(cedula):
@@ -790,12 +3709,13 @@ def actualizar_usuario(cedula):
             data['nombre'], data['password'], data['rol_id'], 
             data['estado'], cedula
         ), commit=True)
+        invalidar_usuario_cache(cedula)
         
         return jsonify({"success": True, "mensaje": "Usuario actualizado"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/usuarios/<int:cedula>', methods=['DELETE'])
+@rutas.route('/api/usuarios/<int:cedula>', methods=['DELETE'])
 @require_auth
 @require_superuser
 def eliminar_usuario(cedula):
@@ -803,13 +3723,15 @@ def eliminar_usuario(cedula):
     try:
         query = "UPDATE Usuarios SET Estado_Usuario = FALSE WHERE Cedula_Usuario = %s"
         ejecutar_query(query, (cedula,), commit=True)
+        invalidar_usuario_cache(cedula)
         
         return jsonify({"success": True, "mensaje": "Usuario desactivado"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/roles', methods=['GET'])
+@rutas.route('/api/roles', methods=['GET'])
 @require_auth
+@con_cache('roles')
 def listar_roles():
     """Listar roles disponibles"""
     try:
@@ -822,216 +3744,457 @@ def listar_roles():
 # =====================================================
 # ENDPOINTS - REPORTES AVANZADOS
 # =====================================================
-@app.route('/api/reportes/historial-estados', methods=['GET'])
+QUERY_REPORTE_EQUIPOS_POR_TECNICO = """
+    SELECT u.Nombre_Usuario, u.Cedula_Usuario,
+           COUNT(r.fk_equipo_id) as total_equipos,
+           string_agg(CAST(r.fk_equipo_id AS TEXT), ', ') as equipos
+    FROM Usuarios u
+    LEFT JOIN Responsables_Equipo r ON u.Cedula_Usuario = r.fk_tecnico_id AND r.Activo = TRUE
+    WHERE u.Estado_Usuario = TRUE
+    GROUP BY u.Cedula_Usuario, u.Nombre_Usuario
+    ORDER BY total_equipos DESC
+"""
+
+
+def consulta_mantenimientos_periodo(args, fuente='Historial_Mantenimiento'):
+    """
+    Consulta del reporte de mantenimientos en un período: (query, params).
+    Las fechas se comparan contra la columna sin funciones encima, así el
+    planificador solo lee las particiones mensuales del rango.
+    """
+    fecha_inicio = args.get('fecha_inicio')
+    fecha_fin = args.get('fecha_fin')
+    tipo = args.get('tipo')
+    
+    query = f"""
+        SELECT m.*, e.Marca_Equipo, e.Modelo_Equipo, 
+               u.Nombre_Usuario as tecnico
+        FROM {fuente} m
+        JOIN Equipos e ON m.fk_equipo_id = e.Nombre_Equipo
+        LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
+        WHERE 1=1
+    """
+    params = []
+    
+    if fecha_inicio:
+        query += " AND m.Fecha_Mantenimiento >= %s"
+        params.append(fecha_inicio)
+    if fecha_fin:
+        query += " AND m.Fecha_Mantenimiento <= %s"
+        params.append(fecha_fin)
+    if tipo:
+        query += " AND m.Tipo_Mantenimiento = %s"
+        params.append(tipo)
+    
+    query += " ORDER BY m.Fecha_Mantenimiento DESC"
+    return query, tuple(params)
+
+@rutas.route('/api/reportes/historial-estados', methods=['GET'])
 @require_auth
 def reporte_historial_estados():
-    try:
-        query = """
-            SELECT h.*, e.Marca_Equipo, e.Modelo_Equipo, e.Unidad_Actual
-            FROM Historial_Estado h
-            LEFT JOIN Equipos e ON h.fk_equipo_id = e.Nombre_Equipo
-            ORDER BY h.Fecha_Estado DESC
-        """
-        historial = ejecutar_query(query)
-        return jsonify([dict(h) for h in historial]), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """Cambios de estado (filtros y paginación: ver listar_reporte_historial)"""
+    return listar_reporte_historial('estados')
 
-@app.route('/api/reportes/equipos-por-tecnico', methods=['GET'])
+@rutas.route('/api/reportes/equipos-por-tecnico', methods=['GET'])
 @require_auth
+@con_cache('usuarios', 'responsables_equipo')
 def reporte_equipos_por_tecnico():
     try:
-        query = """
-            SELECT u.Nombre_Usuario, u.Cedula_Usuario,
-                   COUNT(r.fk_equipo_id) as total_equipos,
-                   string_agg(CAST(r.fk_equipo_id AS TEXT), ', ') as equipos
-            FROM Usuarios u
-            LEFT JOIN Responsables_Equipo r ON u.Cedula_Usuario = r.fk_tecnico_id AND r.Activo = TRUE
-            WHERE u.Estado_Usuario = TRUE
-            GROUP BY u.Cedula_Usuario, u.Nombre_Usuario
-            ORDER BY total_equipos DESC
-        """
-        reporte = ejecutar_query(query)
+        reporte = ejecutar_query(QUERY_REPORTE_EQUIPOS_POR_TECNICO)
         return jsonify([dict(r) for r in reporte]), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reportes/mantenimientos-periodo', methods=['GET'])
+@rutas.route('/api/reportes/mantenimientos-periodo', methods=['GET'])
 @require_auth
 def reporte_mantenimientos_periodo():
     """Mantenimientos en un período"""
     try:
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
-        tipo = request.args.get('tipo')
-        
-        query = """
-            SELECT m.*, e.Marca_Equipo, e.Modelo_Equipo, 
-                   u.Nombre_Usuario as tecnico
-            FROM Historial_Mantenimiento m
-            JOIN Equipos e ON m.fk_equipo_id = e.Nombre_Equipo
-            LEFT JOIN Usuarios u ON m.fk_tecnico_id = u.Cedula_Usuario
-            WHERE 1=1
-        """
-        params = []
-        
-        if fecha_inicio:
-            query += " AND m.Fecha_Mantenimiento >= %s"
-            params.append(fecha_inicio)
-        if fecha_fin:
-            query += " AND m.Fecha_Mantenimiento <= %s"
-            params.append(fecha_fin)
-        if tipo:
-            query += " AND m.Tipo_Mantenimiento = %s"
-            params.append(tipo)
-        
-        query += " ORDER BY m.Fecha_Mantenimiento DESC"
-        
-        mantenimientos = ejecutar_query(query, tuple(params))
+        mantenimientos = ejecutar_query_historial(
+            lambda fuente: consulta_mantenimientos_periodo(request.args, fuente),
+            'historial_mantenimiento', *ventana_archivo(request.args)
+        )
         return jsonify([dict(m) for m in mantenimientos]), 200
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# =====================================================
+# EXCEL EN STREAMING
+# =====================================================
+LOTE_EXPORTACION = int(os.getenv('EXPORTACION_LOTE', 2000))
+
+_XLSX_TIPO_CONTENIDO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_RELACIONES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_LIBRO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{titulo}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_RELACIONES_LIBRO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 1 = encabezado corporativo (fondo azul, letra blanca en negrita)
+_XLSX_ESTILOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><color rgb="FFFFFFFF"/><name val="Calibri"/></font></fonts>'
+    '<fills count="3"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill>'
+    '<fill><patternFill patternType="solid"><fgColor rgb="FF3B5FFF"/><bgColor rgb="FF3B5FFF"/></patternFill></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="2" borderId="0" xfId="0" applyFont="1" applyFill="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XML_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class _SalidaStream:
+    """Destino de zipfile sin seek: acumula los bytes hasta que se vacían"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def tomar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+class EscritorXlsxStream:
+    """
+    Libro .xlsx de una sola hoja que se genera mientras se envía.
+
+    Las filas se escriben comprimidas dentro del zip a medida que llegan y
+    los bytes producidos se retiran con vaciar(), así la memoria usada no
+    depende del número de filas (el zip usa descriptores de datos, no
+    necesita volver atrás en el archivo).
+    """
+
+    def __init__(self, titulo, encabezados):
+        self._salida = _SalidaStream()
+        self._zip = zipfile.ZipFile(self._salida, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', _XLSX_TIPO_CONTENIDO)
+        self._zip.writestr('_rels/.rels', _XLSX_RELACIONES)
+        self._zip.writestr('xl/workbook.xml', _XLSX_LIBRO.format(titulo=xml_escape(titulo, {'"': '&quot;'})))
+        self._zip.writestr('xl/_rels/workbook.xml.rels', _XLSX_RELACIONES_LIBRO)
+        self._zip.writestr('xl/styles.xml', _XLSX_ESTILOS)
+        self._hoja = self._zip.open('xl/worksheets/sheet1.xml', 'w')
+        self._hoja.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        )
+        self._columnas = [self._columna(i) for i in range(len(encabezados))]
+        self._filas = 0
+        self._pendiente = []
+        self.agregar_fila(encabezados, estilo=1)
+
+    @staticmethod
+    def _columna(indice):
+        """0 -> A, 25 -> Z, 26 -> AA"""
+        letras = ''
+        indice += 1
+        while indice:
+            indice, resto = divmod(indice - 1, 26)
+            letras = chr(65 + resto) + letras
+        return letras
+
+    def _celda(self, indice, valor, estilo):
+        if valor is None:
+            return ''
+        atributos = f' r="{self._columnas[indice]}{self._filas}"'
+        if estilo:
+            atributos += f' s="{estilo}"'
+        if isinstance(valor, bool):
+            return f'<c{atributos} t="b"><v>{int(valor)}</v></c>'
+        if isinstance(valor, (int, float, Decimal)):
+            return f'<c{atributos}><v>{valor}</v></c>'
+        if isinstance(valor, datetime):
+            valor = valor.strftime("%Y-%m-%d %H:%M:%S")
+        # Excel no admite más de 32767 caracteres por celda
+        texto = _XML_CARACTERES_INVALIDOS.sub('', str(valor))[:32767]
+        return f'<c{atributos} t="inlineStr"><is><t xml:space="preserve">{xml_escape(texto)}</t></is></c>'
+
+    def agregar_fila(self, valores, estilo=0):
+        self._filas += 1
+        celdas = ''.join(self._celda(i, v, estilo) for i, v in enumerate(valores))
+        self._pendiente.append(f'<row r="{self._filas}">{celdas}</row>')
+
+    def vaciar(self):
+        """Comprimir las filas pendientes y retornar los bytes listos para enviar"""
+        if self._pendiente:
+            self._hoja.write(''.join(self._pendiente).encode('utf-8'))
+            self._pendiente = []
+        return self._salida.tomar()
+
+    def terminar(self):
+        """Cerrar la hoja y el zip; retorna los últimos bytes"""
+        self._pendiente.append('</sheetData></worksheet>')
+        self._hoja.write(''.join(self._pendiente).encode('utf-8'))
+        self._pendiente = []
+        self._hoja.close()
+        self._zip.close()
+        return self._salida.tomar()
+
 # =====================================================
 # EXPORTAR Excel (CORREGIDO PARA AUTENTICACIÓN)
 # =====================================================
-@app.route('/api/exportar/excel', methods=['GET'])
+COLUMNAS_EXPORTACION = [
+    'Nombre_Equipo', 'Marca_Equipo', 'Modelo_Equipo', 'Serial_Equipo',
+    'Ip_Equipo', 'Mac_Equipo', 'Sistema_Operativo', 'Ram_Equipo',
+    'Disco_Equipo', 'Unidad_Actual', 'Tipo_Area', 'Estado_Equipo'
+]
+
+@rutas.route('/api/exportar/excel', methods=['GET'])
 # IMPORTANTE: Si quieres que solo usuarios autenticados exporten, descomenta la siguiente línea
 # @require_auth 
 def exportar_excel():
-    """Exportar todo el inventario a formato Excel (.xlsx)"""
+    """
+    Exportar el inventario a Excel (.xlsx) con los mismos filtros de
+    /api/equipos (unidad, estado, tipo, area, busqueda).
+
+    Las filas se leen con un cursor de servidor por lotes y el archivo se
+    envía a medida que se genera: la memoria no crece con el inventario.
+    """
     try:
-        # 1. Consultar los datos (puedes ajustar el SELECT con las columnas que necesites)
-        query = """
-            SELECT 
-                Nombre_Equipo, Marca_Equipo, Modelo_Equipo, Serial_Equipo, 
-                Ip_Equipo, Mac_Equipo, Sistema_Operativo, Ram_Equipo, 
-                Disco_Equipo, Unidad_Actual, Tipo_Area, Estado_Equipo
+        # 1. Consultar los datos con los filtros de listar_equipos
+        where, params = construir_filtros_equipos(request.args)
+        query = f"""
+            SELECT {', '.join(COLUMNAS_EXPORTACION)}
             FROM Equipos
+            WHERE {where}
             ORDER BY Nombre_Equipo
         """
-        equipos = ejecutar_query(query)
-
-        # 2. Crear el archivo Excel en memoria
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Inventario TI"
-
-        if equipos:
-            # 3. Generar encabezados dinámicamente basados en la consulta SQL
-            columnas = list(equipos[0].keys())
-            headers = [col.replace('_', ' ').title() for col in columnas]
-            ws.append(headers)
-
-            # 4. Darle estilo corporativo a los encabezados (Fondo azul, letra blanca)
-            header_fill = PatternFill(start_color="3B5FFF", end_color="3B5FFF", fill_type="solid")
-            header_font = Font(color="FFFFFF", bold=True)
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-
-            # 5. Llenar las filas con los datos de los equipos
-            for eq in equipos:
-                # Convertimos los valores a una lista para insertarlos en la fila
-                ws.append(list(eq.values()))
-
-        # 6. Guardar el Excel en un buffer de memoria en lugar de crear un archivo físico
-        mem_file = io.BytesIO()
-        wb.save(mem_file)
-        mem_file.seek(0)
-
-        # 7. Enviar el archivo al frontend
+
+        # 2. Abrir el cursor de servidor y leer el primer lote antes de responder,
+        #    así un error de base de datos todavía se puede devolver como JSON
+        conn = db_pool.obtener()
+        try:
+            cursor = conn.cursor(name='exportar_excel')
+            cursor.itersize = LOTE_EXPORTACION
+            cursor.execute(query, tuple(params))
+            primer_lote = cursor.fetchmany(LOTE_EXPORTACION)
+        except Exception:
+            db_pool.devolver(conn)
+            raise
+
+        def generar():
+            # 3. Encabezados con estilo corporativo (fondo azul, letra blanca)
+            headers = [col.replace('_', ' ').title() for col in COLUMNAS_EXPORTACION]
+            escritor = EscritorXlsxStream("Inventario TI", headers)
+            yield escritor.vaciar()
+
+            # 4. Escribir y enviar lote por lote
+            lote = primer_lote
+            while lote:
+                for fila in lote:
+                    escritor.agregar_fila(fila)
+                yield escritor.vaciar()
+                lote = cursor.fetchmany(LOTE_EXPORTACION)
+
+            yield escritor.terminar()
+
+        # 5. Enviar el archivo al frontend; la conexión vuelve al pool al terminar
         fecha_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return send_file(
-            mem_file,
+        respuesta = Response(
+            generar(),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'inventario_ticontrol_{fecha_str}.xlsx'
+            headers={
+                'Content-Disposition': f'attachment; filename=inventario_ticontrol_{fecha_str}.xlsx'
+            }
         )
+        respuesta.call_on_close(lambda: db_pool.devolver(conn))
+        return respuesta
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/responsables/masivo', methods=['POST'])
+# Reasignación en lote: dos sentencias en una transacción. La marca
+# app.responsables_en_lote apaga trg_cerrar_responsable (migraciones/0010),
+# que ya no tendría activos que cerrar tras el UPDATE.
+#
+# Antes se bloquean los equipos de la selección en orden de nombre: dos
+# lotes que se solapan (reasignaciones o traslados) esperan uno al otro en
+# lugar de bloquearse en el orden en que cada plan recorre las filas, que
+# terminaba en deadlock. NO KEY UPDATE no choca con el FOR KEY SHARE de las
+# llaves foráneas: una asignación individual no espera por el lote.
+QUERY_BLOQUEAR_EQUIPOS_LOTE = """
+    SELECT Nombre_Equipo
+    FROM Equipos
+    WHERE {filtro}
+    ORDER BY Nombre_Equipo
+    FOR NO KEY UPDATE
+"""
+
+QUERY_CERRAR_RESPONSABLES_LOTE = """
+    UPDATE Responsables_Equipo r
+    SET Activo = FALSE,
+        Fecha_Fin = CURRENT_TIMESTAMP
+    FROM Equipos
+    WHERE r.fk_equipo_id = Equipos.Nombre_Equipo
+      AND r.Activo = TRUE
+      AND {filtro}
+"""
+
+QUERY_ASIGNAR_RESPONSABLES_LOTE = """
+    INSERT INTO Responsables_Equipo (fk_equipo_id, fk_tecnico_id, Observacion)
+    SELECT Nombre_Equipo, %s, %s
+    FROM Equipos
+    WHERE {filtro}
+    ORDER BY Nombre_Equipo
+    RETURNING fk_equipo_id
+"""
+
+
+@rutas.route('/api/responsables/masivo', methods=['POST'])
 @require_auth
 @require_superuser
 def asignar_responsable_masivo():
-    """Asignar un técnico a todos los equipos de una unidad (Solo Superusuario)"""
+    """
+    Asignar un técnico a todos los equipos de una lista (equipos) o que
+    cumplan los filtros de listar_equipos (unidad, estado, tipo, area,
+    busqueda) (Solo Superusuario). Retorna los equipos reasignados.
+    """
     try:
-        data = request.json
-        unidad = data.get('unidad')
+        data = request.json or {}
         tecnico = data.get('tecnico')
         observacion = data.get('observacion', 'Asignación masiva por unidad')
 
-        if not unidad or not tecnico:
-            return jsonify({"error": "Faltan datos requeridos (unidad o técnico)"}), 400
-
-        conn = get_db_connection()
-        # Usamos RealDictCursor para poder leer los resultados fácilmente
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if not tecnico:
+            return jsonify({"error": "Falta el técnico a asignar"}), 400
 
         try:
-            # 1. Obtener equipos ÚNICOS de la unidad (evita problemas si hay equipos duplicados)
-            cur.execute("SELECT DISTINCT Nombre_Equipo FROM Equipos WHERE Unidad_Actual = %s", (unidad,))
-            equipos = cur.fetchall()
-
-            if not equipos:
-                return jsonify({"error": f"No se encontraron equipos en la unidad '{unidad}'."}), 404
+            filtro, params = filtro_equipos_lote(data)
+        except ParametroInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
 
-            equipos_afectados = 0
+        # El pool hace rollback si algo falla: o se reasignan todos o ninguno
+        with db_pool.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SET LOCAL app.responsables_en_lote = 'on'")
+            cur.execute(QUERY_BLOQUEAR_EQUIPOS_LOTE.format(filtro=filtro), params)
+            cur.execute(QUERY_CERRAR_RESPONSABLES_LOTE.format(filtro=filtro), params)
+            cur.execute(QUERY_ASIGNAR_RESPONSABLES_LOTE.format(filtro=filtro), [tecnico, observacion] + params)
+            equipos = [fila[0] for fila in cur.fetchall()]
 
-            # 2. Procesar equipo por equipo de forma segura
-            for equipo_row in equipos:
-                nombre_equipo = equipo_row['nombre_equipo']
-
-                # A. Desactivar responsable actual de ESTE equipo
-                cur.execute("""
-                    UPDATE Responsables_Equipo
-                    SET Activo = FALSE,
-                        Fecha_Fin = CURRENT_TIMESTAMP
-                    WHERE fk_equipo_id = %s AND Activo = TRUE
-                """, (nombre_equipo,))
-
-                # B. Asignar el nuevo responsable a ESTE equipo
-                cur.execute("""
-                    INSERT INTO Responsables_Equipo (fk_equipo_id, fk_tecnico_id, Fecha_Inicio, Activo, Observacion)
-                    VALUES (%s, %s, CURRENT_DATE, TRUE, %s)
-                """, (nombre_equipo, tecnico, observacion))
+            if not equipos:
+                conn.rollback()
+                return jsonify({"error": "Ningún equipo cumple la selección"}), 404
 
-                equipos_afectados += 1
-            
-            # Confirmar todos los cambios de una sola vez
             conn.commit()
-            
-            return jsonify({
-                "success": True, 
-                "mensaje": f"Se asignó el técnico a {equipos_afectados} equipos exitosamente."
-            }), 200
 
-        except Exception as e:
-            conn.rollback() # Si algo falla, deshacemos todo para no dañar la BD
-            raise e
-        finally:
-            cur.close()
-            conn.close()
+        respuesta = {
+            "success": True,
+            "mensaje": f"Se asignó el técnico a {len(equipos)} equipos exitosamente.",
+            "equipos": equipos
+        }
+        if data.get('equipos'):
+            respuesta["sin_asignar"] = sorted(set(data['equipos']) - set(equipos))
+        return jsonify(respuesta), 200
 
+    except psycopg2.errors.ForeignKeyViolation:
+        return jsonify({"error": f"El técnico {tecnico} no existe"}), 400
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
-@app.route('/')
-@app.route('/panel_control.html')
+@rutas.route('/api/admin/pool', methods=['GET'])
+@require_auth
+@require_superuser
+def estadisticas_pool():
+    """Estadísticas del pool de conexiones (en uso, esperas, tiempo de espera)"""
+    return jsonify(db_pool.estadisticas()), 200
+
+@rutas.route('/api/admin/cache', methods=['GET'])
+@require_auth
+@require_superuser
+def estadisticas_cache():
+    """Estadísticas de las cachés en memoria (hits, misses, expulsiones)"""
+    return jsonify({
+        "auth": auth_cache.estadisticas(),
+        "lecturas": cache_lecturas.estadisticas()
+    }), 200
+
+@rutas.route('/api/admin/slow-queries', methods=['GET'])
+@require_auth
+@require_superuser
+def consultas_lentas_admin():
+    """Consultas lentas agrupadas por huella, de mayor a menor tiempo total"""
+    entradas = consultas_lentas.exportar()
+    if METRICAS_CONFIG['dir']:
+        for lista in leer_fotos_metricas(excluir=ruta_foto_metricas(os.getpid(), 'lentas'), prefijo='lentas'):
+            entradas.extend(lista)
+    return jsonify({
+        "umbral_ms": CONSULTAS_LENTAS_CONFIG['umbral'] * 1000,
+        "muestra_explain": CONSULTAS_LENTAS_CONFIG['muestra_explain'],
+        "entradas": len(entradas),
+        "consultas": resumir_consultas_lentas(entradas)
+    }), 200
+
+@rutas.route('/metrics', methods=['GET'])
+def exponer_metricas():
+    """Métricas en formato de texto de Prometheus (suma de todos los workers)"""
+    token = METRICAS_CONFIG['token']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return jsonify({"error": "No autorizado"}), 401
+
+    fotos = [metricas.exportar()]
+    if METRICAS_CONFIG['dir']:
+        fotos += leer_fotos_metricas(excluir=ruta_foto_metricas(os.getpid()))
+    return Response(
+        RegistroMetricas.formato_prometheus(fotos),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+@rutas.route('/')
+@rutas.route('/panel_control.html')
 def servir_panel():
     return render_template('panel_control.html')
 
-@app.route('/api/health', methods=['GET'])
+@rutas.route('/api/health', methods=['GET'])
 def health_check():
     """Verificar estado del servidor"""
     try:
-        total = ejecutar_query("SELECT COUNT(*) as count FROM Equipos", 
-        fetchone=True, fetchall=False)['count']
+        # La conexión se verifica con SELECT 1. El total sale de la foto de
+        # estadísticas solo si ya está en memoria: sin autenticación no se
+        # dispara el GROUPING SETS sobre Equipos (null si no hay foto)
+        ejecutar_query("SELECT 1", fetchone=True, fetchall=False)
+        stats = estadisticas_snapshot.en_memoria()
+        total = stats['total_equipos'] if stats is not None else None
         return jsonify({
             "status": "online",
             "timestamp": datetime.now().isoformat(),
@@ -1040,10 +4203,186 @@ def health_check():
     except Exception as e:
         return jsonify({"status": "error", "error": str(e)}), 500
 
+# =====================================================
+# MANTENIMIENTO PERIÓDICO
+# =====================================================
+# Un hilo por proceso corre las tareas de limpieza de la base. Cada tarea
+# va en su transacción con un advisory lock: si otro worker la está
+# corriendo, esta ronda se la salta
+MANTENIMIENTO_CONFIG = {
+    'intervalo': float(os.getenv('MANTENIMIENTO_INTERVALO', 60)),
+}
+
+# Pasa los cambios pendientes de Cambios_Tabla a Versiones_Tabla en una sola
+# sentencia: la versión (base + pendientes) no cambia al compactar
+QUERY_COMPACTAR_VERSIONES = """
+    WITH movidos AS (
+        DELETE FROM Cambios_Tabla RETURNING Tabla
+    )
+    INSERT INTO Versiones_Tabla (Tabla, Version)
+    SELECT Tabla, count(*) FROM movidos GROUP BY Tabla
+    ON CONFLICT (Tabla) DO UPDATE
+    SET Version = Versiones_Tabla.Version + EXCLUDED.Version,
+        Fecha_Cambio = CURRENT_TIMESTAMP
+"""
+
+def compactar_versiones(cursor):
+    cursor.execute(QUERY_COMPACTAR_VERSIONES)
+
+def podar_eventos(cursor):
+    """Borrar los eventos de /api/stream más viejos que EVENTOS_RETENCION_HORAS"""
+    cursor.execute(QUERY_PODAR_EVENTOS, (EVENTOS_CONFIG['retencion_horas'] * 3600,))
+
+def podar_tickets_stream(cursor):
+    """Borrar los tickets de /api/stream que vencieron sin usarse"""
+    cursor.execute(QUERY_PODAR_TICKETS_STREAM)
+
+# (nombre, función que recibe el cursor, cada cuántos segundos)
+TAREAS_MANTENIMIENTO = [
+    ('versiones', compactar_versiones, MANTENIMIENTO_CONFIG['intervalo']),
+    ('eventos', podar_eventos, 3600),
+    ('tickets_stream', podar_tickets_stream, 3600),
+]
+
+_hilo_mantenimiento = None
+_pid_mantenimiento = None
+_lock_mantenimiento = threading.Lock()
+
+def iniciar_mantenimiento():
+    """Iniciar el hilo del proceso si hace falta (un hijo de fork no lo hereda)"""
+    global _hilo_mantenimiento, _pid_mantenimiento
+    with _lock_mantenimiento:
+        if _hilo_mantenimiento is None or _pid_mantenimiento != os.getpid():
+            _hilo_mantenimiento = threading.Thread(target=_bucle_mantenimiento, daemon=True)
+            _pid_mantenimiento = os.getpid()
+            _hilo_mantenimiento.start()
+
+
+# Bajo otro servidor WSGI (gunicorn, waitress, mod_wsgi) nadie llama a
+# iniciar_worker: el hilo arranca con la primera solicitud de cada proceso
+@rutas.before_app_request
+def asegurar_mantenimiento():
+    if _hilo_mantenimiento is None or _pid_mantenimiento != os.getpid():
+        iniciar_mantenimiento()
+
+def _bucle_mantenimiento():
+    ultima_vez = {}
+    while True:
+        time.sleep(MANTENIMIENTO_CONFIG['intervalo'])
+        ahora = time.monotonic()
+        for nombre, tarea, cada in TAREAS_MANTENIMIENTO:
+            if ahora - ultima_vez.get(nombre, float('-inf')) < cada:
+                continue
+            ultima_vez[nombre] = ahora
+            # Cualquier error (también PoolAgotadoError bajo carga) se
+            # registra y el hilo sigue: sin compactar, Cambios_Tabla crece
+            try:
+                ejecutar_tarea_mantenimiento(nombre, tarea)
+            except Exception as e:
+                print(f"Mantenimiento '{nombre}' falló: {e}")
+
+def ejecutar_tarea_mantenimiento(nombre, tarea):
+    """Correr una tarea si ningún otro proceso la tiene tomada. True si corrió"""
+    with db_pool.conexion() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (f"inventario_mantenimiento_{nombre}",))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return False
+        tarea(cursor)
+        conn.commit()
+        return True
+
+# =====================================================
+# FÁBRICA DE LA APLICACIÓN
+# =====================================================
+def configurar_consola():
+    """Salida en UTF-8 aunque la consola (Windows) use otra codificación"""
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')
+
+def iniciar_worker():
+    """
+    Crear los recursos propios de un proceso: pool de conexiones, cachés de
+    tokens y de lecturas, difusor de eventos (y su escucha), foto de
+    estadísticas, métricas, consultas lentas y el hilo de mantenimiento.
+    El lanzador multi-proceso lo llama en cada worker después del fork, así
+    ninguno comparte conexiones, locks ni cachés con el proceso principal.
+    """
+    global db_pool, auth_cache, cache_lecturas, difusor_eventos, estadisticas_snapshot, metricas, consultas_lentas, _hilo_volcado, _hilo_mantenimiento
+    db_pool = crear_pool()
+    metricas = RegistroMetricas()
+    consultas_lentas = RegistroConsultasLentas(CONSULTAS_LENTAS_CONFIG['max_entradas'])
+    _hilo_volcado = None
+    _hilo_mantenimiento = None
+    auth_cache = crear_auth_cache()
+    cache_lecturas = crear_cache_lecturas()
+    difusor_eventos = crear_difusor_eventos()
+    estadisticas_snapshot = SnapshotEstadisticas(ESTADISTICAS_TTL)
+    try:
+        db_pool.precalentar()
+    except psycopg2.Error as e:
+        # Sin base de datos el worker arranca igual; el pool reintenta al pedir conexión
+        print(f"No se pudo precalentar el pool: {e}")
+    asegurar_particiones_historial()
+    iniciar_mantenimiento()
+    difusor_eventos.disponible()
+
+
+def asegurar_particiones_historial():
+    """
+    Crear las particiones del historial del mes actual y los siguientes
+    (migraciones/0003). Así ninguna fila nueva cae en la partición por
+    defecto aunque el archivado no haya corrido.
+    """
+    try:
+        ejecutar_query("SELECT fn_asegurar_particiones_historial()", commit=True)
+    except psycopg2.Error as e:
+        print(f"No se pudieron crear las particiones del historial: {e}")
+
+def crear_app():
+    """
+    Armar la aplicación Flask. No abre conexiones: se puede llamar en el
+    proceso principal antes del fork (ver servidor_produccion.py).
+    """
+    configurar_consola()
+    app = Flask(__name__)
+    if JSON_MOTOR == 'orjson' and orjson is not None:
+        app.json_provider_class = ProveedorJSONRapido
+        app.json = ProveedorJSONRapido(app)
+    app.config['JSON_AS_ASCII'] = False
+    app.json.ensure_ascii = False
+    CORS(app)
+    app.register_blueprint(rutas)
+    return app
+
+# Instancia usada por `python servidor_api.py`, el modo asíncrono y los scripts
+app = crear_app()
+
 # =====================================================
 # INICIAR SERVIDOR
 # =====================================================
 if __name__ == '__main__':
+    # Modo asíncrono (servidor_async.py): API_MODO=async o --async
+    if os.getenv('API_MODO') == 'async' or '--async' in sys.argv:
+        # servidor_async importa este módulo: que use esta misma instancia
+        sys.modules.setdefault('servidor_api', sys.modules[__name__])
+        try:
+            import servidor_async
+        except ImportError as e:
+            print(f"No se puede iniciar el modo asíncrono ({e}).")
+            print('Instale: pip install quart hypercorn "psycopg[binary,pool]"')
+            sys.exit(1)
+        servidor_async.main()
+        sys.exit(0)
+
+    # Producción multi-proceso (servidor_produccion.py): API_MODO=prefork o --prefork
+    if os.getenv('API_MODO') == 'prefork' or '--prefork' in sys.argv:
+        sys.modules.setdefault('servidor_api', sys.modules[__name__])
+        import servidor_produccion
+        servidor_produccion.main()
+        sys.exit(0)
+
     print("=" * 60)
     print("SERVIDOR API INVENTARIO TI - PostgreSQL (VERSIÓN CON FILTROS COMPLETOS)")
     print("=" * 60)
@@ -1051,4 +4390,6 @@ if __name__ == '__main__':
     print(f"Base de datos: {DB_CONFIG['database']}")
     print("=" * 60)
     
+    iniciar_mantenimiento()
+    difusor_eventos.disponible()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
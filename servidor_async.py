@@ -0,0 +1,715 @@
+"""
+Modo asíncrono de la API de inventario (Quart + psycopg 3).
+
+Las rutas de más tráfico (login, reporte de los agentes, listados de
+equipos, historiales y reportes) corren como corrutinas sobre un pool de
+conexiones asíncrono: mientras PostgreSQL responde, el proceso sigue
+atendiendo otras solicitudes en lugar de bloquear un hilo por cada una.
+
+Las consultas, validaciones y la forma de las respuestas son las de
+servidor_api.py (mismas funciones y constantes), así que el JSON es el
+mismo en ambos modos. Las rutas que no están aquí las atiende la app
+Flask de siempre en un hilo, dentro del mismo proceso.
+
+Uso:
+    python servidor_async.py
+    API_MODO=async python servidor_api.py
+
+Requiere: pip install quart hypercorn "psycopg[binary,pool]"
+"""
+import asyncio
+import os
+import time
+import uuid
+from functools import wraps
+
+from quart import Quart, Response, request, jsonify, make_response
+import psycopg
+from psycopg import AsyncCursor
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from werkzeug.exceptions import HTTPException
+
+import servidor_api as api
+from servidor_api import ParametroInvalidoError
+
+app = Quart(__name__)
+if api.JSON_MOTOR == 'orjson' and api.orjson is not None:
+    app.json = api.ProveedorJSONRapido(app)
+app.json.ensure_ascii = False
+
+# =====================================================
+# POOL DE CONEXIONES ASÍNCRONO
+# =====================================================
+# Una conexión solo se ocupa mientras corre la consulta, así que el máximo
+# puede ser mayor que el del pool de hilos sin tener más solicitudes en curso
+DB_POOL_ASYNC_CONFIG = {
+    'min': int(os.getenv('DB_POOL_ASYNC_MIN', api.DB_POOL_CONFIG['min'])),
+    'max': int(os.getenv('DB_POOL_ASYNC_MAX', 40)),
+    'timeout': api.DB_POOL_CONFIG['timeout']
+}
+
+# Mismos datos de conexión que el modo síncrono (libpq llama dbname a la base)
+CONEXION_ASYNC = {
+    ('dbname' if clave == 'database' else clave): valor
+    for clave, valor in api.DB_CONFIG.items()
+}
+
+class CursorMedido(AsyncCursor):
+    """
+    Suma a la solicitud en curso el tiempo de cada sentencia y anota las
+    lentas (ver servidor_api.CursorMedido)
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        inicio = time.perf_counter()
+        exito = False
+        try:
+            resultado = await super().execute(query, params, **kwargs)
+            exito = True
+            return resultado
+        finally:
+            duracion = time.perf_counter() - inicio
+            api.registrar_consulta(duracion)
+            if duracion >= api.CONSULTAS_LENTAS_CONFIG['umbral']:
+                await registrar_consulta_lenta(self.connection, query, params, duracion, exito)
+
+
+async def capturar_plan(conn, query, params):
+    """Igual que servidor_api.capturar_plan: cursor aparte y SAVEPOINT"""
+    prefijo = 'EXPLAIN (ANALYZE, BUFFERS) '
+    try:
+        async with conn.transaction():
+            cur = AsyncCursor(conn, row_factory=tuple_row)    # sin medir
+            await cur.execute(prefijo.encode() + query if isinstance(query, bytes) else prefijo + query, params)
+            return '\n'.join(fila[0] for fila in await cur.fetchall())
+    except psycopg.Error as e:
+        return f"No se pudo obtener el plan: {e}"
+
+
+async def registrar_consulta_lenta(conn, query, params, duracion, exito):
+    try:
+        entrada = api.entrada_consulta_lenta(query, params, duracion)
+        if exito and api.muestrear_plan(entrada['sql']):
+            entrada['plan'] = await capturar_plan(conn, query, params)
+        api.consultas_lentas.registrar(entrada)
+    except Exception as e:
+        print("CONSULTAS LENTAS ERROR:", e)
+
+
+db_pool_async = AsyncConnectionPool(
+    kwargs=dict(CONEXION_ASYNC, row_factory=dict_row, cursor_factory=CursorMedido),
+    min_size=DB_POOL_ASYNC_CONFIG['min'],
+    max_size=DB_POOL_ASYNC_CONFIG['max'],
+    timeout=DB_POOL_ASYNC_CONFIG['timeout'],
+    open=False
+)
+
+
+@app.before_serving
+async def abrir_pool():
+    await db_pool_async.open()
+    try:
+        async with db_pool_async.connection() as conn:
+            await conn.execute("SELECT fn_asegurar_particiones_historial()")
+    except psycopg.Error as e:
+        print(f"No se pudieron crear las particiones del historial: {e}")
+    # Las tareas de limpieza usan el pool síncrono de servidor_api, en su hilo
+    api.iniciar_mantenimiento()
+    api.difusor_eventos.disponible()
+
+
+@app.after_serving
+async def cerrar_pool():
+    api.difusor_eventos.cerrar()
+    await db_pool_async.close()
+
+
+async def ejecutar_query(query, params=None, fetchone=False, fetchall=True, commit=False):
+    """Igual que servidor_api.ejecutar_query, con una conexión del pool asíncrono"""
+    async with db_pool_async.connection() as conn:
+        cursor = await conn.execute(query, params or ())
+
+        if commit:
+            await conn.commit()
+            return {"success": True}
+
+        if fetchone:
+            return await cursor.fetchone()
+        if fetchall:
+            return await cursor.fetchall()
+
+# =====================================================
+# DECORADORES (AUTENTICACIÓN, PERMISOS, ETAG)
+# =====================================================
+async def usuario_por_token(token):
+    """Igual que servidor_api.usuario_por_token, con el pool asíncrono"""
+    # La caché es la misma de servidor_api: un login en cualquiera de los
+    # dos modos invalida el token anterior en ambos
+    with api.medir_fase('auth'):
+        user = api.auth_cache.obtener(token)
+        if user is None:
+            user = await ejecutar_query(api.QUERY_USUARIO_POR_TOKEN, (token,), fetchone=True)
+
+            if not user:
+                return None
+
+            user = dict(user)
+            api.auth_cache.guardar(token, user)
+    return user
+
+
+def require_auth(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        auth = request.headers.get('Authorization')
+
+        if not auth or not auth.startswith("Bearer "):
+            return jsonify({"error": "No autorizado"}), 401
+
+        try:
+            token = auth.split(" ")[1]
+
+            user = await usuario_por_token(token)
+            if user is None:
+                return jsonify({"error": "Token inválido"}), 401
+
+            request.current_user = user
+
+        except Exception as e:
+            print("AUTH ERROR:", e)
+            return jsonify({"error": "Token inválido"}), 401
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+def require_write_permission(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if not hasattr(request, 'current_user'):
+            return jsonify({"error": "No autorizado"}), 401
+
+        if request.current_user['nombre_rol'] == 'CONSULTA':
+            return jsonify({
+                "error": "Acceso denegado. Usuario de solo lectura.",
+                "mensaje": "No tienes permisos para realizar esta acción. Contacta a un administrador si necesitas hacer cambios."
+            }), 403
+
+        return await f(*args, **kwargs)
+    return decorated_function
+
+async def versiones_tablas(tablas):
+    filas = await ejecutar_query(api.QUERY_VERSIONES, (list(tablas),))
+    versiones = {fila['tabla']: fila['version'] for fila in filas}
+    return [versiones.get(tabla, 0) for tabla in tablas]
+
+def con_etag(*tablas):
+    """Mismo ETag que servidor_api.con_etag (una respuesta vale en ambos modos)"""
+    tablas = tuple(tabla.lower() for tabla in tablas)
+
+    def decorador(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            try:
+                versiones = await versiones_tablas(tablas)
+            except Exception as e:
+                print("ETAG ERROR:", e)
+                return await f(*args, **kwargs)
+
+            etag = api.calcular_etag(request.path, request.args, versiones)
+
+            for variante in api.variantes_etag(etag):
+                if request.if_none_match.contains(variante):
+                    respuesta = await make_response('', 304)
+                    respuesta.set_etag(variante)
+                    break
+            else:
+                respuesta = await make_response(await f(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+                respuesta.set_etag(etag)
+
+            respuesta.headers['Cache-Control'] = 'private, no-cache'
+            return respuesta
+        return decorated_function
+    return decorador
+
+def con_cache(*tablas):
+    """Igual que servidor_api.con_cache, sobre la misma caché de lecturas"""
+    tablas = tuple(tabla.lower() for tabla in tablas)
+
+    def decorador(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            cache = api.cache_lecturas
+            if not api.CACHE_LECTURAS_CONFIG['activa'] or not cache.disponible():
+                return await f(*args, **kwargs)
+
+            clave = api.clave_cache(request.endpoint, kwargs, request.args)
+            guardada = cache.obtener(clave)
+            if guardada is not None:
+                cuerpo, tipo = guardada
+                return Response(cuerpo, content_type=tipo)
+
+            generacion = cache.generacion(tablas)
+            respuesta = await make_response(await f(*args, **kwargs))
+            if respuesta.status_code == 200:
+                cache.guardar_vigente(clave, (await respuesta.get_data(), respuesta.content_type), tablas, generacion)
+            return respuesta
+        return decorated_function
+    return decorador
+
+# =====================================================
+# MÉTRICAS, CABECERAS Y COMPRESIÓN
+# =====================================================
+# Mismo registro que servidor_api: /metrics (atendido por Flask) incluye
+# las solicitudes de los dos modos
+@app.before_request
+async def iniciar_medicion():
+    ruta = request.url_rule.rule if request.url_rule is not None else 'sin_ruta'
+    api.medicion_actual.set(api.MedicionSolicitud(ruta))
+    api.metricas.entrar()
+
+# Registrado antes que completar_respuesta, así corre después y mide el
+# tamaño ya comprimido
+@app.after_request
+async def terminar_medicion(respuesta):
+    medicion = api.medicion_actual.get()
+    if medicion is None:
+        return respuesta
+    respuesta.headers['Server-Timing'] = medicion.server_timing()
+    api.medicion_actual.set(None)
+    api.metricas.salir(medicion.ruta, request.method, respuesta.status_code,
+                       time.perf_counter() - medicion.inicio, medicion, respuesta.content_length)
+    return respuesta
+
+@app.after_request
+async def completar_respuesta(respuesta):
+    # Lo mismo que CORS(app) con la configuración por defecto
+    if request.headers.get('Origin'):
+        respuesta.headers['Access-Control-Allow-Origin'] = request.headers['Origin']
+
+    if (respuesta.status_code != 200
+            or 'Content-Encoding' in respuesta.headers
+            or respuesta.mimetype not in api.TIPOS_COMPRIMIBLES):
+        return respuesta
+
+    respuesta.vary.add('Accept-Encoding')
+    codificacion = api.elegir_codificacion(request.accept_encodings)
+    datos = await respuesta.get_data()
+    if codificacion is None or len(datos) < api.COMPRESION_CONFIG['minimo']:
+        return respuesta
+
+    with api.medir_fase('comp'):
+        respuesta.set_data(api.comprimir(datos, codificacion))
+    respuesta.headers['Content-Encoding'] = codificacion
+    etag, debil = respuesta.get_etag()
+    if etag:
+        respuesta.set_etag(f"{etag}-{codificacion}", weak=debil)
+    return respuesta
+
+# =====================================================
+# ENDPOINTS - AUTENTICACIÓN
+# =====================================================
+@app.route('/api/login', methods=['POST'])
+async def login():
+    try:
+        data = await request.get_json(silent=True)
+        if not data:
+            return jsonify({"error": "No se enviaron datos"}), 400
+
+        cedula = data.get('cedula')
+        password = data.get('password')
+
+        if not cedula or not password:
+            return jsonify({"error": "Cédula y contraseña obligatorias"}), 400
+
+        user = await ejecutar_query(api.QUERY_LOGIN, (cedula, password), fetchone=True)
+
+        if not user:
+            return jsonify({"error": "Credenciales inválidas"}), 401
+
+        token = str(uuid.uuid4())
+
+        await ejecutar_query(api.QUERY_GUARDAR_TOKEN, (token, cedula), commit=True)
+        api.invalidar_usuario_cache(cedula)
+
+        user_dict = {
+            "cedula_usuario": user['cedula_usuario'],
+            "nombre_usuario": user['nombre_usuario'],
+            "nombre_rol": user['nombre_rol'],
+            "id_rol": user['id_rol']
+        }
+
+        return jsonify({
+            "success": True,
+            "user": user_dict,
+            "token": token
+        }), 200
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+# =====================================================
+# ENDPOINTS - EQUIPOS
+# =====================================================
+@app.route('/api/equipos', methods=['POST'])
+@require_auth
+@require_write_permission
+async def registrar_equipo():
+    """Reporte de inventario.ps1 (ver servidor_api.registrar_equipo)"""
+    try:
+        try:
+            fila = api.equipo_desde_payload(await request.get_json(silent=True))
+        except ParametroInvalidoError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # psycopg 3 no tiene execute_values: se arma el VALUES de una fila
+        marcadores = "(" + ", ".join(["%s"] * len(api.COLUMNAS_EQUIPO_PAYLOAD)) + ")"
+        query = api.QUERY_UPSERT_EQUIPOS.replace("VALUES %s", f"VALUES {marcadores}", 1)
+
+        async with db_pool_async.connection() as conn:
+            async with conn.cursor(row_factory=tuple_row) as cur:
+                await cur.execute(query, api.valores_upsert([fila])[0])
+                devueltas = await cur.fetchall()
+                acciones, sin_cambios = api.acciones_upsert([fila], devueltas)
+                if sin_cambios:
+                    await cur.execute(api.QUERY_MARCAR_REPORTE, (sin_cambios,))
+            await conn.commit()
+
+        accion = acciones[fila['Nombre_Equipo']]
+        if accion != 'sin_cambios':
+            api.estadisticas_snapshot.invalidar()
+
+        mensaje = "Equipo sin cambios" if accion == 'sin_cambios' else f"Equipo {accion}"
+        return jsonify({"success": True, "mensaje": mensaje, "accion": accion}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/equipos', methods=['GET'])
+@require_auth
+@con_etag('equipos', 'historial_mantenimiento')
+async def listar_equipos():
+    try:
+        consulta = api.consulta_listar_equipos(request.args)
+        filas = await ejecutar_query(consulta['query'], consulta['params'])
+        respuesta = api.pagina_equipos(filas, consulta)
+
+        if consulta['limite'] is not None and request.args.get('total') in ('1', 'true', 'aprox'):
+            plan = await ejecutar_query(
+                "EXPLAIN (FORMAT JSON) " + consulta['query_base'], consulta['params_base'],
+                fetchone=True, fetchall=False
+            )
+            respuesta["total_aproximado"] = api.filas_del_plan(plan)
+
+        return jsonify(respuesta), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/buscar', methods=['GET'])
+@require_auth
+async def buscar_equipos():
+    try:
+        texto = (request.args.get('q') or '').strip()
+        if not texto:
+            return jsonify({"error": "Falta el parámetro q"}), 400
+        limite = api.leer_limite(request.args, requerido=True)
+
+        query, params = api.consulta_busqueda_global(texto, limite)
+        resultados = await ejecutar_query(query, params)
+        return jsonify({
+            "success": True,
+            "resultados": [dict(r) for r in resultados]
+        }), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/equipos/<equipo>', methods=['GET'])
+@require_auth
+@con_etag('equipos', 'historial_mantenimiento')
+async def obtener_equipo(equipo):
+    try:
+        columnas, join = api.proyeccion_equipos(request.args)
+        query = f"SELECT {columnas} FROM Equipos {join} WHERE Equipos.Nombre_Equipo = %s"
+        equipo_data = await ejecutar_query(query, (equipo,), fetchone=True, fetchall=False)
+
+        if not equipo_data:
+            return jsonify({"error": "Equipo no encontrado"}), 404
+
+        return jsonify(dict(equipo_data)), 200
+
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# =====================================================
+# ENDPOINTS - HISTORIALES
+# =====================================================
+async def listar(query, params=None):
+    """Respuesta de los listados de historial: lista de filas o error 500"""
+    try:
+        filas = await ejecutar_query(query, params)
+        return jsonify([dict(f) for f in filas]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def listar_reporte_historial(reporte):
+    """Igual que servidor_api.listar_reporte_historial (?archivo=1 lo atiende Flask)"""
+    try:
+        consulta = api.consulta_reporte_historial(reporte, request.args)
+        filas = await ejecutar_query(consulta['query'], consulta['params'])
+        return jsonify(api.pagina_historial(filas, consulta)), 200
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/mantenimientos/<equipo>', methods=['GET'])
+@require_auth
+@con_etag('historial_mantenimiento', 'usuarios')
+@con_cache('historial_mantenimiento', 'usuarios')
+async def obtener_mantenimientos(equipo):
+    return await listar(api.QUERY_MANTENIMIENTOS_EQUIPO.format(historial='Historial_Mantenimiento'), (equipo,))
+
+@app.route('/api/mantenimientos', methods=['GET'])
+@require_auth
+@con_etag('historial_mantenimiento', 'usuarios', 'equipos')
+async def listar_todos_mantenimientos():
+    return await listar_reporte_historial('mantenimientos')
+
+@app.route('/api/traslados/<equipo>', methods=['GET'])
+@require_auth
+@con_etag('historial_traslados', 'usuarios')
+@con_cache('historial_traslados', 'usuarios')
+async def obtener_traslados(equipo):
+    return await listar(api.QUERY_TRASLADOS_EQUIPO.format(historial='Historial_Traslados'), (equipo,))
+
+@app.route('/api/traslados', methods=['GET'])
+@require_auth
+@con_etag('historial_traslados', 'usuarios', 'equipos')
+async def listar_todos_traslados():
+    return await listar_reporte_historial('traslados')
+
+@app.route('/api/responsables/historial/<equipo>', methods=['GET'])
+@require_auth
+@con_etag('responsables_equipo', 'usuarios')
+@con_cache('responsables_equipo', 'usuarios')
+async def historial_responsable(equipo):
+    return await listar(api.QUERY_HISTORIAL_RESPONSABLE, (equipo,))
+
+@app.route('/api/responsables/<equipo>', methods=['GET'])
+@require_auth
+@con_etag('responsables_equipo', 'usuarios')
+@con_cache('responsables_equipo', 'usuarios')
+async def obtener_responsables(equipo):
+    return await listar(api.QUERY_RESPONSABLES_EQUIPO, (equipo,))
+
+@app.route('/api/responsables', methods=['GET'])
+@require_auth
+@con_etag('responsables_equipo', 'usuarios', 'equipos')
+async def listar_todos_responsables():
+    return await listar_reporte_historial('responsables')
+
+# =====================================================
+# ENDPOINTS - REPORTES
+# =====================================================
+@app.route('/api/reportes/historial-estados', methods=['GET'])
+@require_auth
+async def reporte_historial_estados():
+    return await listar_reporte_historial('estados')
+
+@app.route('/api/reportes/equipos-por-tecnico', methods=['GET'])
+@require_auth
+@con_cache('usuarios', 'responsables_equipo')
+async def reporte_equipos_por_tecnico():
+    return await listar(api.QUERY_REPORTE_EQUIPOS_POR_TECNICO)
+
+@app.route('/api/reportes/mantenimientos-periodo', methods=['GET'])
+@require_auth
+async def reporte_mantenimientos_periodo():
+    return await listar(*api.consulta_mantenimientos_periodo(request.args))
+
+# =====================================================
+# EVENTOS EN VIVO (/api/stream)
+# =====================================================
+# Mismo difusor que Flask (un hilo de escucha por proceso); cada cliente es
+# una corrutina que espera un asyncio.Event en lugar de ocupar un hilo
+async def flujo_eventos(difusor, posicion, textos, omitir):
+    loop = asyncio.get_running_loop()
+    aviso = asyncio.Event()
+    difusor.registrar_aviso(loop, aviso)
+    try:
+        yield f"retry: {api.EVENTOS_CONFIG['reintento_ms']}\n\n".encode()
+        if textos:
+            yield ''.join(textos).encode()
+        while not difusor.cerrado:
+            # Se limpia antes de mirar el búfer: un evento que llegue justo
+            # después vuelve a activarlo
+            aviso.clear()
+            textos, posicion = difusor.siguientes(posicion, omitir)
+            if textos:
+                yield ''.join(textos).encode()
+                continue
+            try:
+                await asyncio.wait_for(aviso.wait(), api.EVENTOS_CONFIG['latido'])
+            except asyncio.TimeoutError:
+                yield b": latido\n\n"
+    finally:
+        difusor.quitar_aviso(loop, aviso)
+
+
+async def esperar_escucha(difusor, segundos):
+    """Igual que DifusorEventos.esperar_escucha, sin bloquear el loop"""
+    fin = time.monotonic() + segundos
+    while not difusor.disponible():
+        if time.monotonic() >= fin:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+async def usuario_por_ticket(ticket):
+    """Igual que servidor_api.usuario_por_ticket, con el pool asíncrono"""
+    async with db_pool_async.connection() as conn:
+        async with conn.transaction():
+            cursor = await conn.execute(api.QUERY_CANJEAR_TICKET_STREAM, (ticket,))
+            user = await cursor.fetchone()
+    return dict(user) if user else None
+
+
+@app.route('/api/stream', methods=['GET'])
+async def stream_eventos():
+    tipo, credencial = api.credencial_stream(request.headers, request.args)
+    if not credencial:
+        return jsonify({"error": "No autorizado"}), 401
+    try:
+        if tipo == 'token':
+            user = await usuario_por_token(credencial)
+        else:
+            user = await usuario_por_ticket(credencial)
+    except Exception as e:
+        print("AUTH ERROR:", e)
+        user = None
+    if user is None:
+        return jsonify({"error": "Token inválido"}), 401
+
+    try:
+        ultimo_id = api.leer_ultimo_evento(request.headers, request.args)
+    except ParametroInvalidoError as e:
+        return jsonify({"error": str(e)}), 400
+
+    difusor = api.difusor_eventos
+    if not await esperar_escucha(difusor, api.EVENTOS_CONFIG['espera_escucha']):
+        return jsonify({"error": "Eventos en vivo no disponibles"}), 503
+    posicion = difusor.posicion_actual()
+    textos, omitir = [], set()
+    if ultimo_id is not None:
+        try:
+            filas = await ejecutar_query(api.QUERY_EVENTOS_DESDE, api.parametros_repeticion(ultimo_id))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        textos, omitir = api.repeticion_eventos(filas, ultimo_id)
+
+    respuesta = Response(
+        flujo_eventos(difusor, posicion, textos, omitir),
+        mimetype='text/event-stream',
+        headers=api.CABECERAS_SSE
+    )
+    # Sin el límite de RESPONSE_TIMEOUT: la conexión dura lo que el cliente quiera
+    respuesta.timeout = None
+    return respuesta
+
+# =====================================================
+# DESPACHO ENTRE MODOS
+# =====================================================
+def cuerpo_no_vacio(app_wsgi):
+    """
+    El adaptador WSGI de hypercorn solo envía los encabezados junto con el
+    primer fragmento del cuerpo: las respuestas vacías (304, OPTIONS) deben
+    entregar al menos un fragmento b''.
+    """
+    def iterar(cuerpo):
+        try:
+            vacio = True
+            for fragmento in cuerpo:
+                vacio = False
+                yield fragmento
+            if vacio:
+                yield b''
+        finally:
+            # close() de Flask ejecuta call_on_close (p. ej. devolver la
+            # conexión de la exportación a Excel)
+            if hasattr(cuerpo, 'close'):
+                cuerpo.close()
+
+    def envoltura(environ, start_response):
+        return iterar(app_wsgi(environ, start_response))
+    return envoltura
+
+
+class DespachadorASGI:
+    """
+    Aplicación ASGI del modo asíncrono. La tabla de rutas de Flask decide
+    qué endpoint atiende cada solicitud; si ese endpoint tiene versión
+    asíncrona la atiende Quart, si no la app Flask en un hilo.
+    """
+
+    def __init__(self, app_async, app_wsgi):
+        self.app_async = app_async
+        self.app_wsgi = app_wsgi
+        self.wsgi = AsyncioWSGIMiddleware(cuerpo_no_vacio(app_wsgi), max_body_size=64 * 1024 * 1024)
+
+    def es_asincrona(self, scope):
+        # Las preflight OPTIONS siempre van a Flask (flask_cors las responde)
+        if scope['method'] == 'OPTIONS':
+            return False
+        # Los meses archivados del historial (?archivo=1) se leen con COPY
+        # desde los .csv.gz: solo lo hace la versión de Flask
+        if b'archivo=' in scope.get('query_string', b''):
+            return False
+        try:
+            endpoint, _ = self.app_wsgi.url_map.bind('').match(scope['path'], scope['method'])
+        except HTTPException:
+            return False
+        # Endpoints de Flask: 'inventario.listar_equipos' (blueprint)
+        return endpoint.rpartition('.')[2] in self.app_async.view_functions
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self.es_asincrona(scope):
+            return await self.wsgi(scope, receive, send)
+        return await self.app_async(scope, receive, send)
+
+
+aplicacion = DespachadorASGI(app, api.app)
+
+
+def main():
+    config = Config()
+    config.bind = [f"{os.getenv('API_HOST', '0.0.0.0')}:{os.getenv('API_PORT', '5000')}"]
+    config.accesslog = None
+    print("=" * 60)
+    print("SERVIDOR API INVENTARIO TI - MODO ASÍNCRONO (Quart + psycopg)")
+    print("=" * 60)
+    print(f"Escuchando en: {', '.join(config.bind)}")
+    print(f"Base de datos: {api.DB_CONFIG['database']}")
+    print("=" * 60)
+    asyncio.run(serve(aplicacion, config))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Servidor de producción multi-proceso (prefork) de la API de inventario.
+
+El proceso principal arma la aplicación una sola vez (crear_app), abre el
+puerto y lanza un worker por CPU con os.fork(). Cada worker crea su propio
+pool de conexiones y cachés (servidor_api.iniciar_worker) y atiende con
+hilos sobre el socket compartido; el kernel reparte las conexiones.
+
+- Reciclado: tras API_MAX_SOLICITUDES solicitudes (más un margen aleatorio
+  para que no se reinicien todos a la vez) el worker deja de aceptar,
+  termina lo que tiene en curso y sale; el principal lanza otro.
+- SIGHUP: reemplaza todos los workers sin cerrar el puerto.
+- SIGTERM / Ctrl+C: los workers dejan de aceptar y terminan las solicitudes
+  en curso; pasados API_TIEMPO_GRACIA segundos se cierran a la fuerza.
+
+Uso:
+    python servidor_produccion.py
+    API_MODO=prefork python servidor_api.py
+
+Variables: API_HOST, API_PORT, API_WORKERS (por defecto una por CPU),
+API_MAX_SOLICITUDES (0 = sin reciclar), API_TIEMPO_GRACIA, API_KEEPALIVE,
+API_METRICAS_DIR (carpeta para sumar /metrics entre workers; por defecto
+una temporal).
+
+En Windows no hay fork: se atiende en un solo proceso con hilos.
+"""
+import os
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler, run_simple
+
+import servidor_api as api
+
+
+def contar_cpus():
+    # Respeta los límites de CPU del proceso (contenedores, taskset)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+PRODUCCION_CONFIG = {
+    'host': os.getenv('API_HOST', '0.0.0.0'),
+    'port': int(os.getenv('API_PORT', 5000)),
+    'workers': int(os.getenv('API_WORKERS', 0)) or contar_cpus(),
+    'max_solicitudes': int(os.getenv('API_MAX_SOLICITUDES', 10000)),
+    'margen_solicitudes': int(os.getenv('API_MAX_SOLICITUDES_MARGEN', 1000)),
+    'tiempo_gracia': float(os.getenv('API_TIEMPO_GRACIA', 30)),
+    'keepalive': float(os.getenv('API_KEEPALIVE', 5)),
+    'backlog': int(os.getenv('API_BACKLOG', 2048))
+}
+
+
+# =====================================================
+# WORKER
+# =====================================================
+class ManejadorSolicitudes(WSGIRequestHandler):
+    # Una conexión keep-alive inactiva se cierra a los `keepalive` segundos,
+    # así un worker que se recicla no espera clientes ociosos
+    timeout = PRODUCCION_CONFIG['keepalive']
+
+    def log_request(self, code="-", size="-"):
+        # El log de acceso lleva solo la ruta: la query string puede tener
+        # credenciales (el ticket de /api/stream) o datos de búsqueda
+        ruta, _, query = self.path.partition('?')
+        if not query:
+            return super().log_request(code, size)
+        self.path = ruta
+        try:
+            super().log_request(code, size)
+        finally:
+            self.path = f"{ruta}?{query}"
+
+
+class ServidorWorker(ThreadedWSGIServer):
+    """
+    Servidor con hilos de un worker. Al detenerse deja de aceptar y
+    server_close() espera a que terminen las solicitudes en curso.
+    """
+
+    daemon_threads = False
+
+    def __init__(self, app, fd, max_solicitudes):
+        super().__init__(
+            PRODUCCION_CONFIG['host'], PRODUCCION_CONFIG['port'],
+            self._contar(app), handler=ManejadorSolicitudes, fd=fd
+        )
+        # Todos los workers despiertan con la misma conexión entrante y solo
+        # uno la acepta: con el socket bloqueante los demás se quedarían en
+        # accept() y no verían la orden de detenerse
+        self.socket.setblocking(False)
+        self.restantes = max_solicitudes
+        self._lock = threading.Lock()
+        self._deteniendo = False
+
+    def _contar(self, app):
+        def aplicacion(environ, start_response):
+            with self._lock:
+                self.restantes -= 1
+                agotado = self.restantes == 0
+            if agotado:
+                self.detener()
+            return app(environ, start_response)
+        return aplicacion
+
+    def detener(self):
+        # shutdown() espera a serve_forever: no se puede llamar desde su hilo
+        if not self._deteniendo:
+            self._deteniendo = True
+            # server_close() espera a las solicitudes en curso: los clientes
+            # de /api/stream se despiden y reconectan a otro worker
+            api.difusor_eventos.cerrar()
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+
+def ejecutar_worker(app, fd, max_solicitudes):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)     # Ctrl+C lo maneja el principal
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+    api.iniciar_worker()
+    servidor = ServidorWorker(app, fd, max_solicitudes)
+    signal.signal(signal.SIGTERM, lambda *_: servidor.detener())
+
+    servidor.serve_forever()
+    servidor.server_close()
+    if api.METRICAS_CONFIG['dir']:
+        api.volcar_registros(forzar=True)
+    api.db_pool.cerrar()
+
+
+# =====================================================
+# PROCESO PRINCIPAL
+# =====================================================
+class Principal:
+    """Lanza, vigila, recicla y detiene los workers"""
+
+    def __init__(self, app, sock, workers):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.activos = {}          # pid -> momento de inicio
+        self.corriendo = True
+        self.recargar = False
+
+    def lanzar(self):
+        max_solicitudes = PRODUCCION_CONFIG['max_solicitudes']
+        if max_solicitudes > 0:
+            max_solicitudes += random.randint(0, PRODUCCION_CONFIG['margen_solicitudes'])
+
+        pid = os.fork()
+        if pid == 0:
+            codigo = 0
+            try:
+                ejecutar_worker(self.app, self.sock.fileno(), max_solicitudes)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} terminó con error: {e}", file=sys.stderr)
+                codigo = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(codigo)
+        self.activos[pid] = time.monotonic()
+
+    def recoger(self):
+        """Quitar los workers que ya salieron. Retorna cuántos fallaron al arrancar."""
+        fallidos = 0
+        while self.activos:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            inicio = self.activos.pop(pid, None)
+            if inicio is None:
+                continue
+            if api.METRICAS_CONFIG['dir']:
+                api.consolidar_metricas_worker(pid)
+                api.consolidar_consultas_lentas_worker(pid)
+            codigo = os.waitstatus_to_exitcode(estado)
+            if codigo != 0:
+                print(f"Worker {pid} salió con código {codigo}", file=sys.stderr)
+                if time.monotonic() - inicio < 5:
+                    fallidos += 1
+        return fallidos
+
+    def manejar_senal(self, numero, _frame):
+        if numero == signal.SIGHUP:
+            self.recargar = True
+        else:
+            self.corriendo = False
+
+    def ejecutar(self):
+        for numero in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(numero, self.manejar_senal)
+
+        while self.corriendo:
+            if self.recargar:
+                # Los nuevos entran antes de despedir a los viejos: el puerto
+                # nunca se queda sin quien atienda
+                self.recargar = False
+                viejos = list(self.activos)
+                for _ in range(self.workers):
+                    self.lanzar()
+                for pid in viejos:
+                    self._enviar_senal(pid, signal.SIGTERM)
+
+            # Un worker que no logra arrancar (p. ej. sin base de datos) se
+            # reintenta con una pausa para no lanzar procesos en ciclo
+            if self.recoger():
+                time.sleep(1)
+            while self.corriendo and len(self.activos) < self.workers:
+                self.lanzar()
+            time.sleep(0.5)
+
+        self.detener()
+
+    def _enviar_senal(self, pid, numero):
+        try:
+            os.kill(pid, numero)
+        except ProcessLookupError:
+            pass
+
+    def detener(self):
+        for pid in self.activos:
+            self._enviar_senal(pid, signal.SIGTERM)
+        limite = time.monotonic() + PRODUCCION_CONFIG['tiempo_gracia']
+        while self.activos and time.monotonic() < limite:
+            self.recoger()
+            time.sleep(0.1)
+        for pid in self.activos:
+            self._enviar_senal(pid, signal.SIGKILL)
+        while self.activos:
+            self.recoger()
+            time.sleep(0.1)
+        self.sock.close()
+
+
+def abrir_socket():
+    familia = socket.AF_INET6 if ':' in PRODUCCION_CONFIG['host'] else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((PRODUCCION_CONFIG['host'], PRODUCCION_CONFIG['port']))
+    sock.listen(PRODUCCION_CONFIG['backlog'])
+    sock.set_inheritable(True)
+    return sock
+
+
+def main():
+    # La app se arma antes del fork; pool y cachés los crea cada worker
+    app = api.crear_app()
+    prefork = hasattr(os, 'fork')
+
+    print("=" * 60)
+    print("SERVIDOR API INVENTARIO TI - PRODUCCIÓN")
+    print("=" * 60)
+    print(f"Escuchando en: {PRODUCCION_CONFIG['host']}:{PRODUCCION_CONFIG['port']}")
+    print(f"Base de datos: {api.DB_CONFIG['database']}")
+    if prefork:
+        print(f"Workers: {PRODUCCION_CONFIG['workers']} "
+              f"(reciclado cada {PRODUCCION_CONFIG['max_solicitudes'] or '∞'} solicitudes)")
+    else:
+        print("Sin fork en este sistema: un solo proceso con hilos")
+    print("=" * 60)
+    sys.stdout.flush()
+
+    if not prefork:
+        api.iniciar_worker()
+        run_simple(PRODUCCION_CONFIG['host'], PRODUCCION_CONFIG['port'], app, threaded=True)
+        return
+
+    # /metrics suma lo que cada worker deja en esta carpeta
+    carpeta_temporal = None
+    if not api.METRICAS_CONFIG['dir']:
+        carpeta_temporal = api.METRICAS_CONFIG['dir'] = tempfile.mkdtemp(prefix='inventario-metricas-')
+    try:
+        Principal(app, abrir_socket(), PRODUCCION_CONFIG['workers']).ejecutar()
+    finally:
+        if carpeta_temporal:
+            shutil.rmtree(carpeta_temporal, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
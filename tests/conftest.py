@@ -0,0 +1,201 @@
+"""
+Fixtures de las pruebas de comportamiento de la API.
+
+Las pruebas corren contra una base PostgreSQL propia (PRUEBAS_DB_NAME, por
+defecto inventario_pruebas) que se borra y se genera de nuevo al empezar
+con benchmarks/datos_sinteticos.py, en tamaño pequeño. La conexión usa
+DB_HOST, DB_PORT, DB_USER y DB_PASSWORD como servidor_api.py; DB_NAME se
+reemplaza para no tocar nunca la base de trabajo. Sin servidor PostgreSQL
+las pruebas se saltan.
+
+Cada solicitud se puede hacer por los dos caminos de producción:
+- flask: la app WSGI (servidor_api.app), la de `python servidor_api.py` y
+  el modo prefork.
+- asgi: `servidor_async.aplicacion` (DespachadorASGI), con su lifespan, como
+  la sirve hypercorn en el modo asíncrono.
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+BASE_PRUEBAS = os.getenv('PRUEBAS_DB_NAME', 'inventario_pruebas')
+# servidor_api lee DB_NAME al importarse: se importa dentro de los fixtures
+os.environ['DB_NAME'] = BASE_PRUEBAS
+
+TAMANO_PRUEBAS = ['--equipos', '300', '--mantenimientos', '3000', '--traslados', '1000',
+                  '--estados', '1000', '--tecnicos', '5', '--anios', '1']
+
+
+class Respuesta:
+    """Lo que comparan las pruebas: estado, encabezados (en minúscula) y cuerpo"""
+
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+
+    def get_json(self):
+        return json.loads(self.data) if self.data else None
+
+
+class Cliente:
+    def get(self, ruta, headers=None):
+        return self.solicitud('GET', ruta, headers=headers)
+
+    def post(self, ruta, json=None, headers=None):
+        return self.solicitud('POST', ruta, json=json, headers=headers)
+
+
+class ClienteFlask(Cliente):
+    modo = 'flask'
+
+    def __init__(self, app):
+        self.cliente = app.test_client()
+
+    def solicitud(self, metodo, ruta, json=None, headers=None):
+        r = self.cliente.open(ruta, method=metodo, json=json, headers=headers or {})
+        return Respuesta(r.status_code, {k.lower(): v for k, v in r.headers.items()}, r.data)
+
+
+class ClienteASGI(Cliente):
+    """
+    Cliente HTTP mínimo sobre una aplicación ASGI. Corre en su propio loop:
+    el lifespan (abrir_pool) queda suspendido entre solicitudes y el pool
+    asíncrono sigue atado a ese mismo loop.
+    """
+    modo = 'asgi'
+
+    def __init__(self, aplicacion):
+        self.aplicacion = aplicacion
+        self.loop = asyncio.new_event_loop()
+        self.entrada_vida = asyncio.Queue()
+        self.salida_vida = asyncio.Queue()
+        self.vida = None
+
+    def iniciar(self):
+        async def arrancar():
+            self.vida = asyncio.ensure_future(self.aplicacion(
+                {'type': 'lifespan', 'asgi': {'version': '3.0'}},
+                self.entrada_vida.get, self.salida_vida.put
+            ))
+            await self.entrada_vida.put({'type': 'lifespan.startup'})
+            mensaje = await self.salida_vida.get()
+            if mensaje['type'] != 'lifespan.startup.complete':
+                raise RuntimeError(f"No arrancó la aplicación ASGI: {mensaje}")
+        self.loop.run_until_complete(arrancar())
+
+    def cerrar(self):
+        async def detener():
+            await self.entrada_vida.put({'type': 'lifespan.shutdown'})
+            await self.salida_vida.get()
+            await self.vida
+        self.loop.run_until_complete(detener())
+        self.loop.close()
+
+    def solicitud(self, metodo, ruta, json=None, headers=None):
+        return self.loop.run_until_complete(self._solicitud(metodo, ruta, json, headers or {}))
+
+    async def _solicitud(self, metodo, ruta, cuerpo_json, headers):
+        ruta, _, query = ruta.partition('?')
+        cuerpo = b''
+        encabezados = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers.items()]
+        if cuerpo_json is not None:
+            cuerpo = json.dumps(cuerpo_json).encode('utf-8')
+            encabezados.append((b'content-type', b'application/json'))
+        encabezados.append((b'content-length', str(len(cuerpo)).encode()))
+        encabezados.append((b'host', b'localhost'))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': metodo, 'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(),
+            'query_string': query.encode(), 'root_path': '', 'headers': encabezados,
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+
+        enviado = asyncio.Event()
+        fin = asyncio.Event()
+
+        async def recibir():
+            if not enviado.is_set():
+                enviado.set()
+                return {'type': 'http.request', 'body': cuerpo, 'more_body': False}
+            await fin.wait()
+            return {'type': 'http.disconnect'}
+
+        respuesta = {'status': None, 'headers': {}, 'cuerpo': b''}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                respuesta['status'] = mensaje['status']
+                respuesta['headers'] = {k.decode('latin-1').lower(): v.decode('latin-1')
+                                        for k, v in mensaje['headers']}
+            elif mensaje['type'] == 'http.response.body':
+                respuesta['cuerpo'] += mensaje.get('body', b'')
+                if not mensaje.get('more_body', False):
+                    fin.set()
+
+        await self.aplicacion(scope, recibir, enviar)
+        fin.set()
+        return Respuesta(respuesta['status'], respuesta['headers'], respuesta['cuerpo'])
+
+
+@pytest.fixture(scope='session')
+def base_datos():
+    import psycopg2
+    from benchmarks import datos_sinteticos
+
+    try:
+        datos_sinteticos.conectar('postgres').close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Sin PostgreSQL para las pruebas: {str(e).strip()}")
+    datos_sinteticos.main(['--base', BASE_PRUEBAS, '--recrear'] + TAMANO_PRUEBAS)
+    return BASE_PRUEBAS
+
+
+@pytest.fixture(scope='session')
+def api(base_datos):
+    import servidor_api
+    return servidor_api
+
+
+@pytest.fixture(scope='session')
+def cliente_flask(api):
+    return ClienteFlask(api.app)
+
+
+@pytest.fixture(scope='session')
+def cliente_asgi(api):
+    pytest.importorskip('quart')
+    pytest.importorskip('psycopg')
+    import servidor_async
+    cliente = ClienteASGI(servidor_async.aplicacion)
+    cliente.iniciar()
+    yield cliente
+    cliente.cerrar()
+
+
+@pytest.fixture(params=['flask', 'asgi'])
+def cliente(request):
+    """El mismo test por los dos modos"""
+    return request.getfixturevalue(f'cliente_{request.param}')
+
+
+@pytest.fixture
+def token(cliente_flask):
+    """Sesión nueva del usuario de benchmarks (SUPERUSUARIO) para cada prueba"""
+    from benchmarks.datos_sinteticos import USUARIO_BENCHMARK
+    r = cliente_flask.post('/api/login', json={
+        'cedula': USUARIO_BENCHMARK['cedula'], 'password': USUARIO_BENCHMARK['password']
+    })
+    assert r.status_code == 200, r.data
+    return r.get_json()['token']
+
+
+@pytest.fixture
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,198 @@
+"""
+El modo asíncrono (servidor_async.py) debe responder igual que Flask:
+mismas solicitudes por los dos caminos, mismos códigos, cuerpos, ETag,
+304 y errores de autenticación.
+"""
+import pytest
+
+from benchmarks.datos_sinteticos import USUARIO_BENCHMARK
+
+EQUIPO = 'PC-000001'
+
+# Lecturas con versión asíncrona (más /api/health, que el despachador manda a Flask)
+LECTURAS = [
+    '/api/equipos',
+    '/api/equipos?fields=summary&limit=5&orden=unidad&total=1',
+    '/api/equipos?estado=ACTIVO&fields=hardware',
+    f'/api/equipos/{EQUIPO}',
+    f'/api/equipos/{EQUIPO}?fields=hardware',
+    '/api/mantenimientos?limit=20',
+    f'/api/mantenimientos/{EQUIPO}',
+    '/api/traslados?limit=20',
+    f'/api/traslados/{EQUIPO}',
+    '/api/responsables',
+    f'/api/responsables/{EQUIPO}',
+    f'/api/responsables/historial/{EQUIPO}',
+    '/api/reportes/historial-estados?limit=20',
+    '/api/reportes/equipos-por-tecnico',
+    '/api/reportes/mantenimientos-periodo?tipo=SOFTWARE',
+]
+
+# Parámetros inválidos: 400 en los dos modos, 404 si el equipo no existe
+ERRORES = [
+    ('/api/equipos?fields=nope', 400),
+    ('/api/equipos?cursor=xx', 400),
+    ('/api/equipos?limit=abc', 400),
+    ('/api/equipos/NO-EXISTE', 404),
+]
+
+
+def login(cliente, password=USUARIO_BENCHMARK['password']):
+    return cliente.post('/api/login', json={'cedula': USUARIO_BENCHMARK['cedula'], 'password': password})
+
+
+@pytest.mark.parametrize('ruta', LECTURAS)
+def test_lecturas_iguales(cliente_flask, cliente_asgi, auth, ruta):
+    flask = cliente_flask.get(ruta, headers=auth)
+    asgi = cliente_asgi.get(ruta, headers=auth)
+    assert flask.status_code == 200, flask.data
+    assert asgi.status_code == flask.status_code
+    assert asgi.get_json() == flask.get_json()
+    assert asgi.headers.get('etag') == flask.headers.get('etag')
+
+
+def test_busqueda_igual(api, cliente_flask, cliente_asgi, auth):
+    if not api.ejecutar_query("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"):
+        pytest.skip("La búsqueda por subcadena necesita la extensión pg_trgm")
+    test_lecturas_iguales(cliente_flask, cliente_asgi, auth, '/api/buscar?q=pc-00001')
+
+
+@pytest.mark.parametrize('ruta, estado', ERRORES)
+def test_errores_iguales(cliente_flask, cliente_asgi, auth, ruta, estado):
+    flask = cliente_flask.get(ruta, headers=auth)
+    asgi = cliente_asgi.get(ruta, headers=auth)
+    assert flask.status_code == estado
+    assert asgi.status_code == estado
+    assert asgi.get_json() == flask.get_json()
+
+
+@pytest.mark.parametrize('ruta', [
+    '/api/mantenimientos',
+    '/api/mantenimientos?fecha_inicio=2000-01-01',
+    '/api/traslados?fecha_inicio=2000-01-01&fecha_fin=2100-01-01',
+])
+def test_historial_siempre_paginado(cliente, auth, ruta):
+    """Con o sin fechas, la misma forma de respuesta y nunca más de una página"""
+    from servidor_api import LIMITE_PAGINA_DEFECTO
+    datos = cliente.get(ruta, headers=auth).get_json()
+    recurso = ruta.split('?')[0].rsplit('/', 1)[1]
+    assert set(datos) == {'success', recurso, 'siguiente_cursor', 'ventana', 'resumen'}
+    assert len(datos[recurso]) <= LIMITE_PAGINA_DEFECTO
+    assert datos['resumen']['filas'] == len(datos[recurso])
+
+
+def test_health_por_flask(cliente_flask, cliente_asgi):
+    flask = cliente_flask.get('/api/health')
+    asgi = cliente_asgi.get('/api/health')
+    assert flask.status_code == asgi.status_code == 200
+    assert asgi.get_json()['status'] == 'online'
+
+
+@pytest.mark.parametrize('ruta, cuerpo', [
+    ('/api/responsables/masivo', {'tecnico': USUARIO_BENCHMARK['cedula'], 'unidad': 5}),
+    ('/api/traslados/lote', {'destino': 'Olaya', 'estado': ['ACTIVO']}),
+])
+def test_lote_filtro_no_texto(cliente, auth, ruta, cuerpo):
+    r = cliente.post(ruta, json=cuerpo, headers=auth)
+    assert r.status_code == 400
+    assert 'debe ser texto' in r.get_json()['error']
+
+
+def test_mantenimiento_arranca_con_la_primera_solicitud(api, cliente_flask):
+    # Sin iniciar_worker (otro servidor WSGI) el hilo arranca al atender
+    cliente_flask.get('/api/health')
+    assert api._hilo_mantenimiento is not None and api._hilo_mantenimiento.is_alive()
+
+
+# =====================================================
+# AUTENTICACIÓN
+# =====================================================
+@pytest.mark.parametrize('ruta', ['/api/equipos', f'/api/equipos/{EQUIPO}', '/api/mantenimientos'])
+def test_sin_token(cliente, ruta):
+    r = cliente.get(ruta)
+    assert r.status_code == 401
+    assert r.get_json() == {'error': 'No autorizado'}
+
+
+def test_token_invalido(cliente):
+    r = cliente.get('/api/equipos', headers={'Authorization': 'Bearer no-es-un-token'})
+    assert r.status_code == 401
+
+
+def test_stream_sin_token_en_url(cliente, token):
+    # El token de la sesión no abre el stream desde la URL: solo un ticket
+    assert cliente.get(f'/api/stream?token={token}').status_code == 401
+    assert cliente.get('/api/stream?ticket=no-existe').status_code == 401
+
+
+def test_ticket_stream(cliente, auth):
+    r = cliente.post('/api/stream/ticket', headers=auth)
+    assert r.status_code == 200
+    assert r.get_json()['ticket']
+    assert cliente.post('/api/stream/ticket').status_code == 401
+
+
+def test_login(cliente):
+    assert login(cliente, password='incorrecta').status_code == 401
+    assert cliente.post('/api/login', json={}).status_code == 400
+
+    primera = login(cliente).get_json()['token']
+    segunda = login(cliente)
+    assert segunda.status_code == 200
+    assert segunda.get_json()['user']['cedula_usuario'] == USUARIO_BENCHMARK['cedula']
+    token = segunda.get_json()['token']
+
+    # Iniciar sesión de nuevo invalida el token anterior
+    assert cliente.get('/api/equipos?limit=1', headers={'Authorization': f'Bearer {primera}'}).status_code == 401
+    assert cliente.get('/api/equipos?limit=1', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+
+
+# =====================================================
+# ETAG Y 304
+# =====================================================
+def test_etag_304(cliente, auth):
+    ruta = '/api/equipos?fields=summary&limit=10'
+    primera = cliente.get(ruta, headers=auth)
+    etag = primera.headers['etag']
+    assert primera.headers['cache-control'] == 'private, no-cache'
+
+    r = cliente.get(ruta, headers=dict(auth, **{'If-None-Match': etag}))
+    assert r.status_code == 304
+    assert r.data == b''
+    assert r.headers['etag'] == etag
+
+    # Otra consulta, otro ETag
+    otra = cliente.get('/api/equipos?fields=summary&limit=11', headers=auth)
+    assert otra.headers['etag'] != etag
+
+
+def test_reporte_del_agente_y_etag(cliente, auth):
+    """
+    Un reporte sin cambios no invalida el ETag del listado; uno con cambios
+    sí. El mismo ETag vale en los dos modos.
+    """
+    equipo = {'Nombre_Equipo': f'PC-PRUEBA-{cliente.modo.upper()}', 'Unidad': 'Olaya', 'Marca': 'Dell'}
+    ruta = '/api/equipos?fields=summary&limit=5'
+
+    r = cliente.post('/api/equipos', json=equipo, headers=auth)
+    assert r.status_code in (200, 201)
+    assert r.get_json()['accion'] in ('registrado', 'actualizado', 'sin_cambios')
+    etag = cliente.get(ruta, headers=auth).headers['etag']
+
+    r = cliente.post('/api/equipos', json=equipo, headers=auth)
+    assert r.get_json()['accion'] == 'sin_cambios'
+    assert cliente.get(ruta, headers=dict(auth, **{'If-None-Match': etag})).status_code == 304
+
+    equipo['Marca'] = 'HP'
+    r = cliente.post('/api/equipos', json=equipo, headers=auth)
+    assert r.get_json()['accion'] == 'actualizado'
+    assert cliente.get(ruta, headers=dict(auth, **{'If-None-Match': etag})).status_code == 200
+
+    # El equipo vuelve a como estaba para que otra corrida empiece igual
+    equipo['Marca'] = 'Dell'
+    cliente.post('/api/equipos', json=equipo, headers=auth)
+
+
+def test_reporte_del_agente_invalido(cliente, auth):
+    r = cliente.post('/api/equipos', json={}, headers=auth)
+    assert r.status_code == 400